@@ -1,27 +1,40 @@
 import os
 import time
 import json
+import uuid
 import logging
+from datetime import datetime, timezone
 from typing import Dict, Any
 from contextlib import asynccontextmanager
 
 import asyncio
-import aiohttp
 import asyncpg
 import jwt
 from dotenv import load_dotenv
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi_cache import FastAPICache
+from pydantic import BaseModel, Field
 from fastapi_cache.backends.redis import RedisBackend
+from fastapi_limiter import FastAPILimiter
+from fastapi_limiter.depends import RateLimiter
 from redis.asyncio import Redis
-from web3 import AsyncWeb3, AsyncHTTPProvider
+from web3 import AsyncWeb3
+
+from local_cache import LocalTTLCache
+from singleflight import SingleFlight, acquire_lease, extend_lease, release_lease
+from chain_client import ChainClient, RpcError, RpcMicroBatcher, VerifiedTokenCache
+from chain_head import ChainHeadTracker
+from segment_log import SegmentLogWriter
+from pg_ingest import PgBatchWriter
+import audit_store
+from log_indexer import LogIndexer, ensure_schema as ensure_logs_schema
+from event_index import EVENT_TOPICS, event_counts
 
 # -----------------------------
 # Environment / Logging
 # -----------------------------
 load_dotenv()
-INFURA_KEY = os.getenv("INFURA_KEY")
 SECRET_KEY = os.getenv("SECRET_KEY")
 DATA_DIR = os.getenv("DATA_DIR", "/app/data")
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")  # Use service name within docker-compose network
@@ -44,11 +57,11 @@ db_pool: asyncpg.Pool | None = None
 redis_client: Redis | None = None
 web3_clients: dict[str, AsyncWeb3] = {}
 
-# Correct Infura HTTP endpoints
-INFURA_HTTP = {
-    "ethereum": f"https://mainnet.infura.io/v3/{INFURA_KEY}",            # Ethereum mainnet
-    "polygon":  f"https://polygon-mainnet.infura.io/v3/{INFURA_KEY}",    # Polygon mainnet
-}
+# Shared chain client: per-chain endpoints (INFURA_KEY or RPC_URLS_<CHAIN>), one
+# pooled keep-alive session, 1.2s request timeout and one jittered retry by default
+# (RPC_TIMEOUT / RPC_RETRIES override). Raw JSON-RPC batches, the micro-batchers
+# and the web3 clients all send through it.
+rpc_client: ChainClient | None = None
 
 # Minimal ERC20 ABI (balanceOf)
 ERC20_ABI: list[Dict[str, Any]] = [
@@ -61,15 +74,90 @@ ERC20_ABI: list[Dict[str, Any]] = [
     }
 ]
 
-# Shared HTTP session for batched RPC (keep-alive to reduce latency)
-http_session: aiohttp.ClientSession | None = None
-RPC_TIMEOUT = aiohttp.ClientTimeout(total=1.2)
+# Cross-request micro-batching: eth_* calls from concurrent requests are merged
+# into one JSON-RPC batch per chain every RPC_BATCH_WINDOW_MS (or RPC_BATCH_MAX_ITEMS)
+rpc_batchers: dict[str, RpcMicroBatcher] = {}
+
+# Per-chain head tracker (latest block + gas price shared by all requests).
+# Set HEAD_WS_ENABLED=1 to follow newHeads over the chain's WebSocket endpoint instead of polling.
+HEAD_WS_ENABLED = os.getenv("HEAD_WS_ENABLED", "0") == "1"
+HEAD_POLL_INTERVAL = float(os.getenv("HEAD_POLL_INTERVAL", "2"))
+head_trackers: dict[str, ChainHeadTracker] = {}
+
+# Append-only audit history: DATA_DIR/audit_log/audit-<ms>-<pid>.ndjson segments
+AUDIT_LOG_DIR = os.path.join(DATA_DIR, "audit_log")
+AUDIT_LOG_SEGMENT_BYTES = int(os.getenv("AUDIT_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+AUDIT_LOG_SEGMENT_SECONDS = float(os.getenv("AUDIT_LOG_SEGMENT_SECONDS", "3600"))
+audit_log: SegmentLogWriter | None = None
+
+# Batched Postgres ingestion: rows are queued per request and written with COPY
+# every AUDIT_DB_BATCH_ROWS rows or AUDIT_DB_FLUSH_MS milliseconds
+AUDIT_DB_BATCH_ROWS = int(os.getenv("AUDIT_DB_BATCH_ROWS", "500"))
+AUDIT_DB_FLUSH_MS = float(os.getenv("AUDIT_DB_FLUSH_MS", "200"))
+AUDIT_DB_QUEUE_SIZE = int(os.getenv("AUDIT_DB_QUEUE_SIZE", "50000"))
+audit_ingest: PgBatchWriter | None = None
+
+# security_audits is range-partitioned by month (see audit_store.py); partitions
+# are kept AUDIT_PARTITION_MONTHS_AHEAD months ahead by a periodic task
+AUDIT_PARTITION_MONTHS_AHEAD = int(os.getenv("AUDIT_PARTITION_MONTHS_AHEAD", "2"))
+PARTITION_CHECK_INTERVAL = 6 * 3600
+partition_task: asyncio.Task | None = None
+HISTORY_MAX_LIMIT = 500
+
+# Persistent log indexer (contract_logs + log_checkpoints in Postgres).
+# LOG_REORG_DEPTH: blocks re-scanned when the checkpoint block was re-orged away
+LOG_REORG_DEPTH = {
+    "ethereum": int(os.getenv("LOG_REORG_DEPTH_ETHEREUM", "12")),
+    "polygon":  int(os.getenv("LOG_REORG_DEPTH_POLYGON", "128")),
+}
+LOG_INDEX_START_BLOCKS = int(os.getenv("LOG_INDEX_START_BLOCKS", "100"))  # first sync of a new contract
+LOG_INDEX_MAX_CHUNK = int(os.getenv("LOG_INDEX_MAX_CHUNK", "10000"))
+log_indexers: dict[str, LogIndexer] = {}
+
+# Shared ingestion: requests only add contracts to the chain's watch-set; one
+# worker per chain (Redis lease, any uvicorn worker can hold it) scans every
+# LOG_INGEST_INTERVAL seconds with address-array eth_getLogs calls
+LOG_INGEST_INTERVAL = float(os.getenv("LOG_INGEST_INTERVAL", "6"))
+LOG_INGEST_MAX_ADDRESSES = int(os.getenv("LOG_INGEST_MAX_ADDRESSES", "500"))
+LOG_INGEST_LOCK_FMT = "lock:logs:{chain}"
+LOG_LEASE_MS = int(os.getenv("LOG_LEASE_MS", "30000"))
+log_watched: dict[str, set[str]] = {}   # contracts this worker already registered
+EVENT_COUNT_MAX_BUCKETS = 1000
+ingest_tasks: list[asyncio.Task] = []
 
 # SWR cache parameters
-FRESH_TTL = 10        # Return immediately if cache is fresher than this (seconds)
+FRESH_TTL = 10        # Return immediately if cache is fresher than this (seconds); used when no chain head is known
 STALE_TTL = 120       # Max age for serving stale values (seconds)
-CACHE_KEY_FMT = "web3:{chain}:{addr}"
-CACHE_TS_FMT  = "web3ts:{chain}:{addr}"
+CACHE_KEY_FMT = "web3:{chain}:{addr}"  # value: {"ts": <unix>, "data": {...}}
+
+# In-process L1 in front of Redis (hot keys never leave the process)
+L1_CACHE_SIZE = int(os.getenv("L1_CACHE_SIZE", "10000"))
+l1_cache = LocalTTLCache(maxsize=L1_CACHE_SIZE, stale_ttl=STALE_TTL)
+
+# Cross-worker L1 invalidation: every store publishes the key it replaced
+INVALIDATION_CHANNEL = "web3:invalidate"
+WORKER_ID = uuid.uuid4().hex
+invalidation_task: asyncio.Task | None = None
+
+# Single-flight refreshes: one upstream batch per (chain, address) at a time,
+# in-process (shared task) and across workers (Redis lease)
+REFRESH_LOCK_FMT = "lock:web3:{chain}:{addr}"
+REFRESH_LEASE_MS = int(os.getenv("REFRESH_LEASE_MS", "3000"))  # > RPC_TIMEOUT
+REFRESH_POLL_INTERVAL = 0.05
+refresh_flight = SingleFlight()
+
+# Verified JWTs (hash -> payload until exp); repeat tokens skip jwt.decode
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+token_cache = VerifiedTokenCache(maxsize=JWT_CACHE_SIZE)
+
+# Optional per-user rate limit (fastapi-limiter, Redis): RATE_LIMIT_TIMES
+# requests per RATE_LIMIT_SECONDS per user and route; 0 disables it.
+# The route is part of the identifier: fastapi-limiter's own route index
+# compares route.path with the concrete path, so every parameterized route
+# would otherwise share one bucket.
+RATE_LIMIT_TIMES = int(os.getenv("RATE_LIMIT_TIMES", "0"))
+RATE_LIMIT_SECONDS = int(os.getenv("RATE_LIMIT_SECONDS", "60"))
+rate_limiter = RateLimiter(times=RATE_LIMIT_TIMES, seconds=RATE_LIMIT_SECONDS) if RATE_LIMIT_TIMES > 0 else None
 
 # -----------------------------
 # FastAPI app & lifespan
@@ -81,16 +169,24 @@ security = HTTPBearer()
 async def lifespan(app: FastAPI):
     """
     App lifespan context:
-      - Create Postgres connection pool
+      - Create Postgres connection pool, ensure the schema, start the batched writer
       - Connect to Redis and initialize fastapi-cache
-      - Initialize global Web3 clients (per chain)
-      - Create a long-lived aiohttp session for JSON-RPC
+      - Start the shared chain client (pooled JSON-RPC session, per-chain Web3 clients)
+      - Subscribe to L1 invalidations published by other workers
       - Cleanup all resources on shutdown
     """
-    global db_pool, redis_client, web3_clients, http_session
+    global db_pool, redis_client, web3_clients, rpc_client, invalidation_task, audit_log, audit_ingest, partition_task
 
     # Postgres pool
     db_pool = await asyncpg.create_pool(dsn=DATABASE_URL, min_size=1, max_size=10)
+    await audit_store.ensure_schema(db_pool, months_ahead=AUDIT_PARTITION_MONTHS_AHEAD)
+    partition_task = asyncio.create_task(_maintain_partitions())
+    await ensure_logs_schema(db_pool)
+    audit_ingest = PgBatchWriter(
+        db_pool, audit_store.TABLE, audit_store.INGEST_COLUMNS,
+        max_rows=AUDIT_DB_BATCH_ROWS, max_delay_ms=AUDIT_DB_FLUSH_MS, queue_size=AUDIT_DB_QUEUE_SIZE,
+    )
+    audit_ingest.start()
 
     # Redis (decode_responses=True to simplify JSON handling)
     redis_client = Redis.from_url(REDIS_URL, decode_responses=True)
@@ -103,25 +199,57 @@ async def lifespan(app: FastAPI):
 
     # Initialize fastapi-cache2 (available for any route-level caching you add later)
     FastAPICache.init(RedisBackend(redis_client), prefix="audit_cache")
-
-    if not INFURA_KEY or not SECRET_KEY:
-        raise ValueError("Missing INFURA_KEY or SECRET_KEY")
-
-    # Global Web3 instances for address normalization and get_logs usage
-    for chain, url in INFURA_HTTP.items():
-        web3_clients[chain] = AsyncWeb3(AsyncHTTPProvider(url))
-    logger.info("Web3 clients initialized.")
-
-    # Long-lived HTTP session significantly reduces RPC round-trips
-    http_session = aiohttp.ClientSession(timeout=RPC_TIMEOUT, trust_env=False)
+    if rate_limiter is not None:
+        await FastAPILimiter.init(redis_client, prefix="ratelimit", identifier=_rate_limit_identifier)
+
+    if not SECRET_KEY:
+        raise ValueError("Missing SECRET_KEY")
+
+    # Endpoints come from INFURA_KEY / RPC_URLS_<CHAIN>; ValueError if a chain has none.
+    # Hedged reads (RPC_HEDGE=0 to disable) only kick in for chains with 2+ endpoints.
+    rpc_client = ChainClient.from_env(timeout=1.2, retries=1, hedge=True)
+    await rpc_client.start()
+    for chain in rpc_client.chains:
+        # Web3 instances for address normalization and get_logs usage
+        web3_clients[chain] = rpc_client.web3(chain)
+        rpc_batchers[chain] = rpc_client.batcher(chain)
+        head_trackers[chain] = ChainHeadTracker(
+            chain, lambda reqs, chain=chain: rpc_client.batch(chain, reqs),
+            poll_interval=HEAD_POLL_INTERVAL,
+            ws_url=rpc_client.config(chain).ws_url if HEAD_WS_ENABLED else None,
+        )
+        head_trackers[chain].start()
+        log_indexers[chain] = LogIndexer(
+            db_pool, chain, lambda reqs, chain=chain: rpc_client.batch(chain, reqs),
+            lambda chain=chain: _head_block(chain),
+            reorg_depth=LOG_REORG_DEPTH.get(chain, 12), start_blocks=LOG_INDEX_START_BLOCKS,
+            max_chunk=LOG_INDEX_MAX_CHUNK, max_addresses=LOG_INGEST_MAX_ADDRESSES,
+        )
+        log_watched[chain] = set()
+        ingest_tasks.append(asyncio.create_task(_ingest_logs_loop(chain)))
+
+    invalidation_task = asyncio.create_task(_listen_invalidations())
+
+    # Single writer task for the append-only audit log
+    audit_log = SegmentLogWriter(
+        AUDIT_LOG_DIR, max_bytes=AUDIT_LOG_SEGMENT_BYTES, max_age=AUDIT_LOG_SEGMENT_SECONDS,
+    )
+    audit_log.start()
 
     yield
 
     # Cleanup
+    invalidation_task.cancel()
+    partition_task.cancel()
+    for task in ingest_tasks:
+        task.cancel()
+    for tracker in head_trackers.values():
+        await tracker.close()
+    await audit_log.close()
+    await audit_ingest.close()
     await db_pool.close()
     await redis_client.aclose()
-    if http_session:
-        await http_session.close()
+    await rpc_client.close()
 
 app.router.lifespan_context = lifespan
 
@@ -133,18 +261,44 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
     Verify JWT from Authorization header (HTTP Bearer):
       - Decode token using SECRET_KEY with HS256
       - Require 'exp' claim
+      - Tokens verified before are served from token_cache until their exp
       - Return decoded payload on success
       - Raise HTTP 403 on expiration or invalid token
     """
-    token = credentials.credentials
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"], options={"require_exp": True})
-        return payload
+        return decode_token(credentials.credentials)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=403, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=403, detail="Invalid token")
 
+def decode_token(token: str) -> Dict:
+    """Verified payload from token_cache, or a full jwt.decode (cached until exp)."""
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"], options={"require_exp": True})
+        token_cache.put(token, payload)
+    return payload
+
+async def _rate_limit_identifier(request: Request) -> str:
+    """Rate-limit bucket: the token's user when it verifies, else the client IP; per route template."""
+    route = request.scope.get("route")
+    route_key = f"{request.method}:{route.path if route is not None else request.url.path}"
+    auth = request.headers.get("Authorization", "")
+    if auth[:7].lower() == "bearer ":
+        try:
+            user = decode_token(auth[7:]).get("user")
+            if user:
+                return f"user:{user}:{route_key}"
+        except jwt.InvalidTokenError:
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}:{route_key}"
+
+async def rate_limit(request: Request, response: Response):
+    """Route dependency; no-op unless RATE_LIMIT_TIMES > 0 (raises HTTP 429 when exceeded)."""
+    if rate_limiter is not None:
+        await rate_limiter(request, response)
+
 # -----------------------------
 # Utilities
 # -----------------------------
@@ -157,109 +311,280 @@ async def ensure_await(maybe_coro):
         return await maybe_coro
     return maybe_coro
 
-async def rpc_batch(chain_name: str, requests: list[dict]) -> list[dict]:
-    """Send a JSON-RPC batch request to the given chain in a single HTTP round-trip."""
-    url = INFURA_HTTP[chain_name]
-    assert http_session is not None
-    headers = {"Content-Type": "application/json"}
-    async with http_session.post(url, json=requests, headers=headers) as resp:
-        if resp.status != 200:
-            text = await resp.text()
-            raise HTTPException(status_code=502, detail=f"RPC {resp.status}: {text[:200]}")
-        return await resp.json()
+def _cache_key(chain_name: str, checksum_addr: str) -> str:
+    return CACHE_KEY_FMT.format(chain=chain_name, addr=checksum_addr)
 
 async def _store_cache(chain_name: str, checksum_addr: str, payload: dict):
     """
-    Store response payload in Redis with a timestamp key.
-    Uses STALE_TTL for both the value and timestamp expirations.
+    Store payload and timestamp together as ONE Redis value ({"ts", "data"}),
+    written with a single SET (one round-trip; value and ts can never disagree).
+    Also updates the local L1 and tells other workers to drop their copy.
     """
     assert redis_client is not None
-    key = CACHE_KEY_FMT.format(chain=chain_name, addr=checksum_addr)
-    ts  = CACHE_TS_FMT.format(chain=chain_name, addr=checksum_addr)
+    key = _cache_key(chain_name, checksum_addr)
     now = int(time.time())
-    await redis_client.set(key, json.dumps(payload), ex=STALE_TTL)
-    await redis_client.set(ts, str(now), ex=STALE_TTL)
+    await redis_client.set(key, json.dumps({"ts": now, "data": payload}), ex=STALE_TTL)
+    l1_cache.set(key, payload, now)
+    await _publish_invalidation(key)
 
-async def _load_cache(chain_name: str, checksum_addr: str):
-    """
-    Load cached payload and timestamp from Redis.
-    Returns (data_dict or None, timestamp_int or None).
-    """
+async def _publish_invalidation(key: str):
+    """Best effort: a lost message only means another worker serves its L1 copy until FRESH_TTL."""
     assert redis_client is not None
-    key = CACHE_KEY_FMT.format(chain=chain_name, addr=checksum_addr)
-    ts  = CACHE_TS_FMT.format(chain=chain_name, addr=checksum_addr)
-    data_s, ts_s = await asyncio.gather(redis_client.get(key), redis_client.get(ts))
-    if not data_s:
+    try:
+        await redis_client.publish(INVALIDATION_CHANNEL, json.dumps({"key": key, "origin": WORKER_ID}))
+    except Exception as e:
+        logger.warning(f"L1 invalidation publish failed: {e}")
+
+async def _listen_invalidations():
+    """Drop L1 entries that another worker has just refreshed (Redis pub/sub)."""
+    assert redis_client is not None
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for msg in pubsub.listen():
+                if msg.get("type") != "message":
+                    continue
+                try:
+                    data = json.loads(msg["data"])
+                except Exception:
+                    continue
+                if data.get("origin") != WORKER_ID:
+                    l1_cache.invalidate(data.get("key", ""))
+        except asyncio.CancelledError:
+            await pubsub.reset()
+            raise
+        except Exception as e:
+            logger.error(f"L1 invalidation listener error: {e}; resubscribing")
+            await asyncio.sleep(1)
+
+def _decode_entry(raw: str | None):
+    """Parse a cache envelope; returns (data_dict or None, timestamp_int or None)."""
+    if not raw:
         return None, None
     try:
-        data = json.loads(data_s)
+        entry = json.loads(raw)
+        return entry["data"], int(entry["ts"])
     except Exception:
+        # Corrupt value or legacy (pre-envelope) layout: treat as a miss
         return None, None
-    return data, (int(ts_s) if ts_s else None)
+
+async def _load_cache(chain_name: str, checksum_addr: str):
+    """
+    Load cached payload and timestamp from Redis (single GET).
+    Returns (data_dict or None, timestamp_int or None).
+    """
+    assert redis_client is not None
+    return _decode_entry(await redis_client.get(_cache_key(chain_name, checksum_addr)))
+
+async def _load_cache_many(chain_name: str, checksum_addrs: list[str]) -> dict[str, tuple]:
+    """Bulk variant of _load_cache: one MGET round-trip for any number of addresses."""
+    assert redis_client is not None
+    if not checksum_addrs:
+        return {}
+    raws = await redis_client.mget([_cache_key(chain_name, a) for a in checksum_addrs])
+    return {a: _decode_entry(raw) for a, raw in zip(checksum_addrs, raws)}
 
 # -----------------------------
 # SWR + Batched RPC: sub-second responses
 # -----------------------------
+def _check_swr_ready(chain_name: str):
+    if redis_client is None:
+        raise HTTPException(status_code=500, detail="Redis not initialized")
+    if chain_name not in web3_clients:
+        raise HTTPException(status_code=400, detail=f"Unsupported chain: {chain_name}")
+
+def _is_fresh(chain_name: str, cached: Dict, ts: int) -> bool:
+    """
+    Block-driven freshness: an entry is fresh while it was computed at the
+    current chain head. Falls back to the FRESH_TTL age rule when the head
+    tracker has no recent head.
+    """
+    tracker = head_trackers.get(chain_name)
+    head = tracker.current() if tracker else None
+    if head is not None:
+        return cached.get("block_number", -1) >= head.block_number
+    return int(time.time()) - ts <= FRESH_TTL
+
+def _l1_fresh(chain_name: str, checksum_addr: str) -> Dict | None:
+    cached, ts = l1_cache.get(_cache_key(chain_name, checksum_addr))
+    if cached and _is_fresh(chain_name, cached, ts):
+        return cached
+    return None
+
+def _serve_cached(chain_name: str, checksum_addr: str, cached: Dict | None, ts: int | None) -> Dict | None:
+    """
+    Apply SWR to a value loaded from Redis: promote it to L1, return it if
+    fresh, return it and schedule a background refresh if stale, None on miss.
+    """
+    if not cached or not ts:
+        return None
+    l1_cache.set(_cache_key(chain_name, checksum_addr), cached, ts)
+    if not _is_fresh(chain_name, cached, ts) and not refresh_flight.in_flight((chain_name, checksum_addr)):
+        asyncio.create_task(_refresh_coalesced(chain_name, checksum_addr, wait=False))
+    return cached
+
 async def get_cached_web3_data(contract: str, chain_name: str) -> Dict:
     """
     SWR (stale-while-revalidate) fetch for per-contract, per-chain data:
-      1) If fresh cache exists (<= FRESH_TTL), return immediately.
+      1) If fresh cache exists (computed at the current head, or <= FRESH_TTL
+         when the head is unknown), return immediately.
       2) If stale cache exists, return stale value and trigger background refresh.
       3) If no cache, perform a synchronous refresh and return.
     """
-    if redis_client is None:
-        raise HTTPException(status_code=500, detail="Redis not initialized")
-    if chain_name not in INFURA_HTTP:
-        raise HTTPException(status_code=400, detail=f"Unsupported chain: {chain_name}")
+    _check_swr_ready(chain_name)
 
     # Normalize address to checksum format
     checksum_addr = web3_clients[chain_name].to_checksum_address(contract)
 
-    # 1) Try fresh cache
+    # 0) In-process L1: fresh hot keys are served without touching Redis
+    hit = _l1_fresh(chain_name, checksum_addr)
+    if hit:
+        return hit
+
+    # 1) + 2) Redis: fresh -> return, stale -> return and refresh in background
     cached, ts = await _load_cache(chain_name, checksum_addr)
-    now = int(time.time())
-    fresh = cached and ts and (now - ts) <= FRESH_TTL
-    if fresh:
-        return cached
+    hit = _serve_cached(chain_name, checksum_addr, cached, ts)
+    if hit:
+        return hit
 
-    # 2) Serve stale value and refresh in background
-    if cached:
-        asyncio.create_task(_refresh_live(chain_name, checksum_addr))
-        return cached
+    # 3) No cache: perform live refresh (one batched round-trip, shared by concurrent callers)
+    return await _refresh_coalesced(chain_name, checksum_addr)
+
+async def get_cached_web3_data_many(checksum_addrs: list[str], chain_name: str) -> dict[str, Dict]:
+    """
+    Multi-address SWR: L1 first, then ONE Redis MGET for the rest, then live
+    refreshes for remaining misses in parallel. Returns {address: data}.
+    """
+    _check_swr_ready(chain_name)
+    results: dict[str, Dict] = {}
+    pending = []
+    for addr in dict.fromkeys(checksum_addrs):
+        hit = _l1_fresh(chain_name, addr)
+        if hit:
+            results[addr] = hit
+        else:
+            pending.append(addr)
+
+    missing = []
+    for addr, (cached, ts) in (await _load_cache_many(chain_name, pending)).items():
+        hit = _serve_cached(chain_name, addr, cached, ts)
+        if hit:
+            results[addr] = hit
+        else:
+            missing.append(addr)
 
-    # 3) No cache: perform live refresh (one batched round-trip)
+    live = await asyncio.gather(*(_refresh_coalesced(chain_name, a) for a in missing), return_exceptions=True)
+    for addr, res in zip(missing, live):
+        results[addr] = {"error": getattr(res, "detail", str(res))} if isinstance(res, Exception) else res
+    return results
+
+async def _refresh_coalesced(chain_name: str, checksum_addr: str, wait: bool = True) -> Dict | None:
+    """
+    Deduplicated refresh. Concurrent callers in this process share one task;
+    across workers only the holder of the Redis lease calls the node.
+      wait=True : return fresh data (ours, or the other worker's via the cache)
+      wait=False: background SWR refresh; give up if another worker owns it
+    """
+    result = await refresh_flight.do(
+        (chain_name, checksum_addr), lambda: _refresh_with_lease(chain_name, checksum_addr, wait)
+    )
+    if result is None and wait:
+        # Joined a background flight that deferred to another worker
+        result = await _await_foreign_refresh(chain_name, checksum_addr)
+    return result
+
+async def _refresh_with_lease(chain_name: str, checksum_addr: str, wait: bool) -> Dict | None:
+    assert redis_client is not None
+    lock_key = REFRESH_LOCK_FMT.format(chain=chain_name, addr=checksum_addr)
+    try:
+        token = await acquire_lease(redis_client, lock_key, REFRESH_LEASE_MS)
+    except Exception as e:
+        # Lock service unavailable: refreshing anyway beats failing the request
+        logger.warning(f"refresh lease unavailable: {e}")
+        return await _refresh_live(chain_name, checksum_addr)
+
+    if token is None:
+        return await _await_foreign_refresh(chain_name, checksum_addr) if wait else None
+    try:
+        return await _refresh_live(chain_name, checksum_addr)
+    finally:
+        try:
+            await release_lease(redis_client, lock_key, token)
+        except Exception as e:
+            logger.warning(f"refresh lease release failed (expires in {REFRESH_LEASE_MS}ms): {e}")
+
+async def _await_foreign_refresh(chain_name: str, checksum_addr: str) -> Dict:
+    """
+    Another worker holds the lease: poll the cache for its fresh result for up
+    to one lease period, then fall back to refreshing ourselves.
+    """
+    deadline = time.monotonic() + REFRESH_LEASE_MS / 1000
+    while time.monotonic() < deadline:
+        await asyncio.sleep(REFRESH_POLL_INTERVAL)
+        cached, ts = await _load_cache(chain_name, checksum_addr)
+        if cached and ts and _is_fresh(chain_name, cached, ts):
+            l1_cache.set(_cache_key(chain_name, checksum_addr), cached, ts)
+            return cached
     return await _refresh_live(chain_name, checksum_addr)
 
+async def _result_or_none(call) -> Any:
+    """Per-item JSON-RPC errors read as a missing result."""
+    try:
+        return await call
+    except RpcError:
+        return None
+
+async def _balance_call(batcher: RpcMicroBatcher, call_obj: dict, block: str) -> Any:
+    """
+    eth_call result, or None when the call reverts (no balanceOf: balance 0).
+    Any other error (a provider behind the tracked head: "header not found",
+    "unknown block", ...) is raised - it says nothing about the balance.
+    """
+    try:
+        return await batcher.call("eth_call", [call_obj, block])
+    except RpcError as e:
+        if e.code == 3 or "revert" in str(e).lower():
+            return None
+        raise
+
 async def _refresh_live(chain_name: str, checksum_addr: str) -> Dict:
     """
-    Perform a live batched RPC refresh:
-      - eth_call(balanceOf(zero))
-      - eth_gasPrice
-      - eth_blockNumber
+    Perform a live RPC refresh through the chain's micro-batcher:
+      - eth_call(balanceOf(zero)) pinned to the tracked head block; if that
+        block is unknown to the provider serving the call, re-read at "latest"
+      - gas price / block number come from the head tracker; only when it has
+        no recent head are eth_gasPrice / eth_blockNumber fetched (and shared
+        with every refresh in the same batching window)
     On success, store to Redis and return the aggregated result.
-    On failure, fall back to cached stale value if available.
+    On failure (including an eth_call error other than a revert), fall back to
+    cached stale value if available; such errors are never cached as balance 0.
     """
     zero_addr = "0x0000000000000000000000000000000000000000"
     # keccak('balanceOf(address)') first 4 bytes: 0x70a08231
     data_balanceOf = "0x70a08231" + "0"*24 + zero_addr[2:]
     call_obj = {"to": checksum_addr, "data": data_balanceOf}
 
-    batch = [
-        {"jsonrpc": "2.0", "id": 1, "method": "eth_call",       "params": [call_obj, "latest"]},
-        {"jsonrpc": "2.0", "id": 2, "method": "eth_gasPrice",   "params": []},
-        {"jsonrpc": "2.0", "id": 3, "method": "eth_blockNumber","params": []},
-    ]
+    batcher = rpc_batchers[chain_name]
+    head = head_trackers[chain_name].current() if chain_name in head_trackers else None
     try:
-        resp = await rpc_batch(chain_name, batch)
-        by_id = {item["id"]: item for item in resp}
-
-        bal_hex = by_id[1].get("result")
-        gas_hex = by_id[2].get("result")
-        blk_hex = by_id[3].get("result")
+        if head is not None:
+            try:
+                bal_hex = await _balance_call(batcher, call_obj, hex(head.block_number))
+                gas_price, block_number = head.gas_price, head.block_number
+            except RpcError as e:
+                logger.warning(f"{chain_name}: eth_call at head {head.block_number} failed ({e}); retrying at latest")
+                head = None
+        if head is None:
+            bal_hex, gas_hex, blk_hex = await asyncio.gather(
+                _balance_call(batcher, call_obj, "latest"),
+                _result_or_none(batcher.call("eth_gasPrice")),
+                _result_or_none(batcher.call("eth_blockNumber")),
+            )
+            gas_price = int(gas_hex, 16) if gas_hex else 0
+            block_number = int(blk_hex, 16) if blk_hex else 0
 
         balance = int(bal_hex, 16) if bal_hex else 0
-        gas_price = int(gas_hex, 16) if gas_hex else 0
-        block_number = int(blk_hex, 16) if blk_hex else 0
 
         # Use gasPrice as a quick approximation (fast). For higher accuracy, merge with tip if needed.
         effective_gwei = gas_price / 10**9
@@ -285,115 +610,107 @@ async def _refresh_live(chain_name: str, checksum_addr: str) -> Dict:
 # -----------------------------
 # Async persistence (non-blocking)
 # -----------------------------
+async def _maintain_partitions():
+    """Create upcoming monthly security_audits partitions before rows need them."""
+    assert db_pool is not None
+    while True:
+        await asyncio.sleep(PARTITION_CHECK_INTERVAL)
+        try:
+            created = await audit_store.maintain_partitions(db_pool, AUDIT_PARTITION_MONTHS_AHEAD)
+            if created:
+                logger.info(f"created partitions: {created}")
+        except Exception as e:
+            logger.error(f"partition maintenance failed: {e}")
+
 async def write_db_file(contract: str, user: str | None, web3_data: Dict):
     """
     Persist the result asynchronously:
-      - Ensure table exists and insert JSON report into Postgres
-      - Append the same result to a JSON file on disk (DATA_DIR/audit_report.json)
+      - Queue the JSON report for the batched Postgres writer (COPY per flush)
+      - Append the same result to the segmented audit log (DATA_DIR/audit_log/)
     This function is designed for BackgroundTasks and should not block the response.
     """
     try:
-        assert db_pool is not None
+        assert audit_ingest is not None
         result = web3_data.copy()
         result["user"] = user
 
-        # Database write
-        async with db_pool.acquire() as conn:
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS security_audits (
-                    contract TEXT,
-                    chain TEXT,
-                    report JSONB
-                );
-            """)
-            await conn.execute(
-                "INSERT INTO security_audits (contract, chain, report) VALUES ($1, $2, $3);",
-                contract, web3_data["chain"], json.dumps(result)
-            )
-
-        # File append (create if not exists or invalid)
-        os.makedirs(DATA_DIR, exist_ok=True)
-        log_path = os.path.join(DATA_DIR, "audit_report.json")
+        # File append: O(1) enqueue; the single writer task batches + fsyncs
+        if audit_log is not None and not audit_log.append(result):
+            logger.warning("audit log queue full; record dropped")
 
-        try:
-            if not os.path.exists(log_path) or os.path.getsize(log_path) == 0:
-                with open(log_path, "w") as f:
-                    json.dump([result], f, indent=4)
-            else:
-                with open(log_path, "r+") as f:
-                    data = json.load(f)
-                    data.append(result)
-                    f.seek(0)
-                    json.dump(data, f, indent=4)
-                    f.truncate()
-        except json.JSONDecodeError:
-            with open(log_path, "w") as f:
-                json.dump([result], f, indent=4)
+        # Database write: O(1) enqueue; the writer task flushes many rows per COPY
+        row = (datetime.now(timezone.utc), web3_data["chain"], contract,
+               web3_data.get("block_number"), user, json.dumps(result))
+        if not audit_ingest.append(row):
+            logger.warning("security_audits ingest queue full; row dropped")
 
     except Exception as e:
         logger.error(f"Background task (write_db_file) error: {e}")
 
 # -----------------------------
-# Background incremental log fetch (non-blocking)
+# Background incremental log indexing (non-blocking)
 # -----------------------------
-def _jsonable_log(log: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Convert a Web3 log object to a JSON-serializable dict:
-      - Hex-encode bytes-like fields if needed
-      - Keep commonly used fields only
-    """
-    txh = log.get("transactionHash")
-    topics = log.get("topics", [])
-    return {
-        "address": log.get("address"),
-        "blockNumber": log.get("blockNumber"),
-        "data": log.get("data"),
-        "logIndex": log.get("logIndex"),
-        "transactionHash": txh.hex() if hasattr(txh, "hex") else txh,
-        "transactionIndex": log.get("transactionIndex"),
-        "topics": [t.hex() if hasattr(t, "hex") else t for t in topics],
-    }
-
-async def update_logs(contract: str, chain_name: str):
+async def _head_block(chain_name: str) -> int:
+    """Current block from the head tracker; one eth_blockNumber when it has no recent head."""
+    head = head_trackers[chain_name].current() if chain_name in head_trackers else None
+    if head is not None:
+        return head.block_number
+    return int(await rpc_batchers[chain_name].call("eth_blockNumber"), 16)
+
+async def watch_logs(contract: str, chain_name: str):
     """
-    Incrementally pull contract logs and cache them in Redis:
-      - Determine fromBlock using the last stored block or a recent window
-      - Fetch logs via web3.eth.get_logs
-      - Store logs and last processed block in Redis (short TTL)
-    Designed for use in a background task to avoid delaying responses.
+    Add a contract to the chain's log watch-set (Postgres, durable).
+    The per-chain ingestion loop picks it up on its next pass; requests never
+    scan logs themselves. Designed for use in a background task.
     """
-    if redis_client is None:
+    indexer = log_indexers.get(chain_name)
+    if indexer is None or contract in log_watched[chain_name]:
         return
     try:
-        w3 = web3_clients[chain_name]
-        key = f"logs:{chain_name}:{contract}"
-
-        last_block_s = await redis_client.get(f"{key}:last_block")
-        if last_block_s:
-            from_block = int(last_block_s) + 1
-        else:
-            current_block0 = await ensure_await(w3.eth.block_number)
-            from_block = max(current_block0 - 100, 0)
+        await indexer.watch(contract)
+        log_watched[chain_name].add(contract)
+    except Exception as e:
+        logger.error(f"watch_logs error: {e}")
 
-        current_block = await ensure_await(w3.eth.block_number)
-        if from_block > current_block:
+async def _ingest_logs_loop(chain_name: str):
+    """
+    Shared log ingestion for one chain: every LOG_INGEST_INTERVAL seconds the
+    lease holder advances the whole watch-set (one eth_getLogs per block range
+    per cohort of up to LOG_INGEST_MAX_ADDRESSES contracts) and fans the logs
+    out to per-contract rows. The lease is renewed while a pass is running.
+    """
+    assert redis_client is not None
+    indexer = log_indexers[chain_name]
+    lock_key = LOG_INGEST_LOCK_FMT.format(chain=chain_name)
+    while True:
+        await asyncio.sleep(LOG_INGEST_INTERVAL)
+        try:
+            token = await acquire_lease(redis_client, lock_key, LOG_LEASE_MS)
+            if token is None:
+                continue  # another worker is ingesting this chain
+            heartbeat = asyncio.create_task(_renew_lease(lock_key, token, LOG_LEASE_MS))
+            try:
+                await indexer.sync_many(await indexer.watched())
+            finally:
+                heartbeat.cancel()
+                await release_lease(redis_client, lock_key, token)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[{chain_name}] log ingestion pass failed: {e}")
+
+async def _renew_lease(lock_key: str, token: str, lease_ms: int):
+    assert redis_client is not None
+    while True:
+        await asyncio.sleep(lease_ms / 3000)
+        if not await extend_lease(redis_client, lock_key, token, lease_ms):
+            logger.warning(f"lost lease {lock_key}")
             return
 
-        logs = await w3.eth.get_logs({
-            "address": contract,
-            "fromBlock": from_block,
-            "toBlock": current_block
-        })
-        jsonable = [_jsonable_log(l) for l in logs]
-        await redis_client.set(key, json.dumps(jsonable), ex=300)
-        await redis_client.set(f"{key}:last_block", str(current_block), ex=300)
-    except Exception as e:
-        logger.error(f"update_logs error: {e}")
-
 # -----------------------------
 # Routes
 # -----------------------------
-@app.get("/security_audit/{contract}")
+@app.get("/security_audit/{contract}", dependencies=[Depends(rate_limit)])
 async def security_audit(
     contract: str,
     chain_name: str = "ethereum",
@@ -403,24 +720,145 @@ async def security_audit(
     """
     Security audit summary endpoint:
       - Returns cached (or freshly fetched) on-chain quick stats for the contract
-      - Schedules background tasks to persist the result and update logs
+      - Schedules background tasks to persist the result and watch the contract's logs
       - Authenticated via JWT (verify_token dependency)
     """
     # Hot path: return in <1s; cache hits are usually tens of milliseconds
     web3_data = await get_cached_web3_data(contract, chain_name)
+    checksum_address = web3_clients[chain_name].to_checksum_address(contract)
 
-    # Asynchronous persistence (DB + file)
-    background_tasks.add_task(write_db_file, contract, user.get("user"), web3_data)
+    # Asynchronous persistence (DB + file); stored under the checksum address
+    # so /security_audit/{contract}/history finds it whatever casing was sent
+    background_tasks.add_task(write_db_file, checksum_address, user.get("user"), web3_data)
 
-    # Non-blocking incremental log ingestion
-    try:
-        checksum_address = web3_clients[chain_name].to_checksum_address(contract)
-        background_tasks.add_task(update_logs, checksum_address, chain_name)
-    except Exception as e:
-        logger.error(f"schedule update_logs failed: {e}")
+    # Register for shared background log ingestion (no per-request scan)
+    background_tasks.add_task(watch_logs, checksum_address, chain_name)
 
     return web3_data
 
+BATCH_MAX_CONTRACTS = int(os.getenv("BATCH_MAX_CONTRACTS", "500"))
+
+class BatchAuditRequest(BaseModel):
+    contracts: list[str] = Field(..., min_length=1)
+    chain_name: str = "ethereum"
+
+@app.post("/security_audit/batch", dependencies=[Depends(rate_limit)])
+async def security_audit_batch(
+    req: BatchAuditRequest,
+    user: Dict = Depends(verify_token),
+    background_tasks: BackgroundTasks = BackgroundTasks(),
+):
+    """
+    Multi-address variant of /security_audit/{contract}:
+      - One Redis MGET for every address not already fresh in L1
+      - Live refreshes for misses run concurrently
+      - Returns results in request order; per-address upstream errors are inline
+    """
+    if len(req.contracts) > BATCH_MAX_CONTRACTS:
+        raise HTTPException(status_code=413, detail=f"Too many contracts (max {BATCH_MAX_CONTRACTS})")
+    if req.chain_name not in web3_clients:
+        raise HTTPException(status_code=400, detail=f"Unsupported chain: {req.chain_name}")
+    w3 = web3_clients[req.chain_name]
+    try:
+        addrs = [w3.to_checksum_address(c) for c in req.contracts]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid address: {e}")
+
+    data = await get_cached_web3_data_many(addrs, req.chain_name)
+
+    for addr in dict.fromkeys(addrs):
+        if "error" not in data[addr]:
+            background_tasks.add_task(write_db_file, addr, user.get("user"), data[addr])
+            background_tasks.add_task(watch_logs, addr, req.chain_name)
+
+    return [{"contract": addr, **data[addr]} for addr in addrs]
+
+@app.get("/security_audit/{contract}/history", dependencies=[Depends(rate_limit)])
+async def security_audit_history(
+    contract: str,
+    chain_name: str = "ethereum",
+    limit: int = Query(50, ge=1, le=HISTORY_MAX_LIMIT),
+    cursor: str | None = None,
+    since: datetime | None = None,
+    user: Dict = Depends(verify_token),
+):
+    """
+    Past audits of one contract, newest first:
+      - Keyset pagination: pass `next_cursor` from the previous page as `cursor`
+      - Optional `since` (ISO-8601) limits the scan to recent partitions
+    """
+    if db_pool is None:
+        raise HTTPException(status_code=500, detail="Database not initialized")
+    if chain_name not in web3_clients:
+        raise HTTPException(status_code=400, detail=f"Unsupported chain: {chain_name}")
+    try:
+        checksum_addr = web3_clients[chain_name].to_checksum_address(contract)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid address: {e}")
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    try:
+        page = await audit_store.fetch_history(db_pool, chain_name, checksum_addr, limit, cursor, since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"contract": checksum_addr, "chain": chain_name, **page}
+
+@app.get("/events/{contract}/counts", dependencies=[Depends(rate_limit)])
+async def contract_event_counts(
+    contract: str,
+    chain_name: str = "ethereum",
+    event: str = "Transfer",
+    from_block: int | None = Query(None, ge=0),
+    to_block: int | None = Query(None, ge=0),
+    bucket: int = Query(1000, ge=1),
+    user: Dict = Depends(verify_token),
+    background_tasks: BackgroundTasks = BackgroundTasks(),
+):
+    """
+    Decoded event counts per block range, served from the event index:
+      - `event`: Transfer, Approval, OwnershipTransferred, Paused or Unpaused
+      - [from_block, to_block] split into `bucket`-block ranges (defaults: the
+        last 100 buckets up to the indexed block, not before `indexed_from`)
+      - [`indexed_from`, `indexed_to`] is the block range the index covers;
+        ingestion starts near the head when a contract is first watched, so a
+        range starting before `indexed_from` is refused (409) rather than
+        answered with zeros; contracts not yet watched are registered for
+        ingestion and return no buckets until indexed
+    """
+    if db_pool is None:
+        raise HTTPException(status_code=500, detail="Database not initialized")
+    if chain_name not in web3_clients:
+        raise HTTPException(status_code=400, detail=f"Unsupported chain: {chain_name}")
+    if event not in EVENT_TOPICS:
+        raise HTTPException(status_code=400, detail=f"Unsupported event: {event} (one of {sorted(EVENT_TOPICS)})")
+    try:
+        checksum_addr = web3_clients[chain_name].to_checksum_address(contract)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid address: {e}")
+
+    indexed = await log_indexers[chain_name].indexed_range(checksum_addr)
+    if indexed is None:
+        background_tasks.add_task(watch_logs, checksum_addr, chain_name)
+        return {"contract": checksum_addr, "chain": chain_name, "event": event,
+                "indexed_from": None, "indexed_to": None, "buckets": []}
+    indexed_from, indexed_to = indexed
+
+    if from_block is not None and from_block < indexed_from:
+        raise HTTPException(
+            status_code=409,
+            detail=f"from_block {from_block} is before indexed_from {indexed_from} (blocks not indexed)",
+        )
+    to_block = min(to_block if to_block is not None else indexed_to, indexed_to)
+    from_block = from_block if from_block is not None else max(to_block - bucket * 100 + 1, indexed_from)
+    if from_block > to_block:
+        raise HTTPException(status_code=400, detail="from_block is after to_block (or beyond indexed_to)")
+    if (to_block - from_block) // bucket + 1 > EVENT_COUNT_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Too many buckets (max {EVENT_COUNT_MAX_BUCKETS})")
+
+    buckets = await event_counts(db_pool, chain_name, checksum_addr, event, from_block, to_block, bucket)
+    return {"contract": checksum_addr, "chain": chain_name, "event": event,
+            "indexed_from": indexed_from, "indexed_to": indexed_to, "from_block": from_block, "to_block": to_block, "bucket": bucket, "buckets": buckets}
+
 @app.get("/health")
 async def health():
     """
@@ -436,6 +874,13 @@ async def health():
             async with db_pool.acquire() as conn:
                 await conn.execute("SELECT 1;")
             db_ok = True
-        return {"ok": True, "redis": bool(pong), "db": db_ok}
+        return {"ok": True, "redis": bool(pong), "db": db_ok, "l1_cache": l1_cache.stats(),
+                "refresh": refresh_flight.stats(),
+                "rpc": rpc_client.stats() if rpc_client else None,
+                "chain_heads": {c: t.status() for c, t in head_trackers.items()},
+                "audit_log": {"queue_depth": audit_log.queue_depth(), **audit_log.stats} if audit_log else None,
+                "db_ingest": audit_ingest.status() if audit_ingest else None,
+                "log_index": {c: i.status() for c, i in log_indexers.items()},
+                "jwt_cache": token_cache.stats()}
     except Exception as e:
         return {"ok": False, "error": str(e)}
@@ -0,0 +1,180 @@
+"""
+security_audits storage: partitioned schema, partition maintenance and
+keyset-paginated history reads.
+
+Layout:
+    security_audits                   parent, PARTITION BY RANGE (created_at)
+    security_audits_YYYYMM            one partition per month (created ahead of time)
+    security_audits_default           catch-all for rows outside the prepared range
+
+Index (chain, contract, created_at DESC, id DESC) matches the history query
+exactly, so a page is an index range scan on the newest partitions only.
+"""
+import base64
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+TABLE = "security_audits"
+# Columns written by the batched ingest (id is BIGSERIAL; identity columns on
+# partitioned tables need Postgres 17)
+INGEST_COLUMNS = ("created_at", "chain", "contract", "block_number", "username", "report")
+
+# Serializes DDL between workers starting at the same time
+_SCHEMA_LOCK_ID = 0x5EC0A0D1
+
+_SCHEMA_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {TABLE} (
+        id           BIGSERIAL,
+        created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+        chain        TEXT NOT NULL,
+        contract     TEXT NOT NULL,
+        block_number BIGINT,
+        username     TEXT,
+        report       JSONB NOT NULL,
+        PRIMARY KEY (created_at, id)
+    ) PARTITION BY RANGE (created_at);
+    CREATE INDEX IF NOT EXISTS {TABLE}_chain_contract_created_idx
+        ON {TABLE} (chain, contract, created_at DESC, id DESC);
+    CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT;
+"""
+
+
+# -----------------------------
+# Schema / partitions
+# -----------------------------
+def _month_start(dt: datetime, offset: int = 0) -> datetime:
+    index = dt.year * 12 + (dt.month - 1) + offset
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+async def ensure_partitions(conn: asyncpg.Connection, months_ahead: int = 2) -> list[str]:
+    """Create monthly partitions from the current month up to `months_ahead` ahead."""
+    now = datetime.now(timezone.utc)
+    created = []
+    for offset in range(months_ahead + 1):
+        start, end = _month_start(now, offset), _month_start(now, offset + 1)
+        name = f"{TABLE}_{start:%Y%m}"
+        exists = await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", name)
+        if exists:
+            continue
+        await conn.execute(
+            f"CREATE TABLE {name} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        created.append(name)
+    return created
+
+
+async def _migrate_legacy(conn: asyncpg.Connection) -> None:
+    """
+    Older deployments have an unpartitioned security_audits(contract, chain, report).
+    Rename it, create the partitioned table, and copy its rows over (their
+    creation time was never recorded, so they are stamped with the migration time).
+    """
+    relkind = await conn.fetchval(
+        "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = $1 AND n.nspname = current_schema()", TABLE,
+    )
+    if relkind != "r":
+        return
+    legacy = f"{TABLE}_legacy"
+    await conn.execute(f"ALTER TABLE {TABLE} RENAME TO {legacy}")
+    await conn.execute(_SCHEMA_SQL)
+    await ensure_partitions(conn)
+    moved = await conn.execute(f"""
+        INSERT INTO {TABLE} (chain, contract, block_number, username, report)
+        SELECT chain, contract, (report->>'block_number')::BIGINT, report->>'user', report
+        FROM {legacy}
+    """)
+    logger.info(f"migrated legacy {TABLE} into partitioned table ({moved}); old rows kept in {legacy}")
+
+
+async def ensure_schema(pool: asyncpg.Pool, months_ahead: int = 2) -> None:
+    """Idempotent: safe to run from every worker at startup."""
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", _SCHEMA_LOCK_ID)
+            await _migrate_legacy(conn)
+            await conn.execute(_SCHEMA_SQL)
+            await ensure_partitions(conn, months_ahead)
+
+
+async def maintain_partitions(pool: asyncpg.Pool, months_ahead: int = 2) -> list[str]:
+    """Periodic job: keep the next months' partitions created before rows arrive."""
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", _SCHEMA_LOCK_ID)
+            return await ensure_partitions(conn, months_ahead)
+
+
+# -----------------------------
+# Keyset pagination
+# -----------------------------
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    # exact integer microseconds (float timestamps can be off by one and skip rows)
+    micros = (created_at - _EPOCH) // timedelta(microseconds=1)
+    return base64.urlsafe_b64encode(f"{micros}:{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Raises ValueError on a malformed cursor."""
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    micros, row_id = raw.split(":", 1)
+    try:
+        created_at = _EPOCH + timedelta(microseconds=int(micros))
+    except OverflowError:
+        raise ValueError("cursor timestamp out of range")
+    row_id = int(row_id)
+    if not 0 <= row_id < 2**63:  # bigint id; anything else would fail in the query instead
+        raise ValueError("cursor id out of range")
+    return created_at, row_id
+
+
+async def fetch_history(pool: asyncpg.Pool, chain: str, contract: str, limit: int = 50,
+                        cursor: str | None = None, since: datetime | None = None) -> dict:
+    """
+    Newest-first audit history for one (chain, contract).
+
+    Keyset pagination: the next page starts strictly after the (created_at, id)
+    of the last row returned, so page N costs the same as page 1 (no OFFSET
+    scan). `since` bounds created_at and lets Postgres prune older partitions.
+    """
+    conditions = ["chain = $1", "contract = $2"]
+    args: list = [chain, contract]
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        args += [created_at, row_id]
+        conditions.append(f"(created_at, id) < (${len(args) - 1}, ${len(args)})")
+    if since is not None:
+        args.append(since)
+        conditions.append(f"created_at >= ${len(args)}")
+    args.append(limit + 1)
+    sql = (
+        f"SELECT id, created_at, block_number, username, report FROM {TABLE} "
+        f"WHERE {' AND '.join(conditions)} "
+        f"ORDER BY created_at DESC, id DESC LIMIT ${len(args)}"
+    )
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(sql, *args)
+
+    page, more = rows[:limit], len(rows) > limit
+    items = [
+        {
+            "id": r["id"],
+            "created_at": r["created_at"].isoformat(),
+            "block_number": r["block_number"],
+            "user": r["username"],
+            "report": json.loads(r["report"]),
+        }
+        for r in page
+    ]
+    next_cursor = encode_cursor(page[-1]["created_at"], page[-1]["id"]) if more else None
+    return {"items": items, "next_cursor": next_cursor}
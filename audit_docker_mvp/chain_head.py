@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChainHead:
+    block_number: int
+    gas_price: int          # wei
+    updated_at: float       # unix time the head was observed
+
+
+class ChainHeadTracker:
+    """
+    Keeps the latest block number and gas price of one chain in memory.
+
+    Polling mode: one JSON-RPC batch [eth_blockNumber, eth_gasPrice] every
+    `poll_interval` seconds. WS mode (when `ws_url` is set): subscribe to
+    newHeads and fetch eth_gasPrice once per new block; on WS failure it falls
+    back to polling until the subscription is re-established.
+    Readers just look at `head`; no request ever waits on this tracker.
+    """
+
+    def __init__(self, chain: str, send: Callable[[list[dict]], Awaitable[list[dict]]],
+                 poll_interval: float = 2.0, ws_url: str | None = None, max_age: float = 30.0):
+        self.chain = chain
+        self._send = send
+        self.poll_interval = poll_interval
+        self.ws_url = ws_url
+        self.max_age = max_age
+        self.head: ChainHead | None = None
+        self._task: asyncio.Task | None = None
+        self._ws_session: aiohttp.ClientSession | None = None
+
+    # ---- read side ----
+    def current(self) -> ChainHead | None:
+        """Latest head, or None if unknown / older than max_age (tracker unhealthy)."""
+        head = self.head
+        if head is None or time.time() - head.updated_at > self.max_age:
+            return None
+        return head
+
+    def status(self) -> dict:
+        head = self.head
+        return {
+            "mode": "ws" if self.ws_url else "poll",
+            "block_number": head.block_number if head else None,
+            "gas_price": head.gas_price if head else None,
+            "age_s": round(time.time() - head.updated_at, 3) if head else None,
+        }
+
+    # ---- lifecycle ----
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._ws_loop() if self.ws_url else self._poll_loop())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._ws_session:
+            await self._ws_session.close()
+
+    # ---- updates ----
+    async def _rpc(self, batch: list[dict]) -> dict[int, str | None]:
+        resp = await self._send(batch)
+        return {item["id"]: item.get("result") for item in resp}
+
+    async def poll_once(self) -> None:
+        res = await self._rpc([
+            {"jsonrpc": "2.0", "id": 1, "method": "eth_blockNumber", "params": []},
+            {"jsonrpc": "2.0", "id": 2, "method": "eth_gasPrice", "params": []},
+        ])
+        if res.get(1) and res.get(2):
+            self._set(int(res[1], 16), int(res[2], 16))
+
+    async def _on_new_head(self, block_number: int) -> None:
+        res = await self._rpc([{"jsonrpc": "2.0", "id": 1, "method": "eth_gasPrice", "params": []}])
+        if res.get(1):
+            self._set(block_number, int(res[1], 16))
+
+    def _set(self, block_number: int, gas_price: int) -> None:
+        prev = self.head
+        if prev is not None and block_number < prev.block_number:
+            return  # late/out-of-order response
+        self.head = ChainHead(block_number, gas_price, time.time())
+
+    async def _poll_loop(self, until: float | None = None) -> None:
+        while until is None or time.monotonic() < until:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[{self.chain}] head poll failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _ws_loop(self) -> None:
+        self._ws_session = aiohttp.ClientSession(trust_env=False)
+        backoff = 1.0
+        while True:
+            try:
+                await self.poll_once()  # seed the head before the first newHeads arrives
+                async with self._ws_session.ws_connect(self.ws_url, heartbeat=30) as ws:
+                    await ws.send_json({"jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["newHeads"]})
+                    backoff = 1.0
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        data = msg.json()
+                        if data.get("method") != "eth_subscription":
+                            continue
+                        header = data["params"]["result"]
+                        await self._on_new_head(int(header["number"], 16))
+                raise ConnectionError("newHeads subscription closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[{self.chain}] newHeads stream failed: {e}; polling for {backoff:.0f}s")
+                # keep the head moving while the socket is down
+                await self._poll_loop(until=time.monotonic() + backoff)
+                backoff = min(backoff * 2, 60.0)
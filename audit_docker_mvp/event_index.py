@@ -0,0 +1,146 @@
+"""
+Decode stage + event index for ingested logs.
+
+Known signatures (the events behind what run_audit probes: token movement,
+ownership and pause state) are decoded once, at ingestion time, into
+contract_events keyed by (chain, contract, topic0, block_number). Consumers
+query the index instead of re-decoding raw hex or re-scanning the chain.
+"""
+import json
+from typing import Any
+
+import asyncpg
+from eth_utils import keccak, to_checksum_address
+
+
+def _topic0(signature: str) -> str:
+    return "0x" + keccak(text=signature).hex()
+
+
+# name -> topic0 (ERC-20 and ERC-721 share Transfer/Approval topic0; they are
+# told apart by the number of indexed topics)
+EVENT_TOPICS: dict[str, str] = {
+    "Transfer": _topic0("Transfer(address,address,uint256)"),
+    "Approval": _topic0("Approval(address,address,uint256)"),
+    "OwnershipTransferred": _topic0("OwnershipTransferred(address,address)"),
+    "Paused": _topic0("Paused(address)"),
+    "Unpaused": _topic0("Unpaused(address)"),
+}
+EVENT_NAMES: dict[str, str] = {topic: name for name, topic in EVENT_TOPICS.items()}
+
+EVENTS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS contract_events (
+        chain        TEXT NOT NULL,
+        contract     TEXT NOT NULL,
+        topic0       TEXT NOT NULL,
+        event        TEXT NOT NULL,
+        block_number BIGINT NOT NULL,
+        log_index    INT NOT NULL,
+        tx_hash      TEXT NOT NULL,
+        args         JSONB NOT NULL,
+        PRIMARY KEY (chain, block_number, log_index)
+    );
+    CREATE INDEX IF NOT EXISTS contract_events_contract_topic_block_idx
+        ON contract_events (chain, contract, topic0, block_number);
+"""
+
+INSERT_EVENT_SQL = """
+    INSERT INTO contract_events
+        (chain, contract, topic0, event, block_number, log_index, tx_hash, args)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    ON CONFLICT DO NOTHING
+"""
+
+
+# -----------------------------
+# Decoding
+# -----------------------------
+def _addr(word: str) -> str:
+    """Address from a 32-byte topic/data word (last 20 bytes)."""
+    return to_checksum_address("0x" + word[-40:])
+
+
+def _uint(word: str) -> str:
+    # decimal string: uint256 does not fit JSON numbers / BIGINT
+    return str(int(word, 16)) if word and word != "0x" else "0"
+
+
+def decode_log(log: dict) -> tuple[str, dict[str, Any]] | None:
+    """
+    Decode a raw JSON-RPC log of a known event into (event_name, args).
+    Returns None for unknown signatures or logs that do not match the
+    expected layout (e.g. non-standard indexing).
+    """
+    topics = log.get("topics") or []
+    if not topics:
+        return None
+    name = EVENT_NAMES.get(topics[0].lower())
+    if name is None:
+        return None
+    data = (log.get("data") or "0x")[2:]
+    try:
+        if name in ("Transfer", "Approval"):
+            a, b = ("from", "to") if name == "Transfer" else ("owner", "spender")
+            if len(topics) == 3:              # ERC-20: amount in data
+                return name, {a: _addr(topics[1]), b: _addr(topics[2]), "value": _uint(data[:64])}
+            if len(topics) == 4:              # ERC-721: tokenId indexed
+                return name, {a: _addr(topics[1]), b: _addr(topics[2]), "tokenId": _uint(topics[3])}
+            return None
+        if name == "OwnershipTransferred":
+            if len(topics) == 3:
+                return name, {"previousOwner": _addr(topics[1]), "newOwner": _addr(topics[2])}
+            return None
+        # Paused / Unpaused (OpenZeppelin): account is not indexed
+        if len(topics) == 1 and len(data) >= 64:
+            return name, {"account": _addr(data[:64])}
+        if len(topics) == 2:
+            return name, {"account": _addr(topics[1])}
+        return None
+    except ValueError:
+        return None
+
+
+def event_row(chain: str, contract: str, log: dict) -> tuple | None:
+    """contract_events row for a raw log, or None if it is not a known event."""
+    decoded = decode_log(log)
+    if decoded is None:
+        return None
+    name, args = decoded
+    return (
+        chain, contract, log["topics"][0].lower(), name,
+        int(log["blockNumber"], 16), int(log["logIndex"], 16), log["transactionHash"],
+        json.dumps(args),
+    )
+
+
+# -----------------------------
+# Queries
+# -----------------------------
+async def event_counts(pool: asyncpg.Pool, chain: str, contract: str, event: str,
+                       from_block: int, to_block: int, bucket: int) -> list[dict]:
+    """
+    Event counts per `bucket`-block range in [from_block, to_block] (index
+    range scan on (chain, contract, topic0, block_number)). For ERC-20
+    Transfer/Approval the summed `value` is returned as a decimal string.
+    """
+    rows_sql = """
+        SELECT (block_number / $5) * $5 AS bucket_start,
+               count(*) AS count,
+               sum((args->>'value')::numeric) AS volume
+        FROM contract_events
+        WHERE chain = $1 AND contract = $2 AND topic0 = $3
+          AND block_number BETWEEN $4 AND $6
+        GROUP BY 1
+        ORDER BY 1
+    """
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(rows_sql, chain, contract, EVENT_TOPICS[event], from_block, bucket, to_block)
+    return [
+        {
+            "from_block": max(r["bucket_start"], from_block),
+            "to_block": min(r["bucket_start"] + bucket - 1, to_block),
+            "count": r["count"],
+            "volume": str(r["volume"]) if r["volume"] is not None else None,
+        }
+        for r in rows
+    ]
@@ -0,0 +1,54 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+
+class LocalTTLCache:
+    """
+    Bounded in-process LRU for SWR entries (L1 in front of Redis).
+
+    Each entry keeps the timestamp it was produced at (not the time it was
+    inserted), so freshness decisions match the Redis copy exactly:
+      - age <= fresh_ttl  -> fresh
+      - age <= stale_ttl  -> stale but servable
+      - older             -> evicted on access
+    Not thread-safe by design: it is only touched from the event loop.
+    """
+
+    def __init__(self, maxsize: int, stale_ttl: int):
+        self.maxsize = maxsize
+        self.stale_ttl = stale_ttl
+        self._data: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Tuple[Optional[Any], Optional[int]]:
+        """Return (value, ts) or (None, None) if missing/expired."""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None, None
+        value, ts = item
+        if int(time.time()) - ts > self.stale_ttl:
+            del self._data[key]
+            self.misses += 1
+            return None, None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value, ts
+
+    def set(self, key: str, value: Any, ts: int) -> None:
+        # Never let an older copy (e.g. a late Redis read) overwrite a newer one
+        current = self._data.get(key)
+        if current is not None and current[1] > ts:
+            return
+        self._data[key] = (value, ts)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,365 @@
+"""
+Persistent, resumable contract log indexer (Postgres).
+
+Tables:
+    contract_logs      one row per log, PK (chain, block_number, log_index)
+    log_checkpoints    first and last indexed block (+ the last one's hash) per (chain, contract)
+    log_watchlist      contracts the background ingestion keeps up to date
+    contract_events    decoded known events (see event_index.py), same transaction
+
+Each chunk of logs is written in the same transaction as the checkpoint that
+covers it, so a crash never loses or double-counts a range: the next sync
+resumes at checkpoint + 1.
+
+Ingestion of a contract starts `start_blocks` behind the head, not at its
+deployment: `first_block` records where its coverage begins, so consumers can
+tell "no events" from "not indexed".
+
+Re-orgs: the hash of the checkpoint block is stored with it. If the chain
+now reports a different hash at that height, the last `reorg_depth` blocks
+are deleted and re-scanned.
+
+A checkpoint never advances without that hash: when the provider serving a
+range has no header for its last block yet (it lags the tracked head, e.g.
+another endpoint behind the router), its eth_getLogs may silently leave those
+blocks out, so the range is shrunk towards the checkpoint and, failing that,
+retried on the next sync.
+
+Block ranges for eth_getLogs adapt to provider limits: the chunk is halved
+when the provider rejects a range (too many results / range too large) and
+doubled again after a streak of responses well under `target_logs`.
+"""
+import logging
+import re
+import time
+from typing import Awaitable, Callable
+
+import asyncpg
+
+from event_index import EVENTS_SCHEMA, INSERT_EVENT_SQL, event_row
+from chain_client import RpcError
+
+logger = logging.getLogger(__name__)
+
+LOGS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS contract_logs (
+        chain        TEXT NOT NULL,
+        contract     TEXT NOT NULL,
+        block_number BIGINT NOT NULL,
+        log_index    INT NOT NULL,
+        block_hash   TEXT NOT NULL,
+        tx_hash      TEXT NOT NULL,
+        tx_index     INT,
+        topics       TEXT[] NOT NULL,
+        data         TEXT NOT NULL,
+        PRIMARY KEY (chain, block_number, log_index)
+    );
+    CREATE INDEX IF NOT EXISTS contract_logs_contract_block_idx
+        ON contract_logs (chain, contract, block_number);
+    CREATE TABLE IF NOT EXISTS log_checkpoints (
+        chain           TEXT NOT NULL,
+        contract        TEXT NOT NULL,
+        last_block      BIGINT NOT NULL,
+        last_block_hash TEXT,
+        first_block     BIGINT,
+        updated_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (chain, contract)
+    );
+    -- checkpoints written before first_block existed: unknown start, so claim
+    -- coverage only from the next block on
+    ALTER TABLE log_checkpoints ADD COLUMN IF NOT EXISTS first_block BIGINT;
+    UPDATE log_checkpoints SET first_block = last_block + 1 WHERE first_block IS NULL;
+    CREATE TABLE IF NOT EXISTS log_watchlist (
+        chain    TEXT NOT NULL,
+        contract TEXT NOT NULL,
+        added_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (chain, contract)
+    );
+"""
+
+_INSERT_LOG_SQL = """
+    INSERT INTO contract_logs
+        (chain, contract, block_number, log_index, block_hash, tx_hash, tx_index, topics, data)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+    ON CONFLICT DO NOTHING
+"""
+
+_UPSERT_CHECKPOINT_SQL = """
+    INSERT INTO log_checkpoints (chain, contract, last_block, last_block_hash, first_block, updated_at)
+    VALUES ($1, $2, $3, $4, $5, now())
+    ON CONFLICT (chain, contract) DO UPDATE
+        SET last_block = EXCLUDED.last_block,
+            last_block_hash = EXCLUDED.last_block_hash,
+            updated_at = now()
+"""
+
+# Provider messages meaning "ask for a smaller range" (Infura -32005, Alchemy,
+# QuickNode, public Polygon RPCs, ...)
+_RANGE_LIMIT_RE = re.compile(
+    r"more than \d+ results|response size|range (is )?too (large|wide|big)|block range|"
+    r"too many (results|logs|blocks)|query timeout",
+    re.IGNORECASE,
+)
+
+
+class RangeTooLarge(Exception):
+    """The provider refused an eth_getLogs range even at the minimum chunk size."""
+
+
+class HeaderUnavailable(Exception):
+    """The provider returned no header for the last block of a range: it has not seen that block yet."""
+
+    def __init__(self, block: int):
+        super().__init__(f"no header for block {block} yet")
+        self.block = block
+
+
+async def ensure_schema(pool: asyncpg.Pool) -> None:
+    async with pool.acquire() as conn:
+        await conn.execute(LOGS_SCHEMA)
+        await conn.execute(EVENTS_SCHEMA)
+
+
+def _is_range_limit(err: RpcError) -> bool:
+    # matched on the message: -32005 alone also means "rate limited" on Infura
+    return bool(_RANGE_LIMIT_RE.search(str(err)))
+
+
+def _log_row(chain: str, contract: str, log: dict) -> tuple:
+    return (
+        chain, contract, int(log["blockNumber"], 16), int(log["logIndex"], 16),
+        log["blockHash"], log["transactionHash"],
+        int(log["transactionIndex"], 16) if log.get("transactionIndex") else None,
+        list(log.get("topics") or []), log.get("data") or "0x",
+    )
+
+
+class LogIndexer:
+    """
+    Incremental eth_getLogs indexer for one chain (single contract or a whole watch-set).
+
+    `send` posts a raw JSON-RPC batch (same callable the head tracker uses);
+    `head` returns the current block number. One instance per chain keeps the
+    adapted chunk size across syncs.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, chain: str,
+                 send: Callable[[list[dict]], Awaitable[list[dict]]],
+                 head: Callable[[], Awaitable[int]],
+                 reorg_depth: int = 12, start_blocks: int = 100,
+                 initial_chunk: int = 2000, max_chunk: int = 10000, target_logs: int = 5000,
+                 max_blocks_per_sync: int = 50000, max_addresses: int = 500):
+        self.pool = pool
+        self.chain = chain
+        self._send = send
+        self._head = head
+        self.reorg_depth = reorg_depth
+        self.start_blocks = start_blocks
+        self.chunk = initial_chunk
+        self._good_ranges = 0
+        self.max_chunk = max_chunk
+        self.target_logs = target_logs
+        self.max_blocks_per_sync = max_blocks_per_sync
+        self.max_addresses = max_addresses
+        self.stats = {"syncs": 0, "ranges": 0, "logs": 0, "chunk_shrinks": 0, "reorgs": 0,
+                      "missing_headers": 0, "events": 0, "cohorts": 0, "watched": 0, "last_sync_ms": None}
+
+    def status(self) -> dict:
+        return {"chunk": self.chunk, **self.stats}
+
+    # ---- RPC ----
+    async def _get_logs_with_header(self, address, from_block: int, to_block: int) -> tuple[list[dict], str | None]:
+        """One round-trip: eth_getLogs for the range + the hash of its last block."""
+        resp = await self._send([
+            {"jsonrpc": "2.0", "id": 1, "method": "eth_getLogs",
+             "params": [{"address": address, "fromBlock": hex(from_block), "toBlock": hex(to_block)}]},
+            {"jsonrpc": "2.0", "id": 2, "method": "eth_getBlockByNumber", "params": [hex(to_block), False]},
+        ])
+        by_id = {item.get("id"): item for item in resp}
+        logs_item, block_item = by_id.get(1) or {}, by_id.get(2) or {}
+        if "error" in logs_item or "result" not in logs_item:
+            raise RpcError(logs_item.get("error"))
+        block = block_item.get("result") or {}
+        return logs_item["result"], block.get("hash")
+
+    async def _block_hash(self, number: int) -> str | None:
+        resp = await self._send([
+            {"jsonrpc": "2.0", "id": 1, "method": "eth_getBlockByNumber", "params": [hex(number), False]},
+        ])
+        block = (resp[0].get("result") if resp else None) or {}
+        return block.get("hash")
+
+    async def fetch_range(self, address, from_block: int, to_block: int) -> tuple[int, list[dict], str | None]:
+        """
+        Fetch logs from `from_block` up to at most `to_block`, shrinking the span
+        on provider range limits. Returns (last_block_covered, logs, its_hash);
+        raises HeaderUnavailable when the serving provider lacks that block.
+        """
+        while True:
+            end = min(to_block, from_block + self.chunk - 1)
+            try:
+                logs, end_hash = await self._get_logs_with_header(address, from_block, end)
+            except RpcError as e:
+                if not _is_range_limit(e):
+                    raise
+                if end == from_block:
+                    raise RangeTooLarge(f"[{self.chain}] single block {from_block} exceeds provider log limit")
+                self.chunk = max(1, (end - from_block + 1) // 2)
+                self._good_ranges = 0
+                self.stats["chunk_shrinks"] += 1
+                continue
+            if end_hash is None:
+                self.stats["missing_headers"] += 1
+                raise HeaderUnavailable(end)
+            self.stats["ranges"] += 1
+            # grow back only after a streak of light full-size ranges (no shrink/grow flapping)
+            if len(logs) < self.target_logs // 2 and end - from_block + 1 == self.chunk:
+                self._good_ranges += 1
+                if self._good_ranges >= 4:
+                    self.chunk = min(self.max_chunk, self.chunk * 2)
+                    self._good_ranges = 0
+            return end, logs, end_hash
+
+    # ---- watch-set ----
+    async def watch(self, contract: str) -> bool:
+        """Add a contract to this chain's watch-set; True if it was not watched yet."""
+        async with self.pool.acquire() as conn:
+            status = await conn.execute(
+                "INSERT INTO log_watchlist (chain, contract) VALUES ($1, $2) ON CONFLICT DO NOTHING",
+                self.chain, contract,
+            )
+        return status.endswith(" 1")
+
+    async def watched(self) -> list[str]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT contract FROM log_watchlist WHERE chain = $1", self.chain)
+        return [r["contract"] for r in rows]
+
+    # ---- checkpoints ----
+    async def indexed_range(self, contract: str) -> tuple[int, int] | None:
+        """[first, last] block range fully indexed for a contract (None if never synced)."""
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT first_block, last_block FROM log_checkpoints WHERE chain = $1 AND contract = $2",
+                self.chain, contract,
+            )
+        return (row["first_block"], row["last_block"]) if row else None
+
+    async def _load_checkpoints(self, contracts: list[str]) -> dict[str, asyncpg.Record]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT contract, last_block, last_block_hash FROM log_checkpoints "
+                "WHERE chain = $1 AND contract = ANY($2::text[])",
+                self.chain, contracts,
+            )
+        return {r["contract"]: r for r in rows}
+
+    async def _rollback(self, contracts: list[str], last_block: int) -> int:
+        """Drop the last `reorg_depth` blocks of a cohort and rewind its checkpoints."""
+        rewind_to = max(last_block - self.reorg_depth, 0)
+        rewind_hash = await self._block_hash(rewind_to)  # keeps re-org detection on for the rewound checkpoint
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                for table in ("contract_logs", "contract_events"):
+                    await conn.execute(
+                        f"DELETE FROM {table} WHERE chain = $1 AND contract = ANY($2::text[]) "
+                        "AND block_number > $3",
+                        self.chain, contracts, rewind_to,
+                    )
+                await conn.executemany(_UPSERT_CHECKPOINT_SQL,
+                                       [(self.chain, c, rewind_to, rewind_hash, None) for c in contracts])
+        self.stats["reorgs"] += 1
+        logger.warning(f"[{self.chain}] re-org at block {last_block} ({len(contracts)} contracts); "
+                       f"rewound to {rewind_to}")
+        return rewind_to
+
+    async def _store(self, contracts: list[str], logs: list[dict], first_block: int,
+                     last_block: int, last_hash: str) -> None:
+        """
+        Fan one range's logs out to their contracts and advance every checkpoint
+        of the cohort (`first_block` is recorded only for a contract's first range).
+        """
+        by_lower = {c.lower(): c for c in contracts}
+        rows, events = [], []
+        for log in logs:
+            contract = by_lower.get((log.get("address") or "").lower())
+            if contract is None:
+                continue
+            rows.append(_log_row(self.chain, contract, log))
+            event = event_row(self.chain, contract, log)  # decode stage
+            if event is not None:
+                events.append(event)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if rows:
+                    await conn.executemany(_INSERT_LOG_SQL, rows)
+                if events:
+                    await conn.executemany(INSERT_EVENT_SQL, events)
+                    self.stats["events"] += len(events)
+                await conn.executemany(_UPSERT_CHECKPOINT_SQL,
+                                       [(self.chain, c, last_block, last_hash, first_block) for c in contracts])
+
+    # ---- entry points ----
+    async def _sync_cohort(self, contracts: list[str], last: int, last_hash: str | None, head: int) -> int:
+        """Advance contracts that share one checkpoint with ONE eth_getLogs per block range."""
+        if last_hash and last <= head:
+            current = await self._block_hash(last)
+            if current and current != last_hash:
+                last = await self._rollback(contracts, last)
+
+        stored = 0
+        stop = min(head, last + self.max_blocks_per_sync)
+        address = contracts[0] if len(contracts) == 1 else contracts
+        while last < stop:
+            try:
+                end, logs, end_hash = await self.fetch_range(address, last + 1, stop)
+            except HeaderUnavailable as e:
+                # the serving provider lags `head`: retry a shorter range, or wait for the next sync
+                if e.block <= last + 1:
+                    logger.info(f"[{self.chain}] block {e.block} not available from the provider yet")
+                    break
+                stop = last + (e.block - last) // 2
+                continue
+            await self._store(contracts, logs, last + 1, end, end_hash)
+            stored += len(logs)
+            last = end
+        return stored
+
+    async def sync_many(self, contracts: list[str]) -> int:
+        """
+        Index new logs of many contracts up to the current head.
+
+        Contracts are grouped into cohorts by checkpoint (block + hash); each
+        cohort is scanned with address-array eth_getLogs calls of at most
+        `max_addresses` contracts, so the number of range scans follows chain
+        growth, not the size of the watch-set. New contracts start
+        `start_blocks` behind the head as their own cohort and merge into the
+        main one once they catch up. Returns the number of logs stored.
+        """
+        if not contracts:
+            return 0
+        started = time.perf_counter()
+        head = await self._head()
+        checkpoints = await self._load_checkpoints(contracts)
+
+        cohorts: dict[tuple[int, str | None], list[str]] = {}
+        for contract in contracts:
+            cp = checkpoints.get(contract)
+            key = (cp["last_block"], cp["last_block_hash"]) if cp else (max(head - self.start_blocks, 0), None)
+            cohorts.setdefault(key, []).append(contract)
+
+        stored = 0
+        for (last, last_hash), members in sorted(cohorts.items(), key=lambda kv: kv[0][0]):
+            for i in range(0, len(members), self.max_addresses):
+                stored += await self._sync_cohort(members[i:i + self.max_addresses], last, last_hash, head)
+
+        self.stats["syncs"] += 1
+        self.stats["logs"] += stored
+        self.stats["cohorts"] = len(cohorts)
+        self.stats["watched"] = len(contracts)
+        self.stats["last_sync_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return stored
+
+    async def sync(self, contract: str) -> int:
+        """Single-contract sync (same path as sync_many)."""
+        return await self.sync_many([contract])
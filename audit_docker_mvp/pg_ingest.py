@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from typing import Sequence
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+
+class PgBatchWriter:
+    """
+    Batched Postgres ingestion for one table.
+
+    Request handlers call append() (O(1), never waits on the database); a single
+    writer task drains the bounded queue and flushes with COPY
+    (copy_records_to_table) once `max_rows` rows are queued or the oldest queued
+    row is `max_delay_ms` old, whichever comes first. One pool checkout and one
+    statement per flush instead of per request, so DB load no longer grows 1:1
+    with API traffic.
+
+    If COPY is rejected (e.g. a bad row), the batch is retried with
+    executemany(INSERT) so one row cannot take the whole batch down with it.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, table: str, columns: Sequence[str],
+                 max_rows: int = 500, max_delay_ms: float = 200.0, queue_size: int = 50000):
+        self.pool = pool
+        self.table = table
+        self.columns = list(columns)
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: asyncio.Task | None = None
+        self._insert_sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            table, ", ".join(self.columns), ", ".join(f"${i}" for i in range(1, len(self.columns) + 1))
+        )
+        self.stats = {"rows": 0, "flushes": 0, "dropped": 0, "failed_rows": 0, "copy_fallbacks": 0,
+                      "last_flush_ms": None, "max_flush_ms": 0.0, "avg_flush_ms": None}
+        self._flush_ms_total = 0.0
+
+    # ---- lifecycle ----
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Flush everything queued, then stop the writer."""
+        if self._task is None:
+            return
+        await self._queue.put(None)  # sentinel
+        await self._task
+        self._task = None
+
+    # ---- request path ----
+    def append(self, row: tuple) -> bool:
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return False
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def status(self) -> dict:
+        return {"queue_depth": self.queue_depth(), **self.stats}
+
+    # ---- writer task ----
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            batch = [] if first is None else [first]
+            stop = first is None
+            deadline = loop.time() + self.max_delay
+            while not stop and len(batch) < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stop = True
+                else:
+                    batch.append(row)
+            if batch:
+                await self._flush(batch)
+            if stop:
+                # drain anything enqueued behind the sentinel
+                rest = []
+                while not self._queue.empty():
+                    row = self._queue.get_nowait()
+                    if row is not None:
+                        rest.append(row)
+                if rest:
+                    await self._flush(rest)
+                return
+
+    async def _flush(self, rows: list[tuple]) -> None:
+        started = time.perf_counter()
+        try:
+            async with self.pool.acquire() as conn:
+                try:
+                    await conn.copy_records_to_table(self.table, records=rows, columns=self.columns)
+                    written = len(rows)
+                except (asyncpg.PostgresError, asyncpg.DataError, ValueError, TypeError) as e:
+                    self.stats["copy_fallbacks"] += 1
+                    logger.warning(f"COPY into {self.table} failed ({e}); retrying with executemany")
+                    written = await self._insert_each(conn, rows)
+            self.stats["rows"] += written
+            self.stats["failed_rows"] += len(rows) - written
+        except Exception as e:
+            self.stats["failed_rows"] += len(rows)
+            logger.error(f"batch write to {self.table} failed ({len(rows)} rows lost): {e}")
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stats["flushes"] += 1
+            self._flush_ms_total += elapsed
+            self.stats["last_flush_ms"] = round(elapsed, 3)
+            self.stats["max_flush_ms"] = round(max(self.stats["max_flush_ms"], elapsed), 3)
+            self.stats["avg_flush_ms"] = round(self._flush_ms_total / self.stats["flushes"], 3)
+
+    async def _insert_each(self, conn: asyncpg.Connection, rows: list[tuple]) -> int:
+        """executemany first; if the batch still fails, isolate and skip the bad rows."""
+        try:
+            await conn.executemany(self._insert_sql, rows)
+            return len(rows)
+        except (asyncpg.PostgresError, asyncpg.DataError):
+            pass
+        written = 0
+        for row in rows:
+            try:
+                await conn.execute(self._insert_sql, *row)
+                written += 1
+            except (asyncpg.PostgresError, asyncpg.DataError) as e:
+                logger.error(f"dropping row for {self.table}: {e}")
+        return written
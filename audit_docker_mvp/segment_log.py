@@ -0,0 +1,410 @@
+"""
+Append-only NDJSON segment log.
+
+Layout (one directory per log):
+    <prefix>-<unix_ms>-<pid>.ndjson        sealed segment (read-only)
+    <prefix>-<unix_ms>-<pid>.ndjson.open   active segment of a running writer
+    <prefix>-<ms_lo>-c<pid_lo>_<ms_hi>_<pid_hi>.ndjson
+                                           compacted segment: the sealed segments
+                                           from (ms_lo, pid_lo) to (ms_hi, pid_hi)
+
+Writers only ever append, so the cost of a write does not depend on the size
+of the history. Segments rotate by size or age and are sealed by renaming.
+A writer that starts up seals the .open segments of writers that are gone.
+
+Readers skip sealed segments covered by a compacted one, so a compaction is
+atomic for them: the merged file appears (rename), then the inputs, already
+invisible, are deleted.
+
+CLI:
+    python segment_log.py read    <dir> [--prefix audit]
+    python segment_log.py compact <dir> [--prefix audit] [--target-bytes N]
+    python segment_log.py import-legacy <audit_report.json> <dir> [--prefix audit]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Iterator, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+SEALED_SUFFIX = ".ndjson"
+ACTIVE_SUFFIX = ".ndjson.open"
+
+
+def _segment_name(prefix: str, ts_ms: int | None = None) -> str:
+    ts_ms = ts_ms if ts_ms is not None else int(time.time() * 1000)
+    return f"{prefix}-{ts_ms:013d}-{os.getpid()}"
+
+
+def _encode(record: dict) -> bytes:
+    return (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+# -----------------------------
+# Writer
+# -----------------------------
+class SegmentLogWriter:
+    """
+    Single writer task fed by a bounded queue.
+
+      - append() never blocks the request path (drops and counts when full)
+      - records are written in batches from a worker thread
+      - fsync happens every `fsync_every` records or `fsync_interval` seconds,
+        whichever comes first (group commit)
+      - the active segment is sealed and a new one opened once it exceeds
+        `max_bytes` or `max_age` seconds
+    """
+
+    def __init__(self, directory: str, prefix: str = "audit", max_bytes: int = 64 * 1024 * 1024,
+                 max_age: float = 3600.0, fsync_every: int = 256, fsync_interval: float = 1.0,
+                 queue_size: int = 10000, max_batch: int = 512):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: asyncio.Task | None = None
+        self._fh = None
+        self._path: str | None = None
+        self._opened_at = 0.0
+        self._size = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.stats = {"written": 0, "dropped": 0, "fsyncs": 0, "segments": 0}
+
+    # ---- lifecycle ----
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._seal_orphans()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Drain the queue, fsync and seal the active segment."""
+        if self._task is None:
+            return
+        await self._queue.put(None)  # sentinel
+        await self._task
+        self._task = None
+
+    # ---- request path ----
+    def append(self, record: dict) -> bool:
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return False
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    # ---- writer task ----
+    async def _run(self) -> None:
+        while True:
+            try:
+                first = await asyncio.wait_for(self._queue.get(), timeout=self.fsync_interval)
+            except asyncio.TimeoutError:
+                if self._unsynced:
+                    await asyncio.to_thread(self._sync)
+                continue
+
+            batch = [first]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            stop = batch[-1] is None
+            records = [r for r in batch if r is not None]
+            try:
+                if records:
+                    await asyncio.to_thread(self._write_batch, records)
+                if stop:
+                    await asyncio.to_thread(self._seal)
+                    return
+            except Exception as e:
+                logger.error(f"segment log write failed ({len(records)} records lost): {e}")
+                if stop:
+                    return
+
+    def _seal_orphans(self) -> None:
+        """
+        Seal .open segments whose writer is gone (crash, kill, container
+        restart); compaction skips active segments, so they would stay forever.
+        Our own segment is only opened on the first write, so a file carrying
+        our pid is a previous process's (pids repeat across restarts).
+        Segments of other live workers sharing the directory are left alone.
+        """
+        for seg in scan_segments(self.directory, self.prefix):
+            pid = seg.first[1]
+            if not seg.active or (pid != os.getpid() and _pid_alive(pid)):
+                continue
+            if os.path.getsize(seg.path) == 0:
+                os.remove(seg.path)
+                continue
+            os.replace(seg.path, seg.path[: -len(ACTIVE_SUFFIX)] + SEALED_SUFFIX)
+            logger.warning(f"sealed orphaned segment {os.path.basename(seg.path)}")
+
+    # ---- blocking helpers (run in a worker thread) ----
+    def _open(self) -> None:
+        base = os.path.join(self.directory, _segment_name(self.prefix))
+        self._path = base + ACTIVE_SUFFIX
+        self._fh = open(self._path, "ab")
+        self._opened_at = time.monotonic()
+        self._size = 0
+        self.stats["segments"] += 1
+
+    def _write_batch(self, records: list[dict]) -> None:
+        if self._fh is None:
+            self._open()
+        data = b"".join(_encode(r) for r in records)
+        self._fh.write(data)
+        self._size += len(data)
+        self._unsynced += len(records)
+        self.stats["written"] += len(records)
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self._sync()
+        if self._size >= self.max_bytes or time.monotonic() - self._opened_at >= self.max_age:
+            self._seal()
+
+    def _sync(self) -> None:
+        if self._fh is None:
+            return
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.stats["fsyncs"] += 1
+
+    def _seal(self) -> None:
+        if self._fh is None:
+            return
+        self._sync()
+        self._fh.close()
+        os.replace(self._path, self._path[: -len(ACTIVE_SUFFIX)] + SEALED_SUFFIX)
+        self._fh = None
+        self._path = None
+
+
+# -----------------------------
+# Reader / compaction utilities
+# -----------------------------
+class Segment(NamedTuple):
+    path: str
+    first: tuple[int, int]   # (unix_ms, pid) of the first segment it holds
+    last: tuple[int, int]    # same as first unless compacted
+    active: bool
+    compacted: bool
+
+
+def _parse_segment(directory: str, prefix: str, name: str) -> Segment | None:
+    if not name.startswith(prefix + "-"):
+        return None
+    if name.endswith(ACTIVE_SUFFIX):
+        stem, active = name[len(prefix) + 1: -len(ACTIVE_SUFFIX)], True
+    elif name.endswith(SEALED_SUFFIX):
+        stem, active = name[len(prefix) + 1: -len(SEALED_SUFFIX)], False
+    else:
+        return None
+    try:
+        ts, pid = stem.split("-")
+        first = (int(ts), int(pid.lstrip("c").split("_")[0]))
+        if pid.startswith("c"):
+            _, ts_hi, pid_hi = pid[1:].split("_")
+            return Segment(os.path.join(directory, name), first, (int(ts_hi), int(pid_hi)), active, True)
+    except ValueError:
+        return None
+    return Segment(os.path.join(directory, name), first, first, active, False)
+
+
+def scan_segments(directory: str, prefix: str = "audit") -> list[Segment]:
+    """Every segment file (including superseded compaction inputs), in write order."""
+    if not os.path.isdir(directory):
+        return []
+    segments = [seg for name in os.listdir(directory)
+                if (seg := _parse_segment(directory, prefix, name)) is not None]
+    segments.sort(key=lambda seg: (seg.first, seg.compacted, seg.path))
+    return segments
+
+
+def _superseded(seg: Segment, compacted: list[Segment]) -> bool:
+    """A sealed segment whose records are already in a (larger) compacted segment."""
+    return not seg.active and any(
+        c is not seg and c.first <= seg.first and seg.last <= c.last for c in compacted
+    )
+
+
+def _visible_segments(directory: str, prefix: str, include_active: bool = True) -> list[Segment]:
+    segments = scan_segments(directory, prefix)
+    compacted = [seg for seg in segments if seg.compacted]
+    return [seg for seg in segments
+            if (include_active or not seg.active) and not _superseded(seg, compacted)]
+
+
+def list_segments(directory: str, prefix: str = "audit", include_active: bool = True) -> list[str]:
+    """Segment paths in write order; inputs of a finished compaction are skipped."""
+    return [seg.path for seg in _visible_segments(directory, prefix, include_active)]
+
+
+def _iter_lines(f, path: str) -> Iterator[dict]:
+    for line in f:
+        if not line.endswith(b"\n"):
+            break
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            logger.warning(f"skipping corrupt line in {path}")
+
+
+def read_segment(path: str) -> Iterator[dict]:
+    """Yield records; a torn last line (crash mid-write) or a corrupt line is skipped."""
+    with open(path, "rb") as f:
+        yield from _iter_lines(f, path)
+
+
+def read_records(directory: str, prefix: str = "audit") -> Iterator[dict]:
+    """
+    Every record in write order, consistent across a compaction or a seal that
+    happens mid-read. An open segment survives its deletion; a listed one that
+    is gone by the time it is opened means the listing is stale, so the
+    directory is listed again and reading resumes at the same position. A
+    compacted segment holds its inputs' records in order, so the records
+    already yielded from inputs it covers are skipped by count.
+    """
+    done: list[tuple[tuple[int, int], int]] = []   # (position, records yielded) per finished segment
+    resume_after: tuple[int, int] | None = None
+    while True:
+        for seg in _visible_segments(directory, prefix):
+            if resume_after is not None and seg.last <= resume_after:
+                continue
+            try:
+                f = open(seg.path, "rb")
+            except FileNotFoundError:
+                break  # compacted or sealed since listed
+            covered = [(pos, n) for pos, n in done if seg.first <= pos <= seg.last]
+            skip = sum(n for _, n in covered)
+            count = 0
+            with f:
+                for record in _iter_lines(f, seg.path):
+                    count += 1
+                    if count > skip:
+                        yield record
+            done = [entry for entry in done if entry not in covered] + [(seg.last, count)]
+            resume_after = seg.last
+        else:
+            return
+
+
+def compact(directory: str, prefix: str = "audit", target_bytes: int = 256 * 1024 * 1024) -> int:
+    """
+    Merge runs of small sealed segments into segments of up to `target_bytes`.
+    Active segments are never touched and end a run, so a compacted range never
+    spans a segment that is still being written. The output is named after the
+    range it covers, sorts where its first input did, and hides its inputs from
+    readers as soon as it is renamed into place; the inputs are deleted after.
+    Returns the number of input segments removed.
+    """
+    segments = scan_segments(directory, prefix)
+    compacted = [seg for seg in segments if seg.compacted]
+    removed = 0
+    visible: list[Segment] = []
+    for seg in segments:
+        if _superseded(seg, compacted):
+            os.remove(seg.path)  # left behind by an interrupted compaction
+            removed += 1
+        else:
+            visible.append(seg)
+
+    run: list[Segment] = []
+    run_bytes = 0
+
+    def flush_run() -> int:
+        if len(run) < 2:
+            return 0
+        (ts_lo, pid_lo), (ts_hi, pid_hi) = run[0].first, run[-1].last
+        name = f"{prefix}-{ts_lo:013d}-c{pid_lo}_{ts_hi:013d}_{pid_hi}{SEALED_SUFFIX}"
+        path = os.path.join(directory, name)
+        tmp = path + ".compact"
+        with open(tmp, "wb") as out:
+            for seg in run:
+                for record in read_segment(seg.path):
+                    out.write(_encode(record))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, path)
+        for seg in run:
+            os.remove(seg.path)
+        return len(run)
+
+    for seg in visible:
+        if seg.active:
+            removed += flush_run()
+            run, run_bytes = [], 0
+            continue
+        size = os.path.getsize(seg.path)
+        if run and run_bytes + size > target_bytes:
+            removed += flush_run()
+            run, run_bytes = [], 0
+        run.append(seg)
+        run_bytes += size
+    removed += flush_run()
+    return removed
+
+
+def import_legacy(json_path: str, directory: str, prefix: str = "audit") -> int:
+    """Convert the old JSON-array audit_report.json into one sealed segment."""
+    with open(json_path) as f:
+        records: list[Any] = json.load(f)
+    os.makedirs(directory, exist_ok=True)
+    # timestamp 0 sorts the imported history before anything written live
+    path = os.path.join(directory, _segment_name(prefix, ts_ms=0) + SEALED_SUFFIX)
+    with open(path, "wb") as out:
+        for record in records:
+            out.write(_encode(record))
+        out.flush()
+        os.fsync(out.fileno())
+    return len(records)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Append-only audit log utilities")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_read = sub.add_parser("read", help="print every record as NDJSON")
+    p_read.add_argument("directory")
+    p_read.add_argument("--prefix", default="audit")
+    p_compact = sub.add_parser("compact", help="merge small sealed segments")
+    p_compact.add_argument("directory")
+    p_compact.add_argument("--prefix", default="audit")
+    p_compact.add_argument("--target-bytes", type=int, default=256 * 1024 * 1024)
+    p_import = sub.add_parser("import-legacy", help="convert audit_report.json into a segment")
+    p_import.add_argument("json_path")
+    p_import.add_argument("directory")
+    p_import.add_argument("--prefix", default="audit")
+    args = ap.parse_args()
+
+    if args.cmd == "read":
+        for record in read_records(args.directory, args.prefix):
+            sys.stdout.write(json.dumps(record) + "\n")
+    elif args.cmd == "compact":
+        print(f"removed {compact(args.directory, args.prefix, args.target_bytes)} segments")
+    elif args.cmd == "import-legacy":
+        print(f"imported {import_legacy(args.json_path, args.directory, args.prefix)} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import asyncio
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from redis.asyncio import Redis
+
+
+class SingleFlight:
+    """
+    In-process request coalescing: concurrent callers for the same key share
+    one running task and its result (or exception).
+
+    The shared work runs as its own task and waiters are shielded, so one
+    cancelled caller (e.g. a disconnected client) never cancels it for others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "started": self.started, "coalesced": self.coalesced}
+
+
+# -----------------------------
+# Cross-worker lease (Redis SET NX PX)
+# -----------------------------
+# Delete the lock only if we still own it (the lease may have expired and been re-taken)
+_RELEASE_LUA = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Push the expiry out only while we still own the lock
+_EXTEND_LUA = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+async def acquire_lease(redis: Redis, key: str, lease_ms: int) -> str | None:
+    """Try to take a short-lived lock; returns the owner token or None if held elsewhere."""
+    token = uuid.uuid4().hex
+    ok = await redis.set(key, token, nx=True, px=lease_ms)
+    return token if ok else None
+
+async def release_lease(redis: Redis, key: str, token: str) -> None:
+    await redis.eval(_RELEASE_LUA, 1, key, token)
+
+async def extend_lease(redis: Redis, key: str, token: str, lease_ms: int) -> bool:
+    """Renew a lease we hold (long-running leader work); False if it was lost."""
+    return bool(await redis.eval(_EXTEND_LUA, 1, key, token, lease_ms))
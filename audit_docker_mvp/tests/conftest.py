@@ -0,0 +1,5 @@
+import os
+import sys
+
+# service modules are flat (run from audit_docker_mvp/), not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
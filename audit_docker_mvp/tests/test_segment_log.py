@@ -0,0 +1,81 @@
+import asyncio
+import os
+
+import segment_log as sl
+
+
+def write_sealed(directory, ts: int, records: list[dict], pid: int = 7) -> str:
+    path = os.path.join(directory, f"audit-{ts:013d}-{pid}{sl.SEALED_SUFFIX}")
+    with open(path, "wb") as f:
+        for record in records:
+            f.write(sl._encode(record))
+    return path
+
+
+def fill(directory, segments: int = 5, per_segment: int = 3) -> list[dict]:
+    records = []
+    for s in range(segments):
+        batch = [{"n": s * per_segment + i} for i in range(per_segment)]
+        write_sealed(directory, 100 * (s + 1), batch)
+        records += batch
+    return records
+
+
+def test_compaction_during_a_read_yields_every_record_once(tmp_path):
+    expected = fill(tmp_path)
+    reader = sl.read_records(str(tmp_path))
+    got = [next(reader) for _ in range(4)]  # inside the second segment
+    assert sl.compact(str(tmp_path)) == 5
+    got += list(reader)
+    assert got == expected
+
+
+def test_two_compactions_during_a_read(tmp_path):
+    expected = fill(tmp_path, segments=4)
+    reader = sl.read_records(str(tmp_path))
+    got = [next(reader) for _ in range(2)]
+    assert sl.compact(str(tmp_path), target_bytes=60) == 4  # pairs of segments
+    got.append(next(reader))
+    write_sealed(tmp_path, 900, [{"n": 12}])
+    expected.append({"n": 12})
+    sl.compact(str(tmp_path))  # everything, including the first pair's output
+    got += list(reader)
+    assert got == expected
+
+
+def test_interrupted_compaction_is_invisible_and_cleaned_up(tmp_path, monkeypatch):
+    expected = fill(tmp_path, segments=3)
+    real_remove = os.remove
+
+    def crash_on_inputs(path):
+        if path.endswith(sl.SEALED_SUFFIX):
+            raise RuntimeError("crash")
+        real_remove(path)
+
+    monkeypatch.setattr(sl.os, "remove", crash_on_inputs)
+    try:
+        sl.compact(str(tmp_path))
+    except RuntimeError:
+        pass
+    monkeypatch.undo()
+    assert len(os.listdir(tmp_path)) == 4  # merged output + its 3 inputs
+    assert list(sl.read_records(str(tmp_path))) == expected
+    assert sl.compact(str(tmp_path)) == 3
+    assert list(sl.read_records(str(tmp_path))) == expected
+
+
+def test_start_seals_orphans_of_dead_writers_only(tmp_path):
+    dead = tmp_path / "audit-0000000000100-999999.ndjson.open"
+    dead.write_bytes(b'{"n":0}\n{"n":1')  # torn tail from the crash
+    live = tmp_path / "audit-0000000000150-1.ndjson.open"  # pid 1 is alive
+    live.write_bytes(b'{"n":2}\n')
+
+    async def main():
+        w = sl.SegmentLogWriter(str(tmp_path))
+        w.start()
+        await w.close()
+
+    asyncio.run(main())
+    assert (tmp_path / "audit-0000000000100-999999.ndjson").exists()
+    assert live.exists()
+    assert list(sl.read_records(str(tmp_path))) == [{"n": 0}, {"n": 2}]
@@ -0,0 +1,15 @@
+"""
+Shared code for the launchkit services: async chain client (pooled JSON-RPC,
+batching, retries, routing, Multicall3) and the verified-JWT cache.
+"""
+from .batcher import RpcError, RpcMicroBatcher
+from .client import ChainClient, ChainClientProvider, RpcTransportError, backoff_delay
+from .config import DEFAULT_CHAINS, INFURA_NETWORKS, ChainConfig, chains_from_env
+from .jwt_cache import VerifiedTokenCache
+from .router import EndpointStats, RpcRouter
+
+__all__ = [
+    "ChainClient", "ChainClientProvider", "ChainConfig", "DEFAULT_CHAINS", "EndpointStats", "INFURA_NETWORKS",
+    "RpcError", "RpcMicroBatcher", "RpcRouter", "RpcTransportError", "VerifiedTokenCache", "backoff_delay",
+    "chains_from_env",
+]
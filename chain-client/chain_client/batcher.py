@@ -0,0 +1,106 @@
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class RpcError(Exception):
+    """A JSON-RPC error object returned for one item of a batch."""
+
+    def __init__(self, error: dict | None):
+        error = error or {}
+        self.code = error.get("code")
+        self.data = error.get("data")
+        super().__init__(error.get("message", "JSON-RPC error"))
+
+
+class RpcMicroBatcher:
+    """
+    Cross-request JSON-RPC micro-batching for one chain.
+
+    Calls made by any request within `window_ms` (or until `max_items` distinct
+    calls are queued) are merged into ONE JSON-RPC batch. Identical
+    (method, params) pairs inside a window are sent once and the result is
+    shared, so chain-wide reads such as eth_gasPrice / eth_blockNumber are
+    fetched once per window instead of once per contract. Responses are routed
+    back to callers by JSON-RPC id.
+    """
+
+    def __init__(self, send: Callable[[list[dict]], Awaitable[list[dict]]],
+                 window_ms: float = 3.0, max_items: int = 100):
+        self._send = send
+        self.window = window_ms / 1000
+        self.max_items = max_items
+        self._pending: dict[str, tuple[str, list, asyncio.Future]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._inflight: set[asyncio.Task] = set()
+        self.stats = {"calls": 0, "deduped": 0, "batches": 0, "items_sent": 0}
+
+    async def call(self, method: str, params: list | None = None) -> Any:
+        """Queue one call and wait for its result (raises RpcError on a per-item error)."""
+        params = params or []
+        key = json.dumps([method, params], sort_keys=True, separators=(",", ":"))
+        self.stats["calls"] += 1
+
+        entry = self._pending.get(key)
+        if entry is not None:
+            self.stats["deduped"] += 1
+            fut = entry[2]
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            self._pending[key] = (method, params, fut)
+            if len(self._pending) >= self.max_items:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        # shield: one cancelled caller must not cancel a result shared with others
+        return await asyncio.shield(fut)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        entries = list(self._pending.values())
+        self._pending = {}
+        task = asyncio.ensure_future(self._dispatch(entries))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, entries: list[tuple[str, list, asyncio.Future]]) -> None:
+        batch = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params, _) in enumerate(entries, start=1)
+        ]
+        self.stats["batches"] += 1
+        self.stats["items_sent"] += len(batch)
+        try:
+            resp = await self._send(batch)
+            if not isinstance(resp, list):
+                raise RpcError(resp.get("error") if isinstance(resp, dict) else None)
+            by_id = {item.get("id"): item for item in resp}
+        except Exception as e:
+            for _, _, fut in entries:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        for i, (_, _, fut) in enumerate(entries, start=1):
+            if fut.done():
+                continue
+            item = by_id.get(i)
+            if item is None:
+                fut.set_exception(RpcError({"message": f"missing response for id {i}"}))
+            elif "error" in item:
+                fut.set_exception(RpcError(item["error"]))
+            else:
+                fut.set_result(item.get("result"))
+
+    async def close(self) -> None:
+        """Flush what is queued and wait for in-flight batches."""
+        self._flush()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
@@ -0,0 +1,309 @@
+"""
+Shared async JSON-RPC client.
+
+One aiohttp session (keep-alive connection pool) serves every chain and every
+caller in the process: raw JSON-RPC batches, micro-batched calls
+(RpcMicroBatcher) and AsyncWeb3 instances all go through ChainClient.post, so
+timeouts, retries and connection reuse are the same everywhere.
+
+Retries: transport errors, timeouts and HTTP 408/429/5xx are retried up to
+`retries` times with full-jitter exponential backoff
+(sleep ~ U(0, min(backoff_max, backoff_base * 2**attempt))). JSON-RPC error
+objects are answers, not failures, and are never retried.
+
+Chains with several endpoints (RPC_URLS_<CHAIN>=url1,url2,...) are routed by
+RpcRouter: fastest healthy endpoint first, retries fail over to the next one.
+With `hedge` on, a read that the primary has not answered within its p95 is
+also sent to the runner-up, and whichever answers first wins.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union, cast
+
+import aiohttp
+from web3 import AsyncWeb3
+from web3._utils.batching import sort_batch_response_by_response_ids
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from .batcher import RpcError, RpcMicroBatcher
+from .config import DEFAULT_CHAINS, ChainConfig, chains_from_env
+from .router import EndpointStats, RpcRouter
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+_HEADERS = {"Content-Type": "application/json"}
+# never sent twice by hedging (a duplicate is harmless for reads only)
+_WRITE_METHODS = (b'"eth_sendRawTransaction"', b'"eth_sendTransaction"')
+
+
+class RpcTransportError(ConnectionError):
+    """The endpoint could not be reached or answered with a non-200 status (after retries)."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = True):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full jitter: spreads retries of many concurrent callers instead of synchronising them."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class ChainClient:
+    def __init__(self, chains: Dict[str, ChainConfig], timeout: float = 10.0, retries: int = 2,
+                 backoff_base: float = 0.05, backoff_max: float = 1.0, max_connections: int = 100,
+                 keepalive_timeout: float = 60.0, batch_window_ms: float = 3.0, batch_max_items: int = 100,
+                 hedge: bool = False, hedge_delay: float = 0.25):
+        self._chains = dict(chains)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.batch_window_ms = batch_window_ms
+        self.batch_max_items = batch_max_items
+        self.hedge = hedge
+        self._routers = {
+            chain: RpcRouter(list(cfg.rpc_urls), hedge_default_delay=hedge_delay) for chain, cfg in self._chains.items()
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._web3: Dict[str, AsyncWeb3] = {}
+        self._batchers: Dict[str, RpcMicroBatcher] = {}
+        self._stats = {chain: {"requests": 0, "retries": 0, "failures": 0, "hedged": 0, "hedge_wins": 0}
+                       for chain in self._chains}
+
+    @classmethod
+    def from_env(cls, names=DEFAULT_CHAINS, **defaults: Any) -> "ChainClient":
+        """
+        Chains from chains_from_env; client settings from RPC_TIMEOUT, RPC_RETRIES,
+        RPC_BACKOFF_MS, RPC_MAX_CONNECTIONS, RPC_BATCH_WINDOW_MS,
+        RPC_BATCH_MAX_ITEMS, RPC_HEDGE (0/1) and RPC_HEDGE_DELAY_MS (hedge delay
+        until an endpoint has a measured p95), falling back to `defaults`
+        (per service) and then the constructor defaults.
+        """
+        env = {
+            "timeout": ("RPC_TIMEOUT", float),
+            "retries": ("RPC_RETRIES", int),
+            "backoff_base": ("RPC_BACKOFF_MS", lambda v: float(v) / 1000),
+            "max_connections": ("RPC_MAX_CONNECTIONS", int),
+            "batch_window_ms": ("RPC_BATCH_WINDOW_MS", float),
+            "batch_max_items": ("RPC_BATCH_MAX_ITEMS", int),
+            "hedge": ("RPC_HEDGE", lambda v: v == "1"),
+            "hedge_delay": ("RPC_HEDGE_DELAY_MS", lambda v: float(v) / 1000),
+        }
+        kwargs = dict(defaults)
+        for arg, (var, conv) in env.items():
+            if os.getenv(var):
+                kwargs[arg] = conv(os.environ[var])
+        return cls(chains_from_env(names), **kwargs)
+
+    # ---- lifecycle ----
+    async def start(self) -> None:
+        """Open the shared keep-alive session (call once, from the running event loop)."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=self.keepalive_timeout,
+                                               ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trust_env=False,
+            )
+
+    async def close(self) -> None:
+        for batcher in self._batchers.values():
+            await batcher.close()
+        self._batchers.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The pooled session, also usable for non-RPC HTTP (e.g. metadata fetches)."""
+        if self._session is None:
+            raise RuntimeError("ChainClient.start() has not been called")
+        return self._session
+
+    # ---- config ----
+    @property
+    def chains(self) -> List[str]:
+        return list(self._chains)
+
+    def supports(self, chain: str) -> bool:
+        return chain in self._chains
+
+    def config(self, chain: str) -> ChainConfig:
+        return self._chains[chain]
+
+    # ---- transport ----
+    async def post(self, chain: str, body: bytes, hedge: Optional[bool] = None) -> bytes:
+        """
+        POST an encoded JSON-RPC request/batch to the chain's best endpoint.
+        Retries go to endpoints not yet tried by this call when there are any;
+        `hedge` (default: the client's setting) is ignored for writes.
+        """
+        cfg = self._chains[chain]
+        stats = self._stats[chain]
+        router = self._routers[chain]
+        timeout = aiohttp.ClientTimeout(total=cfg.timeout or self.timeout)
+        hedge = (self.hedge if hedge is None else hedge) and not any(m in body for m in _WRITE_METHODS)
+        stats["requests"] += 1
+        tried: set[str] = set()
+        for attempt in range(self.retries + 1):
+            ranked = router.ranked()
+            order = [ep for ep in ranked if ep.url not in tried] or ranked
+            try:
+                if hedge and len(order) > 1:
+                    return await self._post_hedged(chain, body, timeout, order[0], order[1], tried)
+                tried.add(order[0].url)
+                return await self._attempt(router, order[0], body, timeout)
+            except RpcTransportError as e:
+                err = e
+                if not e.retryable:
+                    break
+            if attempt < self.retries:
+                stats["retries"] += 1
+                await asyncio.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+        stats["failures"] += 1
+        raise err
+
+    async def _attempt(self, router: RpcRouter, ep: EndpointStats, body: bytes,
+                       timeout: aiohttp.ClientTimeout) -> bytes:
+        """One HTTP round-trip to one endpoint; the outcome feeds the router (hedge losers: see _post_hedged)."""
+        ep.in_flight += 1
+        t0 = time.perf_counter()
+        try:
+            async with self.session.post(ep.url, data=body, headers=_HEADERS, timeout=timeout) as resp:
+                raw = await resp.read()
+                if resp.status == 200:
+                    router.record(ep, True, time.perf_counter() - t0)
+                    return raw
+                router.record(ep, False)
+                raise RpcTransportError(f"RPC {resp.status}: {raw[:200].decode(errors='replace')}",
+                                        resp.status, retryable=resp.status in RETRY_STATUSES)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            router.record(ep, False)
+            raise RpcTransportError(f"{type(e).__name__}: {e}" if str(e) else type(e).__name__)
+        finally:
+            ep.in_flight -= 1
+
+    async def _post_hedged(self, chain: str, body: bytes, timeout: aiohttp.ClientTimeout,
+                           primary: EndpointStats, backup: EndpointStats, tried: set[str]) -> bytes:
+        """
+        Primary first; if it has not answered within its p95, race the backup.
+        First success wins; the loser is cancelled and recorded as lost after
+        the time it had taken so far (otherwise a provider that turned slow
+        would keep its old p50 and stay ranked first).
+        """
+        router = self._routers[chain]
+        tried.add(primary.url)
+        first = asyncio.ensure_future(self._attempt(router, primary, body, timeout))
+        racing = {first: (primary, time.perf_counter())}
+        pending = {first}
+        winner: Optional[asyncio.Future] = None
+        err: Optional[BaseException] = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=router.hedge_delay(primary))
+            if done:
+                return first.result()
+
+            self._stats[chain]["hedged"] += 1
+            tried.add(backup.url)
+            second = asyncio.ensure_future(self._attempt(router, backup, body, timeout))
+            racing[second] = (backup, time.perf_counter())
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        if task is second:
+                            self._stats[chain]["hedge_wins"] += 1
+                        return task.result()
+                    err = task.exception()
+            raise err
+        finally:
+            now = time.perf_counter()
+            for task in pending:
+                task.cancel()
+                if winner is not None:
+                    ep, started = racing[task]
+                    router.record_lost(ep, now - started)
+
+    async def send(self, chain: str, payload: Union[dict, list]) -> Any:
+        """One JSON-RPC request or batch (as dicts); returns the decoded response as-is."""
+        raw = await self.post(chain, json.dumps(payload, separators=(",", ":")).encode())
+        return json.loads(raw)
+
+    async def batch(self, chain: str, requests: List[dict]) -> List[dict]:
+        """JSON-RPC batch in ONE round-trip; raises RpcError if the endpoint rejects the whole batch."""
+        resp = await self.send(chain, requests)
+        if not isinstance(resp, list):
+            raise RpcError(resp.get("error") if isinstance(resp, dict) else None)
+        return resp
+
+    async def request(self, chain: str, method: str, params: Optional[list] = None) -> Any:
+        """Single call; returns `result` or raises RpcError."""
+        resp = await self.send(chain, {"jsonrpc": "2.0", "id": 1, "method": method, "params": params or []})
+        if "error" in resp:
+            raise RpcError(resp["error"])
+        return resp.get("result")
+
+    # ---- higher-level handles ----
+    def batcher(self, chain: str) -> RpcMicroBatcher:
+        """Cross-request micro-batcher for the chain (created on first use)."""
+        batcher = self._batchers.get(chain)
+        if batcher is None:
+            batcher = RpcMicroBatcher(lambda reqs: self.batch(chain, reqs),
+                                      window_ms=self.batch_window_ms, max_items=self.batch_max_items)
+            self._batchers[chain] = batcher
+        return batcher
+
+    def web3(self, chain: str) -> AsyncWeb3:
+        """AsyncWeb3 whose requests go through this client (pooled session, retries)."""
+        w3 = self._web3.get(chain)
+        if w3 is None:
+            if chain not in self._chains:
+                raise KeyError(f"Unsupported chain: {chain}")
+            w3 = AsyncWeb3(ChainClientProvider(self, chain))
+            self._web3[chain] = w3
+        return w3
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            chain: {**s, "endpoints": self._routers[chain].stats(),
+                    "batching": self._batchers[chain].stats if chain in self._batchers else None}
+            for chain, s in self._stats.items()
+        }
+
+
+class ChainClientProvider(AsyncJSONBaseProvider):
+    """web3 provider adapter: encodes like AsyncHTTPProvider, sends through ChainClient.post."""
+
+    def __init__(self, client: ChainClient, chain: str, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.client = client
+        self.chain = chain
+
+    def __str__(self) -> str:
+        return f"ChainClient connection ({self.chain})"
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        raw = await self.client.post(self.chain, self.encode_rpc_request(method, params))
+        return self.decode_rpc_response(raw)
+
+    async def make_batch_request(
+        self, batch_requests: List[Tuple[RPCEndpoint, Any]]
+    ) -> Union[List[RPCResponse], RPCResponse]:
+        raw = await self.client.post(self.chain, self.encode_batch_rpc_request(batch_requests))
+        response = self.decode_rpc_response(raw)
+        if not isinstance(response, list):
+            return response
+        return sort_batch_response_by_response_ids(cast(List[RPCResponse], response))
@@ -0,0 +1,58 @@
+"""
+Per-chain RPC configuration.
+
+Endpoints come from the environment, per chain (NAME = upper-case chain name):
+    RPC_URLS_<NAME>     comma-separated HTTP endpoints (default: Infura via INFURA_KEY)
+    RPC_WS_<NAME>       WebSocket endpoint (default: Infura via INFURA_KEY)
+    RPC_TIMEOUT_<NAME>  per-request timeout in seconds (default: the client's timeout)
+"""
+import os
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+# chain name -> Infura network subdomain
+INFURA_NETWORKS = {
+    "ethereum": "mainnet",
+    "polygon": "polygon-mainnet",
+}
+
+DEFAULT_CHAINS = tuple(INFURA_NETWORKS)
+
+
+@dataclass(frozen=True)
+class ChainConfig:
+    name: str
+    rpc_urls: tuple[str, ...]
+    ws_url: Optional[str] = None
+    timeout: Optional[float] = None
+
+    @property
+    def rpc_url(self) -> str:
+        """Primary HTTP endpoint."""
+        return self.rpc_urls[0]
+
+
+def infura_urls(chain: str, infura_key: str) -> tuple[str, str]:
+    """(https, wss) Infura endpoints for a chain."""
+    network = INFURA_NETWORKS[chain]
+    return f"https://{network}.infura.io/v3/{infura_key}", f"wss://{network}.infura.io/ws/v3/{infura_key}"
+
+
+def chains_from_env(names: Iterable[str] = DEFAULT_CHAINS,
+                    infura_key: Optional[str] = None) -> dict[str, ChainConfig]:
+    """ChainConfig per name; raises ValueError when a chain has no usable endpoint."""
+    infura_key = infura_key if infura_key is not None else os.getenv("INFURA_KEY")
+    chains: dict[str, ChainConfig] = {}
+    for name in names:
+        env = name.upper()
+        urls = [u.strip() for u in os.getenv(f"RPC_URLS_{env}", "").split(",") if u.strip()]
+        ws_url = os.getenv(f"RPC_WS_{env}") or None
+        if infura_key and name in INFURA_NETWORKS:
+            https, wss = infura_urls(name, infura_key)
+            urls = urls or [https]
+            ws_url = ws_url or wss
+        if not urls:
+            raise ValueError(f"No RPC endpoint for {name}: set INFURA_KEY or RPC_URLS_{env}")
+        timeout = os.getenv(f"RPC_TIMEOUT_{env}")
+        chains[name] = ChainConfig(name, tuple(urls), ws_url, float(timeout) if timeout else None)
+    return chains
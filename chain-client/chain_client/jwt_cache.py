@@ -0,0 +1,57 @@
+import hashlib
+import time
+from typing import Any, Dict, Optional
+
+
+class VerifiedTokenCache:
+    """
+    Bounded cache of JWTs that already passed full verification.
+
+    Keyed by sha256(token) (raw tokens are never kept in memory), valued by
+    (payload, expires_at). expires_at is the token's own `exp`, capped at
+    `max_ttl` seconds from now, so a cached token stops being accepted at the
+    exact moment jwt.decode would start rejecting it. Repeat requests with the
+    same token cost one hash + one dict lookup instead of HMAC + JSON parsing.
+    Insertion-ordered dict: the oldest entry is dropped when full.
+    """
+
+    def __init__(self, maxsize: int = 10000, max_ttl: int = 3600):
+        self.maxsize = maxsize
+        self.max_ttl = max_ttl
+        self._data: Dict[bytes, tuple[Dict[str, Any], float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        payload, expires_at = item
+        if time.time() >= expires_at:
+            del self._data[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        return payload
+
+    def put(self, token: str, payload: Dict[str, Any]) -> None:
+        now = time.time()
+        if payload.get("nbf") is not None and float(payload["nbf"]) > now:
+            return  # not valid yet; never serve it from cache early
+        expires_at = now + self.max_ttl
+        if payload.get("exp") is not None:
+            expires_at = min(expires_at, float(payload["exp"]))
+        if expires_at <= now:
+            return
+        if len(self._data) >= self.maxsize:
+            self._data.pop(next(iter(self._data)))
+        self._data[self._key(token)] = (payload, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,118 @@
+"""
+Multicall3 helpers: many read-only calls (ERC-20 / ERC-721) in one eth_call.
+
+Multicall3 lives at the same address on mainnet and most EVM chains
+(https://www.multicall3.com). aggregate3 returns (success, returnData) per
+call, so one reverting call (e.g. ownerOf of a burned token) does not fail
+the whole batch.
+"""
+import asyncio
+from dataclasses import dataclass
+
+from eth_abi import decode, encode
+from web3 import AsyncWeb3
+
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+AGGREGATE3_SELECTOR = bytes.fromhex("82ad56cb")  # aggregate3((address,bool,bytes)[])
+
+# ERC-20 selectors (balanceOf is shared with ERC-721)
+SEL_BALANCE_OF = bytes.fromhex("70a08231")              # balanceOf(address)
+SEL_DECIMALS = bytes.fromhex("313ce567")                # decimals()
+SEL_SYMBOL = bytes.fromhex("95d89b41")                  # symbol()
+
+# ERC-165 / ERC-721 selectors
+SEL_SUPPORTS_INTERFACE = bytes.fromhex("01ffc9a7")      # supportsInterface(bytes4)
+SEL_OWNER_OF = bytes.fromhex("6352211e")                # ownerOf(uint256)
+SEL_TOKEN_OF_OWNER_BY_INDEX = bytes.fromhex("2f745c59")  # tokenOfOwnerByIndex(address,uint256)
+SEL_TOKEN_URI = bytes.fromhex("c87b56dd")               # tokenURI(uint256)
+ERC721_ENUMERABLE_ID = bytes.fromhex("780e9d63")
+
+
+@dataclass(frozen=True)
+class Call:
+    target: str
+    data: bytes
+    allow_failure: bool = True
+
+
+def balance_of_call(contract: str, owner: str) -> Call:
+    return Call(contract, SEL_BALANCE_OF + encode(["address"], [owner]))
+
+
+def supports_interface_call(contract: str, interface_id: bytes) -> Call:
+    return Call(contract, SEL_SUPPORTS_INTERFACE + encode(["bytes4"], [interface_id]))
+
+
+def owner_of_call(contract: str, token_id: int) -> Call:
+    return Call(contract, SEL_OWNER_OF + encode(["uint256"], [token_id]))
+
+
+def token_of_owner_by_index_call(contract: str, owner: str, index: int) -> Call:
+    return Call(contract, SEL_TOKEN_OF_OWNER_BY_INDEX + encode(["address", "uint256"], [owner, index]))
+
+
+def token_uri_call(contract: str, token_id: int) -> Call:
+    return Call(contract, SEL_TOKEN_URI + encode(["uint256"], [token_id]))
+
+
+def encode_aggregate3(calls: list[Call]) -> bytes:
+    return AGGREGATE3_SELECTOR + encode(
+        ["(address,bool,bytes)[]"], [[(c.target, c.allow_failure, c.data) for c in calls]]
+    )
+
+
+def decode_aggregate3(ret: bytes) -> list[tuple[bool, bytes]]:
+    (results,) = decode(["(bool,bytes)[]"], ret)
+    return [(bool(ok), bytes(data)) for ok, data in results]
+
+
+async def aggregate3(w3: AsyncWeb3, calls: list[Call], block: str | int = "latest") -> list[tuple[bool, bytes]]:
+    """Run `calls` through Multicall3 in ONE eth_call; results are in call order."""
+    ret = await w3.eth.call({"to": MULTICALL3_ADDRESS, "data": encode_aggregate3(calls)}, block)
+    return decode_aggregate3(bytes(ret))
+
+
+async def aggregate3_chunked(w3: AsyncWeb3, calls: list[Call], chunk: int = 500,
+                             block: str | int = "latest") -> list[tuple[bool, bytes]]:
+    """aggregate3 split into `chunk`-sized eth_calls, sent concurrently, results in call order."""
+    parts = await asyncio.gather(*(aggregate3(w3, calls[i:i + chunk], block) for i in range(0, len(calls), chunk)))
+    return [r for part in parts for r in part]
+
+
+# -----------------------------
+# Return-data decoders (None when the call failed or returned garbage)
+# -----------------------------
+def decode_uint(ok: bool, data: bytes) -> int | None:
+    if not ok or len(data) < 32:
+        return None
+    return int.from_bytes(data[:32], "big")
+
+
+def decode_bool(ok: bool, data: bytes) -> bool:
+    value = decode_uint(ok, data)
+    return value == 1
+
+
+def decode_address(ok: bool, data: bytes) -> str | None:
+    if not ok or len(data) < 32:
+        return None
+    return AsyncWeb3.to_checksum_address("0x" + data[12:32].hex())
+
+
+def decode_symbol(ok: bool, data: bytes) -> str | None:
+    """ABI string, or the bytes32 form used by early tokens (e.g. MKR)."""
+    if not ok or not data:
+        return None
+    if len(data) == 32:
+        return data.rstrip(b"\x00").decode("utf-8", errors="replace") or None
+    return decode_string(ok, data)
+
+
+def decode_string(ok: bool, data: bytes) -> str | None:
+    if not ok or not data:
+        return None
+    try:
+        (value,) = decode(["string"], data)
+        return value
+    except Exception:
+        return None
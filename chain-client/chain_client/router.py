@@ -0,0 +1,152 @@
+"""
+Latency-aware endpoint selection for chains with several RPC providers.
+
+Each endpoint keeps a rolling window of its last `window` outcomes:
+latencies of successful requests (for p50/p95/p99) and ok/failed flags (for
+the error rate). Requests go to the healthy endpoint with the lowest p50;
+endpoints with fewer than `min_samples` latencies rank first so a new or
+recovered provider gets measured. An endpoint that fails `max_consecutive_failures`
+times in a row, or whose error rate exceeds `max_error_rate`, sits out for
+`cooldown` seconds and then competes again with a fresh error window.
+
+Hedging (see ChainClient.post) waits `hedge_delay(primary)` - the primary's
+p95 - before sending the same request to the next-ranked endpoint. The
+endpoint that loses the race is cancelled and recorded via `record_lost`: a
+soft failure plus, when its elapsed time is above its p50, a latency sample
+(it took at least that long; shorter elapsed times are not evidence of
+speed), so a provider that has turned slow drops in the ranking and, if it
+keeps losing, cools down like a failing one.
+"""
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+
+def endpoint_label(url: str) -> str:
+    """Host only: provider URLs usually carry the API key in the path."""
+    parts = urlsplit(url)
+    return parts.netloc + ("/…" if parts.path.strip("/") else "")
+
+
+class EndpointStats:
+    def __init__(self, url: str, window: int = 200):
+        self.url = url
+        self.label = endpoint_label(url)
+        self._latencies: deque[float] = deque(maxlen=window)   # seconds, successful requests
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._sorted: Optional[List[float]] = None              # percentile cache, reset on record
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+
+    def record(self, ok: bool, latency: Optional[float] = None) -> None:
+        self._outcomes.append(ok)
+        if ok:
+            self.consecutive_failures = 0
+            if latency is not None:
+                self._latencies.append(latency)
+                self._sorted = None
+        else:
+            self.consecutive_failures += 1
+
+    def record_lost(self, elapsed: float) -> None:
+        """
+        Cancelled after losing a hedge race. The true latency is censored (only
+        known to be >= elapsed), so it is a soft failure, and `elapsed` becomes
+        a latency sample only when it is above the current p50: a backup
+        cancelled a few ms after it started says nothing about its speed, and
+        recording that as a latency would make a slow endpoint look fast.
+        """
+        self._outcomes.append(False)
+        p50 = self.percentile(0.50)
+        if p50 is not None and elapsed > p50:
+            self._latencies.append(elapsed)
+            self._sorted = None
+
+    def start_cooldown(self, seconds: float) -> None:
+        self.cooldown_until = time.monotonic() + seconds
+        self.consecutive_failures = 0
+        self._outcomes.clear()  # judged afresh once it is back
+
+    @property
+    def samples(self) -> int:
+        return len(self._latencies)
+
+    @property
+    def outcomes(self) -> int:
+        return len(self._outcomes)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._latencies)
+        return self._sorted[min(len(self._sorted) - 1, int(q * len(self._sorted)))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return 1 - sum(self._outcomes) / len(self._outcomes)
+
+    def healthy(self, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.monotonic()) >= self.cooldown_until
+
+    def snapshot(self) -> Dict:
+        ms = lambda v: round(v * 1000, 2) if v is not None else None  # noqa: E731
+        return {
+            "endpoint": self.label, "healthy": self.healthy(), "samples": self.samples,
+            "p50_ms": ms(self.percentile(0.50)), "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)), "error_rate": round(self.error_rate, 4),
+            "in_flight": self.in_flight,
+        }
+
+
+class RpcRouter:
+    def __init__(self, urls: List[str], window: int = 200, min_samples: int = 5,
+                 max_error_rate: float = 0.25, max_consecutive_failures: int = 3,
+                 cooldown: float = 10.0, hedge_default_delay: float = 0.25, hedge_min_delay: float = 0.01):
+        self.endpoints = [EndpointStats(url, window) for url in urls]
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.max_consecutive_failures = max_consecutive_failures
+        self.cooldown = cooldown
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+
+    def _score(self, ep: EndpointStats) -> tuple:
+        if ep.samples < self.min_samples:
+            return (0, 0.0, 0.0)  # unmeasured first
+        return (1, ep.percentile(0.50), ep.percentile(0.99))
+
+    def ranked(self) -> List[EndpointStats]:
+        """Healthy endpoints fastest-first, then cooling-down ones (so there is always a candidate)."""
+        now = time.monotonic()
+        healthy = [ep for ep in self.endpoints if ep.healthy(now)]
+        cooling = [ep for ep in self.endpoints if not ep.healthy(now)]
+        return sorted(healthy, key=self._score) + sorted(cooling, key=lambda ep: ep.cooldown_until)
+
+    def record(self, ep: EndpointStats, ok: bool, latency: Optional[float] = None) -> None:
+        ep.record(ok, latency)
+        if not ok:
+            self._check_health(ep)
+
+    def record_lost(self, ep: EndpointStats, elapsed: float) -> None:
+        ep.record_lost(elapsed)
+        self._check_health(ep)
+
+    def _check_health(self, ep: EndpointStats) -> None:
+        if len(self.endpoints) == 1:
+            return  # a single endpoint is never benched: there is nothing to fail over to
+        if (ep.consecutive_failures >= self.max_consecutive_failures
+                or (ep.outcomes >= self.min_samples and ep.error_rate > self.max_error_rate)):
+            ep.start_cooldown(self.cooldown)
+
+    def hedge_delay(self, ep: EndpointStats) -> float:
+        """How long to wait for `ep` before hedging: its p95 once measured."""
+        p95 = ep.percentile(0.95) if ep.samples >= self.min_samples else None
+        return max(self.hedge_min_delay, p95 if p95 is not None else self.hedge_default_delay)
+
+    def stats(self) -> List[Dict]:
+        return [ep.snapshot() for ep in self.endpoints]
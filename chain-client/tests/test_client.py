@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+
+from chain_client import ChainClient, ChainConfig, RpcTransportError
+from conftest import stub_server
+
+
+def provider(name: str, hits: dict, behaviour: dict):
+    """JSON-RPC stub: behaviour[name] is a delay in seconds or an HTTP error status."""
+    async def handler(request):
+        hits[name] = hits.get(name, 0) + 1
+        body = await request.json()
+        b = behaviour[name]
+        if isinstance(b, int):
+            return web.Response(status=b, text="provider error")
+        await asyncio.sleep(b)
+        return web.json_response({"jsonrpc": "2.0", "id": body["id"], "result": "0x1"})
+    return web.post(f"/{name}", handler)
+
+
+def client(base: str, names: tuple[str, ...], **kwargs) -> ChainClient:
+    urls = tuple(f"{base}/{n}" for n in names)
+    return ChainClient({"eth": ChainConfig("eth", urls)}, backoff_base=0.001, **kwargs)
+
+
+def test_retries_fail_over_to_another_endpoint():
+    hits, behaviour = {}, {"a": 503, "b": 0.0}
+
+    async def main():
+        async with stub_server([provider("a", hits, behaviour), provider("b", hits, behaviour)]) as base:
+            c = client(base, ("a", "b"), retries=1)
+            await c.start()
+            try:
+                for _ in range(5):
+                    assert await c.request("eth", "eth_chainId") == "0x1"
+            finally:
+                await c.close()
+            assert c.stats()["eth"]["failures"] == 0
+            assert hits["a"] <= 3  # benched after max_consecutive_failures
+            assert hits["b"] == 5
+
+    asyncio.run(main())
+
+
+def test_non_retryable_status_is_not_retried():
+    hits, behaviour = {}, {"a": 401}
+
+    async def main():
+        async with stub_server([provider("a", hits, behaviour)]) as base:
+            c = client(base, ("a",), retries=3)
+            await c.start()
+            try:
+                with pytest.raises(RpcTransportError) as e:
+                    await c.request("eth", "eth_chainId")
+            finally:
+                await c.close()
+            assert e.value.status == 401 and hits["a"] == 1
+
+    asyncio.run(main())
+
+
+def test_hedged_read_takes_the_first_answer_and_demotes_a_slow_primary():
+    hits, behaviour = {}, {"a": 0.0, "b": 0.01}
+
+    async def main():
+        async with stub_server([provider("a", hits, behaviour), provider("b", hits, behaviour)]) as base:
+            c = client(base, ("a", "b"), retries=0, hedge=True)
+            await c.start()
+            try:
+                for _ in range(20):
+                    await c.request("eth", "eth_chainId")
+                behaviour["a"] = 2.0  # the primary turns slow
+                loop = asyncio.get_running_loop()
+                t0 = loop.time()
+                for _ in range(20):
+                    await c.request("eth", "eth_chainId")
+                elapsed = loop.time() - t0
+                ranked = c._routers["eth"].ranked()
+            finally:
+                await c.close()
+            stats = c.stats()["eth"]
+            assert stats["hedge_wins"] >= 1
+            assert elapsed < 2.0  # never waited for the slow provider
+            assert ranked[0].url.endswith("/b")
+            assert stats["hedged"] < 20  # stopped paying the hedge delay once demoted
+
+    asyncio.run(main())
+
+
+def test_writes_are_never_hedged():
+    hits, behaviour = {}, {"a": 0.05, "b": 0.0}
+
+    async def main():
+        async with stub_server([provider("a", hits, behaviour), provider("b", hits, behaviour)]) as base:
+            c = client(base, ("a", "b"), retries=0, hedge=True, hedge_delay=0.001)
+            await c.start()
+            try:
+                body = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "eth_sendRawTransaction",
+                                   "params": ["0x00"]}).encode()
+                await c.post("eth", body)
+            finally:
+                await c.close()
+            assert sum(hits.values()) == 1 and c.stats()["eth"]["hedged"] == 0
+
+    asyncio.run(main())
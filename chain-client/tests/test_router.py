@@ -0,0 +1,76 @@
+from chain_client import RpcRouter
+
+
+def router(n: int = 2, **kwargs) -> RpcRouter:
+    return RpcRouter([f"https://p{i}.example/v3/KEY" for i in range(n)], **kwargs)
+
+
+def feed(r: RpcRouter, index: int, latency: float, n: int = 10) -> None:
+    for _ in range(n):
+        r.record(r.endpoints[index], True, latency)
+
+
+def test_fastest_measured_endpoint_ranks_first_and_unmeasured_are_probed():
+    r = router(3)
+    feed(r, 0, 0.050)
+    feed(r, 1, 0.010)
+    assert [ep.url for ep in r.ranked()][0] == r.endpoints[2].url  # not measured yet
+    feed(r, 2, 0.030)
+    assert r.ranked() == [r.endpoints[1], r.endpoints[2], r.endpoints[0]]
+
+
+def test_consecutive_failures_cool_an_endpoint_down():
+    r = router(2, max_consecutive_failures=3)
+    feed(r, 0, 0.001)
+    feed(r, 1, 0.050)
+    for _ in range(3):
+        r.record(r.endpoints[0], False)
+    assert not r.endpoints[0].healthy()
+    assert r.ranked() == [r.endpoints[1], r.endpoints[0]]  # cooling endpoints stay last-resort candidates
+
+
+def test_single_endpoint_is_never_benched():
+    r = router(1)
+    for _ in range(10):
+        r.record(r.endpoints[0], False)
+    assert r.endpoints[0].healthy()
+
+
+def test_hedge_losses_demote_and_bench_a_provider_that_turned_slow():
+    r = router(2, max_error_rate=0.25)
+    feed(r, 0, 0.001, n=20)
+    feed(r, 1, 0.010, n=20)
+    assert r.ranked()[0] is r.endpoints[0]
+    for _ in range(10):
+        r.record_lost(r.endpoints[0], 0.3)  # cancelled after losing to the backup
+        r.record(r.endpoints[1], True, 0.010)
+    assert not r.endpoints[0].healthy()
+    assert r.ranked()[0] is r.endpoints[1]
+
+
+def test_hedge_delay_is_p95_once_measured():
+    r = router(2, hedge_default_delay=0.25, hedge_min_delay=0.01)
+    assert r.hedge_delay(r.endpoints[0]) == 0.25
+    feed(r, 0, 0.040, n=19)
+    r.record(r.endpoints[0], True, 0.200)
+    assert r.hedge_delay(r.endpoints[0]) == 0.200
+    feed(r, 1, 0.001)
+    assert r.hedge_delay(r.endpoints[1]) == 0.01
+
+
+def test_stats_never_expose_api_keys():
+    r = router(1)
+    assert "KEY" not in str(r.stats())
+
+
+def test_a_briefly_raced_backup_does_not_look_fast():
+    r = router(2)
+    feed(r, 0, 0.010, n=20)
+    feed(r, 1, 0.300, n=5)
+    for _ in range(6):
+        r.record_lost(r.endpoints[1], 0.005)  # hedged in, cancelled 5 ms later
+    b = r.endpoints[1]
+    assert b.percentile(0.50) == 0.300
+    b.cooldown_until = 0.0  # cooldown over
+    assert r.ranked()[0] is r.endpoints[0]
+    assert r.hedge_delay(b) == 0.300
@@ -1,31 +1,61 @@
 # defi-audit/app.py
+from contextlib import asynccontextmanager
+from typing import Dict, List
+import asyncio
+import json
+
+import aiohttp
 from fastapi import FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from web3 import Web3
-from audit import run_audit  # use the centralized audit logic
+from web3 import AsyncWeb3, Web3
+from audit import run_audit, run_audit_async  # use the centralized audit logic
+from pool import ProviderPool
+from chain_client import ChainClient
+from codecache import get_code_cache
 import os
 
 # -----------------------------
 # Environment & Web3 Initialization
 # -----------------------------
 load_dotenv()
-INFURA_KEY = os.getenv("INFURA_KEY")
-if not INFURA_KEY:
-    raise RuntimeError("INFURA_KEY is required. Put it in .env or environment variables.")
+# Endpoints: INFURA_KEY, or RPC_URLS_<CHAIN> per chain (see chain-client)
+try:
+    rpc_client = ChainClient.from_env(timeout=10)
+except ValueError as e:
+    raise RuntimeError(f"{e}. Put it in .env or environment variables.")
 
-CHAINS = {
-    "ethereum": f"https://mainnet.infura.io/v3/{INFURA_KEY}",
-    "polygon": f"https://polygon-mainnet.infura.io/v3/{INFURA_KEY}",
-}
+# Process-wide provider pool: keep-alive sessions + cached connectivity/chain_id
+pool = ProviderPool(rpc_client, refresh_interval=float(os.getenv("RPC_PROBE_INTERVAL", "15")))
 
-def get_w3(chain_name: str) -> Web3:
-    if chain_name not in CHAINS:
+def _check_chain(chain_name: str) -> None:
+    if not rpc_client.supports(chain_name):
         raise HTTPException(status_code=400, detail=f"Unsupported chain: {chain_name}")
-    w3 = Web3(Web3.HTTPProvider(CHAINS[chain_name]))
-    if not w3.is_connected():
+    state = pool.state(chain_name)
+    if not state.connected:
         raise HTTPException(status_code=502, detail=f"RPC not connected: {chain_name}")
-    return w3
+
+def get_w3(chain_name: str) -> Web3:
+    _check_chain(chain_name)
+    return pool.sync(chain_name)
+
+def get_async_w3(chain_name: str) -> AsyncWeb3:
+    _check_chain(chain_name)
+    return pool.async_(chain_name)
+
+# Bulk audit limits
+BATCH_MAX_TARGETS = int(os.getenv("AUDIT_BATCH_MAX_TARGETS", "5000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("AUDIT_BATCH_MAX_CONCURRENCY", "64"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the provider pool (sessions + background probes) and close it on shutdown."""
+    await pool.start()
+    yield
+    await pool.close()
 
 # -----------------------------
 # FastAPI Setup
@@ -34,6 +64,7 @@ app = FastAPI(
     title="DeFi Audit API",
     version="1.0.0",
     description="Minimal on-chain static checks without ABI (proxy/owner/paused/opcodes heuristics).",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -49,18 +80,75 @@ app.add_middleware(
 # -----------------------------
 @app.get("/health")
 def health(chain: str = Query("ethereum", description="ethereum | polygon")):
-    w3 = get_w3(chain)
-    return {"ok": True, "chain": chain, "chain_id": w3.eth.chain_id}
+    # Served from the pool's cached probe: no RPC round-trip per call
+    _check_chain(chain)
+    state = pool.state(chain)
+    return {"ok": True, "chain": chain, "chain_id": state.chain_id, "rpc": state.as_dict(),
+            "code_cache": get_code_cache().stats()}
 
 # -----------------------------
 # Audit (single source of truth -> audit.run_audit)
 # -----------------------------
 @app.get("/audit")
-def audit(contract: str = Query(..., description="contract address to audit"),
-          chain: str = Query("ethereum", description="ethereum | polygon")):
-    w3 = get_w3(chain)
+async def audit(contract: str = Query(..., description="contract address to audit"),
+                chain: str = Query("ethereum", description="ethereum | polygon"),
+                batched: bool = Query(True, description="use batched JSON-RPC (<= 2 round-trips)")):
     try:
-        result = run_audit(w3, contract, chain=chain)
-        return result  # already a JSON-serializable dict
+        if batched:
+            # asyncio-native path: no threadpool worker is held during RPC waits
+            return await run_audit_async(get_async_w3(chain), contract, chain=chain)
+        return await run_in_threadpool(run_audit, get_w3(chain), contract, chain=chain)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except (ConnectionError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise HTTPException(status_code=502, detail=str(e) or "Upstream node error")
+
+# -----------------------------
+# Bulk audit (NDJSON stream, results in completion order)
+# -----------------------------
+class AuditTarget(BaseModel):
+    contract: str
+    chain: str = "ethereum"
+
+class BatchAuditRequest(BaseModel):
+    targets: List[AuditTarget] = Field(..., min_length=1)
+    concurrency: int = Field(16, ge=1, description="max audits in flight")
+
+async def _audit_one(index: int, target: AuditTarget, sem: asyncio.Semaphore) -> Dict:
+    """Audit a single target; errors are reported inline instead of aborting the stream."""
+    async with sem:
+        try:
+            result = await run_audit_async(pool.async_(target.chain), target.contract, chain=target.chain)
+            return {"index": index, "chain": target.chain, "contract": target.contract, "ok": True, "result": result}
+        except Exception as e:
+            return {"index": index, "chain": target.chain, "contract": target.contract, "ok": False,
+                    "error": str(e) or type(e).__name__}
+
+@app.post("/audit/batch")
+async def audit_batch(req: BatchAuditRequest):
+    """
+    Audit many (contract, chain) pairs with bounded concurrency.
+    Streams one JSON object per line (application/x-ndjson) as each audit
+    completes; "index" refers to the position in the request.
+    """
+    if len(req.targets) > BATCH_MAX_TARGETS:
+        raise HTTPException(status_code=413, detail=f"Too many targets (max {BATCH_MAX_TARGETS})")
+    unsupported = sorted({t.chain for t in req.targets if not rpc_client.supports(t.chain)})
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Unsupported chain(s): {', '.join(unsupported)}")
+    for chain in {t.chain for t in req.targets}:
+        _check_chain(chain)
+
+    sem = asyncio.Semaphore(min(req.concurrency, BATCH_MAX_CONCURRENCY))
+
+    async def stream():
+        tasks = [asyncio.create_task(_audit_one(i, t, sem)) for i, t in enumerate(req.targets)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield json.dumps(await fut) + "\n"
+        finally:
+            # Client went away: stop the remaining audits
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
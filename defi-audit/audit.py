@@ -1,8 +1,13 @@
 # defi-audit/audit.py
 from __future__ import annotations
 
-from typing import Dict, Any, Optional, Tuple
-from web3 import Web3
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+
+from web3 import AsyncWeb3, Web3
+
+from codecache import code_hash, get_code_cache
+from disasm import Disassembly, disassemble
 
 # -----------------------------
 # Proxy storage slots
@@ -100,70 +105,125 @@ def _is_eoa(w3: Web3, address: str) -> bool:
     code = w3.eth.get_code(address)
     return len(code) == 0
 
-def _opcode_stats(bytecode: bytes) -> Dict[str, Any]:
+# Opcodes surfaced in findings.opcode_stats (risky/interesting ones)
+STAT_OPCODES = ["CALL", "CALLCODE", "DELEGATECALL", "STATICCALL", "SELFDESTRUCT", "CREATE", "CREATE2"]
+
+def _opcode_stats(bytecode: bytes, dis: Optional[Disassembly] = None) -> Dict[str, Any]:
     """
-    Decode EVM bytecode sequentially. When encountering PUSH1..PUSH32 (0x60..0x7F),
-    skip the next N bytes of immediate data so they won't be miscounted as opcodes.
-    Counts a few risky/interesting opcodes.
+    Count a few risky/interesting opcodes. PUSH1..PUSH32 immediates are masked
+    out by the disassembler so they won't be miscounted as opcodes.
     """
-    i = 0
-    b = bytearray(bytecode)
-
-    counts = {
-        "CALL": 0,
-        "CALLCODE": 0,
-        "DELEGATECALL": 0,
-        "STATICCALL": 0,
-        "SELFDESTRUCT": 0,  # a.k.a. SUICIDE
-        "CREATE": 0,
-        "CREATE2": 0,
+    dis = dis or disassemble(bytecode)
+    return {name: dis.count(name) for name in STAT_OPCODES}
+
+def _code_facts(bytecode: bytes) -> Dict[str, Any]:
+    """Everything derived from the runtime code alone (cached by code hash)."""
+    dis = disassemble(bytecode)
+    return {
+        "code_size": dis.code_size,
+        "opcode_stats": _opcode_stats(bytecode, dis),
+        "opcode_histogram": dis.histogram_dict(),
+        "instruction_count": int(len(dis.instruction_offsets)),
+        "jumpdest_count": int(len(dis.jumpdests)),
+        "basic_block_count": len(dis.blocks),
+        "selectors": dis.selectors,
+        "metadata_length": dis.metadata_length,
     }
 
-    OP = {
-        0xF1: "CALL",
-        0xF2: "CALLCODE",
-        0xF4: "DELEGATECALL",
-        0xFA: "STATICCALL",
-        0xFF: "SELFDESTRUCT",
-        0xF0: "CREATE",
-        0xF5: "CREATE2",
-    }
+def analyze_code(bytecode: bytes) -> Dict[str, Any]:
+    """Cached _code_facts: identical bytecode (clones, proxies) is scanned once."""
+    return get_code_cache().get_or_compute(bytes(bytecode), _code_facts)
+
+async def analyze_code_async(bytecode: bytes) -> Dict[str, Any]:
+    """analyze_code without blocking the loop on a miss (scan / disk / redis I/O)."""
+    facts = get_code_cache().get_memory(code_hash(bytes(bytecode)))
+    if facts is not None:
+        return facts
+    return await asyncio.to_thread(analyze_code, bytecode)
+
+# -----------------------------
+# Batched JSON-RPC helpers
+# -----------------------------
+def _rpc_batch(w3: Web3, calls: List[Tuple[str, List[Any]]]) -> List[Dict[str, Any]]:
+    """
+    Send a list of (method, params) as ONE JSON-RPC batch over the provider's
+    HTTP session. Returns raw responses in request order (ids are positional).
+    """
+    return _check_batch(w3.provider.make_batch_request(calls))
+
+async def _rpc_batch_async(w3: AsyncWeb3, calls: List[Tuple[str, List[Any]]]) -> List[Dict[str, Any]]:
+    """Async twin of _rpc_batch (AsyncHTTPProvider, shared aiohttp session)."""
+    return _check_batch(await w3.provider.make_batch_request(calls))
+
+def _check_batch(resp: Any) -> List[Dict[str, Any]]:
+    if not isinstance(resp, list):
+        # Node rejected the whole batch (single error object)
+        err = resp.get("error") if isinstance(resp, dict) else resp
+        raise ConnectionError(f"RPC batch failed: {err}")
+    return list(resp)
+
+def _rpc_result(item: Dict[str, Any]) -> Optional[str]:
+    """Return the hex result of a batch item, or None if the node returned an error."""
+    if not item or "error" in item:
+        return None
+    return item.get("result")
 
-    while i < len(b):
-        op = b[i]
-        i += 1
+def _hex_to_bytes(val: Optional[str]) -> bytes:
+    if not val or val == "0x":
+        return b""
+    return Web3.to_bytes(hexstr=val)
 
-        # PUSH1..PUSH32 → skip immediate bytes
-        if 0x60 <= op <= 0x7F:
-            push_len = op - 0x60 + 1
-            i += push_len
-            continue
+def _slot_param(slot_bytes: bytes) -> str:
+    return Web3.to_hex(int.from_bytes(slot_bytes, byteorder="big"))
 
-        name = OP.get(op)
-        if name:
-            counts[name] += 1
+def _primary_calls(addr: str) -> List[Tuple[str, List[Any]]]:
+    """
+    All reads that only depend on the contract address, in a fixed order:
+      code, impl slots..., admin slots..., owner(), paused()
+    """
+    calls: List[Tuple[str, List[Any]]] = [("eth_getCode", [addr, "latest"])]
+    for _, slot in PROXY_IMPL_SLOTS + PROXY_ADMIN_SLOTS:
+        calls.append(("eth_getStorageAt", [addr, _slot_param(slot), "latest"]))
+    for sel in (SEL_OWNER, SEL_PAUSED):
+        calls.append(("eth_call", [{"to": addr, "data": Web3.to_hex(sel)}, "latest"]))
+    return calls
+
+def _first_slot_hit(labels_slots: List[Tuple[str, bytes]], values: List[str]) -> Tuple[Optional[str], Dict[str, str]]:
+    """
+    Mirror the sequential scan: record slots up to (and including) the first
+    non-zero address hit, so batched and sequential reports are identical.
+    """
+    hits: Dict[str, str] = {}
+    for (label, _), slot_hex in zip(labels_slots, values):
+        hits[label] = slot_hex
+        cand = _extract_address_from_slot(slot_hex)
+        if cand:
+            return cand, hits
+    return None, hits
 
-    return counts
+def _decode_probe(ret: Optional[bytes], decoder):
+    if not ret:
+        return None
+    try:
+        return decoder(ret)
+    except Exception:
+        return None
 
 # -----------------------------
 # Main audit routine
 # -----------------------------
-def run_audit(w3: Web3, contract_address: str, chain: str = "ethereum") -> Dict[str, Any]:
-    """
-    Heuristic on-chain checks against a contract.
-    Returns a dict ready to be serialized as JSON.
-    """
-    # Normalize address
+def _normalize_address(contract_address: str) -> str:
     try:
-        addr = Web3.to_checksum_address(contract_address)
+        return Web3.to_checksum_address(contract_address)
     except Exception:
         raise ValueError("Invalid contract address")
 
+def _collect_sequential(w3: Web3, addr: str) -> Dict[str, Any]:
+    """One blocking RPC per read (original behaviour)."""
     # 1) Contract sanity: code and size
     is_contract, code = _is_contract(w3, addr)
     if not is_contract:
         raise ValueError("Address has no code (not a contract)")
-    code_size = len(code)
 
     # 2) Proxy detection across multiple slots (EIP-1967 + ZOS legacy)
     impl_addr: Optional[str] = None
@@ -187,28 +247,105 @@ def run_audit(w3: Web3, contract_address: str, chain: str = "ethereum") -> Dict[
             admin_addr = cand
             break
 
+    # 3) Privileged functions probing
+    owner_addr = _decode_probe(_low_level_call(w3, addr, SEL_OWNER), _decode_owner)
+    paused_val = _decode_probe(_low_level_call(w3, addr, SEL_PAUSED), _decode_paused)
+
+    # 5) Owner/Admin surface (EOA vs contract)
+    owner_is_eoa = _is_eoa(w3, owner_addr) if owner_addr else None
+    admin_is_eoa = _is_eoa(w3, admin_addr) if admin_addr else None
+
+    return {
+        "code": bytes(code),
+        "impl_addr": impl_addr,
+        "admin_addr": admin_addr,
+        "impl_slot_hits": impl_slot_hits,
+        "admin_slot_hits": admin_slot_hits,
+        "owner_addr": owner_addr,
+        "paused_val": paused_val,
+        "owner_is_eoa": owner_is_eoa,
+        "admin_is_eoa": admin_is_eoa,
+    }
+
+def _parse_primary(responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Turn the primary batch responses (see _primary_calls) into audit facts."""
+    code_hex = _rpc_result(responses[0])
+    if code_hex is None:
+        raise ConnectionError(f"eth_getCode failed: {responses[0].get('error')}")
+    code = _hex_to_bytes(code_hex)
+    if len(code) == 0:
+        raise ValueError("Address has no code (not a contract)")
+
+    n_impl = len(PROXY_IMPL_SLOTS)
+    n_admin = len(PROXY_ADMIN_SLOTS)
+    slot_values = [_rpc_result(r) or "0x" for r in responses[1:1 + n_impl + n_admin]]
+    impl_addr, impl_slot_hits = _first_slot_hit(PROXY_IMPL_SLOTS, slot_values[:n_impl])
+    admin_addr, admin_slot_hits = _first_slot_hit(PROXY_ADMIN_SLOTS, slot_values[n_impl:])
+
+    # eth_call reverts come back as per-item errors -> treated like a failed probe
+    ret_owner, ret_paused = responses[1 + n_impl + n_admin:]
+    return {
+        "code": code,
+        "impl_addr": impl_addr,
+        "admin_addr": admin_addr,
+        "impl_slot_hits": impl_slot_hits,
+        "admin_slot_hits": admin_slot_hits,
+        "owner_addr": _decode_probe(_hex_to_bytes(_rpc_result(ret_owner)), _decode_owner),
+        "paused_val": _decode_probe(_hex_to_bytes(_rpc_result(ret_paused)), _decode_paused),
+    }
+
+def _followup_calls(facts: Dict[str, Any]) -> List[Tuple[str, str, List[Any]]]:
+    """EOA checks that depend on addresses discovered by the primary batch."""
+    calls = []
+    for key, addr_key in (("owner_is_eoa", "owner_addr"), ("admin_is_eoa", "admin_addr")):
+        if facts[addr_key]:
+            calls.append((key, "eth_getCode", [facts[addr_key], "latest"]))
+    return calls
+
+def _apply_followup(facts: Dict[str, Any], calls, responses: List[Dict[str, Any]]) -> None:
+    facts["owner_is_eoa"] = None
+    facts["admin_is_eoa"] = None
+    for (key, _, _), item in zip(calls, responses):
+        code_hex = _rpc_result(item)
+        if code_hex is None:
+            raise ConnectionError(f"eth_getCode failed: {item.get('error')}")
+        facts[key] = len(_hex_to_bytes(code_hex)) == 0
+
+def _collect_batched(w3: Web3, addr: str) -> Dict[str, Any]:
+    """
+    At most two HTTP round-trips:
+      1) code + all proxy slots + owner()/paused() probes
+      2) EOA checks for the discovered owner/admin (skipped when none)
+    """
+    facts = _parse_primary(_rpc_batch(w3, _primary_calls(addr)))
+    follow = _followup_calls(facts)
+    responses = _rpc_batch(w3, [(m, p) for _, m, p in follow]) if follow else []
+    _apply_followup(facts, follow, responses)
+    return facts
+
+async def _collect_batched_async(w3: AsyncWeb3, addr: str) -> Dict[str, Any]:
+    """Same two-round-trip plan as _collect_batched, without blocking the event loop."""
+    facts = _parse_primary(await _rpc_batch_async(w3, _primary_calls(addr)))
+    follow = _followup_calls(facts)
+    responses = await _rpc_batch_async(w3, [(m, p) for _, m, p in follow]) if follow else []
+    _apply_followup(facts, follow, responses)
+    return facts
+
+def _build_report(addr: str, chain: str, facts: Dict[str, Any],
+                  code_facts: Dict[str, Any]) -> Dict[str, Any]:
+    """Pure scoring step shared by every execution mode."""
+    code_size = code_facts["code_size"]
+    impl_addr = facts["impl_addr"]
+    admin_addr = facts["admin_addr"]
+    owner_addr = facts["owner_addr"]
+    paused_val = facts["paused_val"]
+    owner_is_eoa = facts["owner_is_eoa"]
+    admin_is_eoa = facts["admin_is_eoa"]
+
     is_proxy = impl_addr is not None
 
-    # 3) Privileged functions probing
-    owner_addr: Optional[str] = None
-    paused_val: Optional[bool] = None
-
-    ret_owner = _low_level_call(w3, addr, SEL_OWNER)
-    if ret_owner:
-        try:
-            owner_addr = _decode_owner(ret_owner)
-        except Exception:
-            owner_addr = None
-
-    ret_paused = _low_level_call(w3, addr, SEL_PAUSED)
-    if ret_paused:
-        try:
-            paused_val = _decode_paused(ret_paused)
-        except Exception:
-            paused_val = None
-
-    # 4) Opcode stats (with PUSH skipping)
-    op = _opcode_stats(code)
+    # 4) Opcode stats (with PUSH skipping), cached by code hash
+    op = code_facts["opcode_stats"]
     has_delegatecall = op["DELEGATECALL"] > 0
 
     # Heuristic: looks like a proxy even if slots are empty
@@ -217,10 +354,6 @@ def run_audit(w3: Web3, contract_address: str, chain: str = "ethereum") -> Dict[
         if has_delegatecall and (code_size < 4000) and (owner_addr is not None or paused_val is not None):
             likely_proxy = True
 
-    # 5) Owner/Admin surface (EOA vs contract)
-    owner_is_eoa = _is_eoa(w3, owner_addr) if owner_addr else None
-    admin_is_eoa = _is_eoa(w3, admin_addr) if admin_addr else None
-
     # 6) Risk scoring & notes
     risk_score = 0
     notes = []
@@ -257,14 +390,17 @@ def run_audit(w3: Web3, contract_address: str, chain: str = "ethereum") -> Dict[
         "likely_proxy": likely_proxy,
         "implementation_address": impl_addr,
         "admin_address": admin_addr,
-        "impl_slots": impl_slot_hits,
-        "admin_slots": admin_slot_hits,
+        "impl_slots": facts["impl_slot_hits"],
+        "admin_slots": facts["admin_slot_hits"],
         "owner_function_present": owner_addr is not None,
         "owner": owner_addr,
         "owner_is_eoa": owner_is_eoa,
         "pausable_function_present": paused_val is not None,
         "paused": paused_val,
         "opcode_stats": op,
+        "code_hash": code_facts["code_hash"],
+        "function_selectors": code_facts["selectors"],
+        "basic_block_count": code_facts["basic_block_count"],
         "notes": notes,
     }
 
@@ -283,6 +419,29 @@ def run_audit(w3: Web3, contract_address: str, chain: str = "ethereum") -> Dict[
     }
     return result
 
+def run_audit(w3: Web3, contract_address: str, chain: str = "ethereum",
+              batched: bool = False) -> Dict[str, Any]:
+    """
+    Heuristic on-chain checks against a contract.
+    Returns a dict ready to be serialized as JSON.
+
+    batched=False: one RPC per read (up to ~9 round-trips).
+    batched=True:  independent reads in one JSON-RPC batch, EOA checks in a
+                   second one (at most 2 round-trips). Same report shape.
+    """
+    addr = _normalize_address(contract_address)
+    facts = _collect_batched(w3, addr) if batched else _collect_sequential(w3, addr)
+    return _build_report(addr, chain, facts, analyze_code(facts["code"]))
+
+async def run_audit_async(w3: AsyncWeb3, contract_address: str, chain: str = "ethereum") -> Dict[str, Any]:
+    """
+    asyncio-native run_audit (always batched). Safe to fan out with
+    asyncio.gather / as_completed over a single AsyncWeb3 client.
+    """
+    addr = _normalize_address(contract_address)
+    facts = await _collect_batched_async(w3, addr)
+    return _build_report(addr, chain, facts, await analyze_code_async(facts["code"]))
+
 # -----------------------------
 # Optional: tiny self-test helper
 # -----------------------------
@@ -0,0 +1,124 @@
+# defi-audit/bench_disasm.py
+"""
+Micro-benchmark: legacy byte-by-byte opcode loop vs disasm.disassemble.
+
+    python bench_disasm.py                     # synthetic 24 KB bytecode
+    python bench_disasm.py --hex code.txt      # runtime bytecode from a file (0x...)
+    python bench_disasm.py --broadcast ../evm/reports/deploy-tokenfactory.json
+                                               # runtime deployed by the first CREATE of a Foundry broadcast
+    python bench_disasm.py --broadcast ../evm/reports/deploy-tokenfactory.json --tile 24576
+                                               # that runtime repeated up to the 24 KB size limit
+
+Measured with --number 300 (CPython 3.11, NumPy 2.4; absolute times vary by machine):
+    TokenFactory runtime, 9234 B solc        legacy 1.24-1.30 ms   disassemble 0.62-0.64 ms   1.9-2.1x
+    TokenFactory runtime tiled to 24 KB      legacy 3.1-3.4 ms     disassemble 1.39-1.59 ms   2.1-2.3x
+    synthetic 24 KB (default)                legacy 2.8-2.9 ms     disassemble 1.36-1.63 ms   1.8-2.1x
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import timeit
+from typing import Dict
+
+from disasm import disassemble
+
+LEGACY_OPS = {
+    0xF1: "CALL",
+    0xF2: "CALLCODE",
+    0xF4: "DELEGATECALL",
+    0xFA: "STATICCALL",
+    0xFF: "SELFDESTRUCT",
+    0xF0: "CREATE",
+    0xF5: "CREATE2",
+}
+
+def legacy_opcode_stats(bytecode: bytes) -> Dict[str, int]:
+    """The original audit._opcode_stats loop, kept verbatim for comparison."""
+    i = 0
+    b = bytearray(bytecode)
+    counts = {name: 0 for name in LEGACY_OPS.values()}
+    while i < len(b):
+        op = b[i]
+        i += 1
+        if 0x60 <= op <= 0x7F:
+            i += op - 0x60 + 1
+            continue
+        name = LEGACY_OPS.get(op)
+        if name:
+            counts[name] += 1
+    return counts
+
+# Non-PUSH opcodes that dominate solc output (stack shuffling, memory, control flow)
+COMMON_OPS = bytes([0x80, 0x81, 0x82, 0x90, 0x91, 0x50, 0x51, 0x52, 0x54, 0x56, 0x57, 0x5B,
+                    0x01, 0x03, 0x10, 0x11, 0x14, 0x15, 0x16, 0x1B, 0x1C, 0x35, 0x36, 0xF3,
+                    0xFD, 0xF1, 0xFA, 0xF4, 0x00])
+
+def synthetic_code(size: int, seed: int = 7) -> bytes:
+    """
+    Pseudo-solc bytecode: ~35% PUSHes (width mix taken from a real solc
+    contract: mostly PUSH1/PUSH2), random immediates, common opcodes otherwise.
+    """
+    rnd = random.Random(seed)
+    out = bytearray()
+    while len(out) < size:
+        if rnd.random() < 0.35:
+            width = rnd.choices([1, 2, 3, 4, 20, 32], weights=[54, 19, 10, 4, 1, 2])[0]
+            out.append(0x5F + width)
+            out.extend(rnd.getrandbits(8) for _ in range(width))
+        else:
+            out.append(rnd.choice(COMMON_OPS))
+    return bytes(out[:size])
+
+# solc constructor tail: PUSH2 len, DUP1, PUSH2 offset, PUSH0|PUSH1 0, CODECOPY, PUSH0|PUSH1 0, RETURN
+_RUNTIME_COPY = re.compile(rb"\x61(..)\x80\x61(..)(?:\x5f|\x60\x00)\x39(?:\x5f|\x60\x00)\xf3", re.S)
+
+def runtime_from_initcode(initcode: bytes) -> bytes:
+    """
+    Runtime bytecode a solc constructor deploys: the slice its final
+    CODECOPY copies out of the initcode (constructor args follow it).
+    """
+    copies = list(_RUNTIME_COPY.finditer(initcode))
+    if not copies:
+        raise ValueError("no solc runtime copy (CODECOPY; RETURN) found in the creation code")
+    length, offset = (int.from_bytes(g, "big") for g in copies[-1].groups())
+    if offset + length > len(initcode):
+        raise ValueError("runtime copy reaches past the end of the creation code")
+    return initcode[offset:offset + length]
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hex", help="file containing runtime bytecode as hex")
+    ap.add_argument("--broadcast", help="Foundry broadcast/report JSON; uses the runtime its first CREATE deploys")
+    ap.add_argument("--size", type=int, default=24 * 1024, help="synthetic bytecode size")
+    ap.add_argument("--tile", type=int, help="repeat the --hex/--broadcast code up to this many bytes")
+    ap.add_argument("--number", type=int, default=50)
+    args = ap.parse_args()
+
+    if args.hex:
+        with open(args.hex) as f:
+            code = bytes.fromhex(f.read().strip().removeprefix("0x"))
+    elif args.broadcast:
+        with open(args.broadcast) as f:
+            txs = json.load(f)["transactions"]
+        create = next(t for t in txs if t.get("transactionType") == "CREATE")
+        code = runtime_from_initcode(bytes.fromhex(create["transaction"]["input"].removeprefix("0x")))
+    else:
+        code = synthetic_code(args.size)
+    if args.tile and (args.hex or args.broadcast):
+        code = (code * (args.tile // len(code) + 1))[:args.tile]
+
+    dis = disassemble(code)
+    assert legacy_opcode_stats(code) == {n: dis.count(n) for n in LEGACY_OPS.values()}, "results differ"
+
+    t_legacy = timeit.timeit(lambda: legacy_opcode_stats(code), number=args.number) / args.number
+    t_new = timeit.timeit(lambda: disassemble(code), number=args.number) / args.number
+    print(f"bytecode: {len(code)} bytes, {len(dis.instruction_offsets)} instructions, "
+          f"{len(dis.blocks)} blocks, {len(dis.selectors)} selectors")
+    print(f"legacy loop (7 opcodes):         {t_legacy * 1e3:8.3f} ms")
+    print(f"disassemble (full histogram+CFG): {t_new * 1e3:8.3f} ms  ({t_legacy / t_new:.1f}x)")
+
+if __name__ == "__main__":
+    main()
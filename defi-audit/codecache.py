@@ -0,0 +1,173 @@
+# defi-audit/codecache.py
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from web3 import Web3
+
+try:  # optional shared tier
+    import redis
+except ImportError:  # pragma: no cover - redis is optional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when the shape of the derived facts changes so old entries are ignored
+FACTS_VERSION = "v2"
+
+def code_hash(code: bytes) -> str:
+    """keccak256 of the runtime bytecode (same value as EXTCODEHASH)."""
+    return Web3.to_hex(Web3.keccak(code))
+
+# -----------------------------
+# Bytecode analysis cache
+# -----------------------------
+class BytecodeCache:
+    """
+    Content-addressed cache of derived bytecode facts (opcode stats, size, ...).
+
+    Tiers, checked in order:
+      1) in-process LRU (always on)
+      2) on-disk JSON files under `disk_dir` (optional, survives restarts)
+      3) Redis (optional, shared across processes/hosts)
+    A hit in a lower tier is promoted to the tiers above it.
+    Proxies/clones share bytecode, so each distinct code body is scanned once.
+    Callers always get their own copy: reports embed the facts, and a caller
+    editing its report must not change what later requests are served.
+    """
+
+    def __init__(self, maxsize: int = 4096, disk_dir: Optional[str] = None,
+                 redis_url: Optional[str] = None, redis_ttl: int = 30 * 24 * 3600):
+        self.maxsize = maxsize
+        self.disk_dir = disk_dir
+        self.redis_ttl = redis_ttl
+        self._lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self.hits = {"memory": 0, "disk": 0, "redis": 0}
+        self.misses = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        if redis_url:
+            if redis is None:
+                logger.warning("BYTECODE_CACHE_REDIS_URL set but the redis package is not installed; tier disabled")
+            else:
+                self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+
+    # ---- memory tier ----
+    def get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            val = self._lru.get(key)
+            if val is not None:
+                self._lru.move_to_end(key)
+                self.hits["memory"] += 1
+        return copy.deepcopy(val)
+
+    def _put_memory(self, key: str, facts: Dict[str, Any]) -> None:
+        with self._lock:
+            self._lru[key] = facts
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+
+    # ---- disk tier ----
+    def _disk_path(self, key: str) -> str:
+        h = key[2:] if key.startswith("0x") else key
+        return os.path.join(self.disk_dir, FACTS_VERSION, h[:2], f"{h}.json")
+
+    def _get_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _put_disk(self, key: str, facts: Dict[str, Any]) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write-then-rename so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(facts, f)
+        os.replace(tmp, path)
+
+    # ---- redis tier ----
+    def _redis_key(self, key: str) -> str:
+        return f"codefacts:{FACTS_VERSION}:{key}"
+
+    def _get_redis(self, key: str) -> Optional[Dict[str, Any]]:
+        if self._redis is None:
+            return None
+        try:
+            raw = self._redis.get(self._redis_key(key))
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"bytecode cache redis get failed: {e}")
+            return None
+
+    def _put_redis(self, key: str, facts: Dict[str, Any]) -> None:
+        if self._redis is None:
+            return
+        try:
+            self._redis.set(self._redis_key(key), json.dumps(facts), ex=self.redis_ttl)
+        except Exception as e:
+            logger.warning(f"bytecode cache redis set failed: {e}")
+
+    # ---- public API ----
+    def get_or_compute(self, code: bytes, compute: Callable[[bytes], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return cached facts for `code`, computing (and storing in every tier) on a miss."""
+        key = code_hash(code)
+        facts = self.get_memory(key)
+        if facts is not None:
+            return facts
+
+        facts = self._get_disk(key)
+        if facts is not None:
+            self.hits["disk"] += 1
+            self._put_memory(key, facts)
+            return copy.deepcopy(facts)
+
+        facts = self._get_redis(key)
+        if facts is not None:
+            self.hits["redis"] += 1
+            self._put_memory(key, facts)
+            self._put_disk(key, facts)
+            return copy.deepcopy(facts)
+
+        self.misses += 1
+        facts = compute(code)
+        facts["code_hash"] = key
+        self._put_memory(key, facts)
+        self._put_disk(key, facts)
+        self._put_redis(key, facts)
+        return copy.deepcopy(facts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._lru), "maxsize": self.maxsize, "hits": dict(self.hits), "misses": self.misses}
+
+# -----------------------------
+# Process-wide default instance (configured from env on first use)
+# -----------------------------
+_default: Optional[BytecodeCache] = None
+
+def get_code_cache() -> BytecodeCache:
+    global _default
+    if _default is None:
+        _default = BytecodeCache(
+            maxsize=int(os.getenv("BYTECODE_CACHE_SIZE", "4096")),
+            disk_dir=os.getenv("BYTECODE_CACHE_DIR") or None,
+            redis_url=os.getenv("BYTECODE_CACHE_REDIS_URL") or None,
+        )
+    return _default
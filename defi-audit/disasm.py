@@ -0,0 +1,217 @@
+# defi-audit/disasm.py
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# -----------------------------
+# Opcode table
+# -----------------------------
+OPCODES: Dict[int, str] = {
+    0x00: "STOP", 0x01: "ADD", 0x02: "MUL", 0x03: "SUB", 0x04: "DIV", 0x05: "SDIV",
+    0x06: "MOD", 0x07: "SMOD", 0x08: "ADDMOD", 0x09: "MULMOD", 0x0A: "EXP", 0x0B: "SIGNEXTEND",
+    0x10: "LT", 0x11: "GT", 0x12: "SLT", 0x13: "SGT", 0x14: "EQ", 0x15: "ISZERO",
+    0x16: "AND", 0x17: "OR", 0x18: "XOR", 0x19: "NOT", 0x1A: "BYTE", 0x1B: "SHL",
+    0x1C: "SHR", 0x1D: "SAR",
+    0x20: "KECCAK256",
+    0x30: "ADDRESS", 0x31: "BALANCE", 0x32: "ORIGIN", 0x33: "CALLER", 0x34: "CALLVALUE",
+    0x35: "CALLDATALOAD", 0x36: "CALLDATASIZE", 0x37: "CALLDATACOPY", 0x38: "CODESIZE",
+    0x39: "CODECOPY", 0x3A: "GASPRICE", 0x3B: "EXTCODESIZE", 0x3C: "EXTCODECOPY",
+    0x3D: "RETURNDATASIZE", 0x3E: "RETURNDATACOPY", 0x3F: "EXTCODEHASH",
+    0x40: "BLOCKHASH", 0x41: "COINBASE", 0x42: "TIMESTAMP", 0x43: "NUMBER",
+    0x44: "PREVRANDAO", 0x45: "GASLIMIT", 0x46: "CHAINID", 0x47: "SELFBALANCE",
+    0x48: "BASEFEE", 0x49: "BLOBHASH", 0x4A: "BLOBBASEFEE",
+    0x50: "POP", 0x51: "MLOAD", 0x52: "MSTORE", 0x53: "MSTORE8", 0x54: "SLOAD",
+    0x55: "SSTORE", 0x56: "JUMP", 0x57: "JUMPI", 0x58: "PC", 0x59: "MSIZE", 0x5A: "GAS",
+    0x5B: "JUMPDEST", 0x5C: "TLOAD", 0x5D: "TSTORE", 0x5E: "MCOPY", 0x5F: "PUSH0",
+    0xF0: "CREATE", 0xF1: "CALL", 0xF2: "CALLCODE", 0xF3: "RETURN", 0xF4: "DELEGATECALL",
+    0xF5: "CREATE2", 0xFA: "STATICCALL", 0xFD: "REVERT", 0xFE: "INVALID", 0xFF: "SELFDESTRUCT",
+}
+for _n in range(1, 33):
+    OPCODES[0x5F + _n] = f"PUSH{_n}"
+for _n in range(1, 17):
+    OPCODES[0x7F + _n] = f"DUP{_n}"
+    OPCODES[0x8F + _n] = f"SWAP{_n}"
+for _n in range(5):
+    OPCODES[0xA0 + _n] = f"LOG{_n}"
+
+# 256-entry name table; unassigned bytes execute as INVALID
+OPCODE_NAMES: List[str] = [OPCODES.get(i, f"UNKNOWN_0x{i:02x}") for i in range(256)]
+OPCODE_BY_NAME: Dict[str, int] = {name: op for op, name in OPCODES.items()}
+
+PUSH1, PUSH4, PUSH32 = 0x60, 0x63, 0x7F
+OP_EQ, OP_DUP2, OP_JUMPI, OP_JUMPDEST = 0x14, 0x81, 0x57, 0x5B
+
+# Opcodes after which control never falls through to the next instruction
+# (JUMPI falls through, but still ends a basic block); 256-entry lookup table
+BLOCK_TERMINATORS = np.zeros(256, dtype=bool)
+BLOCK_TERMINATORS[[0x00, 0x56, 0x57, 0xF3, 0xFD, 0xFE, 0xFF]] = True
+
+# instruction_mask: below this many open PUSH chains a Python walk beats another numpy round
+_LOCKSTEP_MIN_CHAINS = 16
+
+# -----------------------------
+# Core passes
+# -----------------------------
+def _as_array(code: bytes) -> np.ndarray:
+    return np.frombuffer(bytes(code), dtype=np.uint8)
+
+def instruction_mask(arr: np.ndarray) -> np.ndarray:
+    """
+    Boolean mask: True where the byte is an instruction, False where it is
+    PUSH immediate data.
+
+    Every PUSH-valued byte is a candidate. A candidate that lies outside every
+    other candidate's immediate range is certainly a real PUSH. The real PUSHes
+    between two such anchors form one chain, each linking to the first
+    candidate past its immediate. The chains are followed in lock-step, one
+    vectorized round per link, while many are still open; the last few (long
+    runs of PUSHes hidden inside other candidates' ranges, rare outside
+    crafted code) are finished in Python.
+    """
+    n = len(arr)
+    is_cand = (arr >= PUSH1) & (arr <= PUSH32)
+    cand = np.flatnonzero(is_cand)
+    if len(cand) == 0:
+        return np.ones(n, dtype=bool)
+    m = len(cand)
+    cend = cand + (arr[cand].astype(np.intp) - PUSH1 + 2)   # first byte after the immediate
+
+    reach = np.maximum.accumulate(cend)
+    covered = np.zeros(m + 1, dtype=bool)                   # [m]: sentinel "past the last candidate"
+    covered[1:m] = cand[1:] < reach[:-1]
+    real = ~covered[:m]
+
+    # link: index of the first candidate at/after the immediate (= candidates before that byte)
+    before = np.zeros(n + 1, dtype=np.intp)
+    np.cumsum(is_cand, out=before[1:])
+    nxt = before[np.minimum(cend, n)]
+
+    frontier = np.flatnonzero(real)
+    frontier = frontier[covered[nxt[frontier]]]
+    while len(frontier) > _LOCKSTEP_MIN_CHAINS:
+        frontier = nxt[frontier]
+        real[frontier] = True
+        frontier = frontier[covered[nxt[frontier]]]
+    if len(frontier):
+        links, open_ = nxt.tolist(), covered.tolist()
+        for k in frontier.tolist():
+            while open_[links[k]]:
+                k = links[k]
+                real[k] = True
+
+    starts = cand[real] + 1
+    ends = np.minimum(cend[real], n)
+    # immediates never overlap and an end is always an instruction, so starts and ends are distinct
+    delta = np.zeros(n + 1, dtype=np.int8)
+    delta[starts] = 1
+    delta[ends] -= 1
+    return np.cumsum(delta[:n], dtype=np.int8) == 0
+
+def solc_metadata_length(code: bytes) -> int:
+    """
+    Length of the trailing CBOR metadata solc/vyper append (incl. the 2-byte
+    length suffix), or 0 if the tail does not look like metadata.
+    """
+    if len(code) < 2:
+        return 0
+    meta_len = int.from_bytes(code[-2:], "big")
+    total = meta_len + 2
+    if meta_len == 0 or total > len(code):
+        return 0
+    # CBOR map header with 1..5 entries (0xa1..0xa5)
+    return total if 0xA1 <= code[-total] <= 0xA5 else 0
+
+# -----------------------------
+# Disassembly result
+# -----------------------------
+@dataclass
+class Disassembly:
+    code_size: int
+    histogram: np.ndarray                    # 256 counts, immediates excluded
+    instruction_offsets: np.ndarray          # pc of every instruction
+    jumpdests: np.ndarray                    # pc of every valid JUMPDEST
+    blocks: List[Tuple[int, int]] = field(default_factory=list)  # [start, end) byte ranges
+    selectors: List[str] = field(default_factory=list)           # "0x........" from the dispatcher
+    metadata_length: int = 0
+
+    def count(self, name: str) -> int:
+        return int(self.histogram[OPCODE_BY_NAME[name]])
+
+    def histogram_dict(self) -> Dict[str, int]:
+        """Non-zero histogram entries keyed by mnemonic."""
+        return {OPCODE_NAMES[i]: int(self.histogram[i]) for i in np.flatnonzero(self.histogram)}
+
+def _basic_blocks(arr: np.ndarray, offsets: np.ndarray, jumpdests: np.ndarray) -> List[Tuple[int, int]]:
+    n = len(arr)
+    if n == 0:
+        return []
+    following = np.append(offsets[1:], n)      # pc of the next instruction
+    is_start = np.zeros(n + 1, dtype=bool)
+    is_start[0] = True
+    is_start[jumpdests] = True
+    is_start[following[BLOCK_TERMINATORS[arr[offsets]]]] = True
+    starts = np.flatnonzero(is_start[:n])
+    ends = np.append(starts[1:], n)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def _dispatcher_selectors(code: bytes, arr: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """
+    Match the solc dispatcher shapes over the instruction stream:
+        PUSH1..4 sel, EQ,       PUSHn dest, JUMPI
+        PUSH1..4 sel, DUP2, EQ, PUSHn dest, JUMPI
+    Selectors with leading zero bytes are pushed with PUSH1..3 and left-padded.
+    """
+    ops = arr[offsets]
+    m = len(ops)
+    is_small_push = (ops >= PUSH1) & (ops <= PUSH4)
+    is_push = (ops >= PUSH1) & (ops <= PUSH32)
+
+    def at(k: int, mask: np.ndarray) -> np.ndarray:
+        out = np.zeros(m, dtype=bool)
+        if k < m:
+            out[: m - k] = mask[k:]
+        return out
+
+    direct = is_small_push & at(1, ops == OP_EQ) & at(2, is_push) & at(3, ops == OP_JUMPI)
+    via_dup = (is_small_push & at(1, ops == OP_DUP2) & at(2, ops == OP_EQ)
+               & at(3, is_push) & at(4, ops == OP_JUMPI))
+
+    seen: Dict[str, None] = {}
+    for i in np.flatnonzero(direct | via_dup).tolist():
+        pc = int(offsets[i])
+        width = int(ops[i]) - PUSH1 + 1
+        imm = code[pc + 1: pc + 1 + width]
+        seen["0x" + imm.rjust(4, b"\x00").hex()] = None
+    return list(seen)
+
+def disassemble(code: bytes) -> Disassembly:
+    """Single vectorized pass over runtime bytecode."""
+    code = bytes(code)
+    arr = _as_array(code)
+    mask = instruction_mask(arr)
+    offsets = np.flatnonzero(mask)
+    histogram = np.bincount(arr[offsets], minlength=256)
+    jumpdests = offsets[arr[offsets] == OP_JUMPDEST]
+    return Disassembly(
+        code_size=len(code),
+        histogram=histogram,
+        instruction_offsets=offsets,
+        jumpdests=jumpdests,
+        blocks=_basic_blocks(arr, offsets, jumpdests),
+        selectors=_dispatcher_selectors(code, arr, offsets),
+        metadata_length=solc_metadata_length(code),
+    )
+
+def iter_instructions(code: bytes) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """Human-readable listing: (pc, mnemonic, immediate hex or None)."""
+    code = bytes(code)
+    arr = _as_array(code)
+    for pc in np.flatnonzero(instruction_mask(arr)).tolist():
+        op = code[pc]
+        if PUSH1 <= op <= PUSH32:
+            yield pc, OPCODE_NAMES[op], "0x" + code[pc + 1: pc + 1 + op - PUSH1 + 1].hex()
+        else:
+            yield pc, OPCODE_NAMES[op], None
@@ -0,0 +1,113 @@
+# defi-audit/pool.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from web3 import AsyncWeb3, Web3
+
+from chain_client import ChainClient
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Per-chain connectivity snapshot
+# -----------------------------
+@dataclass
+class ChainState:
+    connected: bool = False
+    chain_id: Optional[int] = None
+    checked_at: float = 0.0        # unix time of the last probe
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+
+    def as_dict(self) -> Dict:
+        return {
+            "connected": self.connected,
+            "chain_id": self.chain_id,
+            "age_s": round(time.time() - self.checked_at, 3) if self.checked_at else None,
+            "latency_ms": self.latency_ms,
+            "error": self.error,
+        }
+
+# -----------------------------
+# Process-wide provider pool
+# -----------------------------
+class ProviderPool:
+    """
+    One long-lived Web3 + AsyncWeb3 client per chain.
+
+    - Sync clients keep their HTTPProvider (and its per-thread keep-alive
+      requests.Session) for the whole process instead of one per request.
+    - Async clients come from the shared ChainClient: one pooled keep-alive
+      aiohttp session, per-chain timeouts and jittered retries.
+    - Connectivity and chain_id are probed in the background every
+      `refresh_interval` seconds; request handlers only read the snapshot.
+    """
+
+    def __init__(self, client: ChainClient, refresh_interval: float = 15.0):
+        self.client = client
+        self.chains = client.chains
+        self.refresh_interval = refresh_interval
+        self._sync: Dict[str, Web3] = {}
+        for chain in self.chains:
+            cfg = client.config(chain)
+            self._sync[chain] = Web3(Web3.HTTPProvider(
+                cfg.rpc_url, request_kwargs={"timeout": cfg.timeout or client.timeout},
+            ))
+        self._async: Dict[str, AsyncWeb3] = {chain: client.web3(chain) for chain in self.chains}
+        self._state: Dict[str, ChainState] = {chain: ChainState() for chain in self.chains}
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    # ---- lifecycle ----
+    async def start(self) -> None:
+        """Open the chain client's session, probe every chain once, start the refresher."""
+        await self.client.start()
+        await self.refresh()
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self) -> None:
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        await self.client.close()
+
+    # ---- accessors (no network I/O) ----
+    def sync(self, chain: str) -> Web3:
+        return self._sync[chain]
+
+    def async_(self, chain: str) -> AsyncWeb3:
+        return self._async[chain]
+
+    def state(self, chain: str) -> ChainState:
+        return self._state[chain]
+
+    # ---- background probing ----
+    async def _probe(self, chain: str) -> None:
+        state = self._state[chain]
+        t0 = time.perf_counter()
+        try:
+            chain_id = await self._async[chain].eth.chain_id
+            state.connected = True
+            state.chain_id = chain_id
+            state.error = None
+        except Exception as e:
+            state.connected = False
+            state.error = str(e) or type(e).__name__
+            logger.warning(f"RPC probe failed for {chain}: {state.error}")
+        state.latency_ms = round((time.perf_counter() - t0) * 1000, 2)
+        state.checked_at = time.time()
+
+    async def refresh(self) -> None:
+        await asyncio.gather(*(self._probe(chain) for chain in self.chains))
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
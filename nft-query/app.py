@@ -1,29 +1,118 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+import asyncio
+import time
+
+from fastapi import FastAPI, HTTPException, Path, Query
+from pydantic import BaseModel, Field
 from web3 import Web3
 import os
 from dotenv import load_dotenv
 
+from chain_client import ChainClient
+from chain_client.multicall import (
+    ERC721_ENUMERABLE_ID, aggregate3, aggregate3_chunked, balance_of_call, decode_address, decode_bool,
+    decode_uint, owner_of_call, supports_interface_call, token_of_owner_by_index_call,
+)
+from metadata import ContentCache, MetadataError, MetadataFetcher, collection_metadata, substitute_id, token_uris
+
 load_dotenv()
 
-INFURA_KEY = os.getenv("INFURA_KEY")
-if not INFURA_KEY:
-    raise RuntimeError("Please set INFURA_KEY in .env")
+# Supported chains (the single-pair endpoints serve DEFAULT_CHAIN). Endpoints come
+# from INFURA_KEY or RPC_URLS_<CHAIN>; timeouts/retries from RPC_* (see chain-client)
+try:
+    rpc_client = ChainClient.from_env(timeout=10)
+except ValueError as e:
+    raise RuntimeError(f"{e} (see .env.example)")
+DEFAULT_CHAIN = "ethereum"
 
-RPC = f"https://mainnet.infura.io/v3/{INFURA_KEY}"
-w3 = Web3(Web3.HTTPProvider(RPC))
+# AsyncWeb3 per chain, all on the chain client's pooled keep-alive session (opened in lifespan)
+clients = {chain: rpc_client.web3(chain) for chain in rpc_client.chains}
+w3 = clients[DEFAULT_CHAIN]
 
-app = FastAPI(title="NFT Query API", version="1.0.0")
+# Short-TTL cache for balanceOf / owned-token lookups (seconds)
+BALANCE_CACHE_TTL = float(os.getenv("BALANCE_CACHE_TTL", "15"))
+BALANCE_CACHE_SIZE = int(os.getenv("BALANCE_CACHE_SIZE", "50000"))
+MULTICALL_CHUNK = int(os.getenv("MULTICALL_CHUNK", "500"))
+MAX_TOKEN_IDS = 10000
+# Transfer-log fallback: largest eth_getLogs span (blocks); halved on provider range caps
+LOG_SPAN_MAX = int(os.getenv("LOG_SPAN_MAX", "10000"))
 
-# Minimal ERC-721 ABI fragment used only for balanceOf(owner)
-ERC721_ABI = [
-    {
-        "constant": True,
-        "inputs": [{"name": "_owner", "type": "address"}],
-        "name": "balanceOf",
-        "outputs": [{"name": "balance", "type": "uint256"}],
-        "type": "function",
-    }
-]
+# POST /nft/balances limits
+NFT_BALANCES_MAX_ITEMS = int(os.getenv("NFT_BALANCES_MAX_ITEMS", "5000"))
+NFT_BALANCES_CONCURRENCY = int(os.getenv("NFT_BALANCES_CONCURRENCY", "8"))
+
+# Metadata pipeline (tokenURI -> gateway fetch -> content-addressed disk cache)
+METADATA_CACHE_DIR = os.getenv("METADATA_CACHE_DIR", "metadata_cache")
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", "3600"))
+METADATA_CONCURRENCY = int(os.getenv("METADATA_CONCURRENCY", "32"))
+METADATA_TIMEOUT = float(os.getenv("METADATA_TIMEOUT", "10"))
+IPFS_GATEWAY = os.getenv("IPFS_GATEWAY", "https://ipfs.io")
+NFT_METADATA_MAX_TOKENS = int(os.getenv("NFT_METADATA_MAX_TOKENS", "1000"))
+# tokenURI hosts are only fetched when they resolve to public addresses; list private ones to allow
+METADATA_ALLOWED_HOSTS = [h.strip() for h in os.getenv("METADATA_ALLOWED_HOSTS", "").split(",") if h.strip()]
+metadata_fetcher: MetadataFetcher | None = None
+
+# keccak("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global metadata_fetcher
+    await rpc_client.start()
+    metadata_fetcher = MetadataFetcher(
+        ContentCache(METADATA_CACHE_DIR, METADATA_CACHE_TTL),
+        ipfs_gateway=IPFS_GATEWAY, concurrency=METADATA_CONCURRENCY, timeout=METADATA_TIMEOUT,
+        trusted_hosts=METADATA_ALLOWED_HOSTS,
+    )
+    await metadata_fetcher.start()
+    yield
+    await metadata_fetcher.close()
+    await rpc_client.close()
+
+app = FastAPI(title="NFT Query API", version="1.0.0", lifespan=lifespan)
+
+class TTLCache:
+    """Tiny bounded TTL cache (event-loop only, oldest entry evicted when full)."""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: dict = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None or item[1] < time.monotonic():
+            self._data.pop(key, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return item[0]
+
+    def set(self, key, value) -> None:
+        self._data.pop(key, None)
+        if len(self._data) >= self.maxsize:
+            self._data.pop(next(iter(self._data)))
+        self._data[key] = (value, time.monotonic() + self.ttl)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+balance_cache = TTLCache(BALANCE_CACHE_TTL, BALANCE_CACHE_SIZE)
+owned_cache = TTLCache(BALANCE_CACHE_TTL, BALANCE_CACHE_SIZE // 10)
+deploy_blocks = TTLCache(86400, 10000)
+
+def to_checksum(addr: str) -> str:
+    if not Web3.is_address(addr):
+        raise HTTPException(status_code=400, detail=f"Invalid address: {addr}")
+    return Web3.to_checksum_address(addr)
+
+@app.get("/health")
+async def health():
+    ok = await w3.is_connected()
+    return {"ok": ok, "balance_cache": balance_cache.stats(), "owned_cache": owned_cache.stats(),
+            "metadata": metadata_fetcher.stats() if metadata_fetcher else None, "rpc": rpc_client.stats()}
 
 @app.get("/nft/{contract}/{owner}")
 async def get_nft_balance(contract: str, owner: str):
@@ -36,16 +125,300 @@ async def get_nft_balance(contract: str, owner: str):
 
     Returns:
         dict: {"contract": <address>, "owner": <address>, "balance": <int>} with the owner's NFT balance.
+        Balances are cached for BALANCE_CACHE_TTL seconds.
 
     Raises:
         HTTPException: If the address is invalid or the RPC/contract call fails.
     """
     try:
-        # Initialize a contract instance with the minimal ABI
-        contract_instance = w3.eth.contract(address=w3.to_checksum_address(contract), abi=ERC721_ABI)
-        # Call balanceOf(owner) on the ERC-721 contract
-        balance = contract_instance.functions.balanceOf(w3.to_checksum_address(owner)).call()
+        caddr, oaddr = w3.to_checksum_address(contract), w3.to_checksum_address(owner)
+        key = (DEFAULT_CHAIN, caddr, oaddr)
+        balance = balance_cache.get(key)
+        if balance is None:
+            # Call balanceOf(owner) on the ERC-721 contract (plain eth_call, no contract object)
+            ret = await w3.eth.call({"to": caddr, "data": balance_of_call(caddr, oaddr).data})
+            balance = decode_uint(True, bytes(ret))
+            if balance is None:
+                raise ValueError("balanceOf returned no data")
+            balance_cache.set(key, balance)
         return {"contract": contract, "owner": owner, "balance": balance}
     except Exception as e:
         # Convert any error into a 400 Bad Request with the original message
         raise HTTPException(status_code=400, detail=str(e))
+
+# -----------------------------
+# Owned token IDs
+# -----------------------------
+async def _enumerate_owned(caddr: str, oaddr: str, balance: int, block: int) -> list[int]:
+    """ERC721Enumerable: tokenOfOwnerByIndex(owner, 0..balance-1), multicall-batched."""
+    calls = [token_of_owner_by_index_call(caddr, oaddr, i) for i in range(balance)]
+    results = await aggregate3_chunked(w3, calls, MULTICALL_CHUNK, block)
+    return [tid for tid in (decode_uint(ok, data) for ok, data in results) if tid is not None]
+
+def _is_range_limit(err: Exception) -> bool:
+    msg = str(err).lower()
+    # provider caps on log queries; rate limits are not matched (bisecting would make them worse)
+    return any(s in msg for s in ("query returned more than", "response size", "block range", "too many results", "exceeds max results"))
+
+# eth_getLogs span for the Transfer-log walk, adapted to the provider (kept across requests)
+log_span = LOG_SPAN_MAX
+_good_spans = 0
+
+async def _incoming_transfer_ids(caddr: str, oaddr: str, from_block: int, to_block: int) -> set[int]:
+    """
+    tokenIds ever transferred TO the owner. The range is walked forward one
+    eth_getLogs at a time: the span is halved when the provider caps a response
+    and doubled again after a streak of accepted full-size spans.
+    """
+    global log_span, _good_spans
+    owner_topic = "0x" + "0" * 24 + oaddr[2:].lower()
+    ids: set[int] = set()
+    start = from_block
+    while start <= to_block:
+        end = min(to_block, start + log_span - 1)
+        try:
+            logs = await w3.eth.get_logs({
+                "address": caddr, "fromBlock": start, "toBlock": end,
+                "topics": [TRANSFER_TOPIC, None, owner_topic],
+            })
+        except Exception as e:
+            if end == start or not _is_range_limit(e):
+                raise
+            log_span = max(1, (end - start + 1) // 2)
+            _good_spans = 0
+            continue
+        # ERC-721 Transfer: tokenId is the 3rd indexed topic (ERC-20 Transfers have none)
+        ids.update(int.from_bytes(bytes(log["topics"][3]), "big") for log in logs if len(log["topics"]) == 4)
+        if end - start + 1 == log_span:
+            _good_spans += 1
+            if _good_spans >= 4:
+                log_span = min(LOG_SPAN_MAX, log_span * 2)
+                _good_spans = 0
+        start = end + 1
+    return ids
+
+async def _deploy_block(caddr: str, block: int) -> int:
+    """First block with code at `caddr` (binary search over eth_getCode); 0 if the node keeps no such history."""
+    cached = deploy_blocks.get(caddr)
+    if cached is not None:
+        return cached
+    lo, hi = 0, block
+    try:
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if await w3.eth.get_code(caddr, mid):
+                hi = mid
+            else:
+                lo = mid + 1
+    except Exception:
+        return 0  # pruned node: historical state unavailable
+    deploy_blocks.set(caddr, lo)
+    return lo
+
+async def _owned_from_transfers(caddr: str, oaddr: str, from_block: int, block: int) -> list[int]:
+    """Fallback: candidates from incoming Transfer logs, kept only if ownerOf(id) == owner now."""
+    candidates = sorted(await _incoming_transfer_ids(caddr, oaddr, from_block, block))
+    results = await aggregate3_chunked(w3, [owner_of_call(caddr, t) for t in candidates], MULTICALL_CHUNK, block)
+    return [t for t, (ok, data) in zip(candidates, results) if decode_address(ok, data) == oaddr]
+
+@app.get("/nft/{contract}/{owner}/tokens")
+async def get_owned_token_ids(
+    contract: str,
+    owner: str,
+    limit: int = Query(1000, ge=1, le=MAX_TOKEN_IDS),
+    from_block: int | None = Query(None, ge=0),
+):
+    """
+    List the token IDs an owner holds in an ERC-721 collection.
+
+    - One aggregate3 call reads supportsInterface(ERC721Enumerable) and balanceOf
+    - Enumerable collections: tokenOfOwnerByIndex, batched through Multicall3
+    - Otherwise: incoming Transfer logs (from `from_block`, by default the
+      collection's deploy block) give the candidates, verified with ownerOf
+      through Multicall3
+    Token IDs are returned as decimal strings (uint256); all reads use one block.
+    """
+    caddr, oaddr = to_checksum(contract), to_checksum(owner)
+    key = (caddr, oaddr, from_block)
+    cached = owned_cache.get(key)
+    if cached is None:
+        try:
+            block = await w3.eth.block_number
+            probe = await aggregate3(w3, [
+                supports_interface_call(caddr, ERC721_ENUMERABLE_ID),
+                balance_of_call(caddr, oaddr),
+            ], block)
+            enumerable = decode_bool(*probe[0])
+            balance = decode_uint(*probe[1])
+            if balance is None:
+                raise ValueError("balanceOf reverted: not an ERC-721 contract?")
+            scan_from = None
+            if balance == 0:
+                ids = []
+            elif enumerable:
+                ids = await _enumerate_owned(caddr, oaddr, min(balance, MAX_TOKEN_IDS), block)
+            else:
+                scan_from = from_block if from_block is not None else await _deploy_block(caddr, block)
+                ids = await _owned_from_transfers(caddr, oaddr, scan_from, block)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        cached = {"block_number": block, "balance": balance,
+                  "source": "enumerable" if enumerable else "transfer_logs", "from_block": scan_from,
+                  "token_ids": ids}
+        owned_cache.set(key, cached)
+        balance_cache.set((DEFAULT_CHAIN, caddr, oaddr), balance)
+
+    ids = cached["token_ids"]
+    return {
+        "contract": caddr, "owner": oaddr,
+        "block_number": cached["block_number"], "balance": cached["balance"], "source": cached["source"],
+        "from_block": cached["from_block"],
+        "token_ids": [str(t) for t in ids[:limit]],
+        # also when the owner holds more than was listed (Enumerable reads stop at MAX_TOKEN_IDS)
+        "truncated": len(ids) > limit or cached["balance"] > len(ids),
+    }
+
+# -----------------------------
+# Bulk balances
+# -----------------------------
+class OwnershipQuery(BaseModel):
+    collection: str
+    owner: str
+    chain: str = DEFAULT_CHAIN
+
+class NftBalancesRequest(BaseModel):
+    items: list[OwnershipQuery] = Field(..., min_length=1)
+
+async def _chain_balances(chain: str, pairs: list[tuple[str, str]], sem: asyncio.Semaphore) -> dict:
+    """
+    balanceOf for every (collection, owner) pair on one chain: Multicall3 chunks of
+    MULTICALL_CHUNK calls, all pinned to one block, at most `sem` in flight.
+    Returns {pair: (balance | None, error | None)}.
+    """
+    client = clients[chain]
+    try:
+        async with sem:
+            block = await client.eth.block_number
+    except Exception as e:
+        return {pair: (None, f"upstream node error: {e}") for pair in pairs}
+
+    out: dict = {}
+
+    async def run_chunk(part: list[tuple[str, str]]) -> None:
+        async with sem:
+            try:
+                res = await aggregate3(client, [balance_of_call(c, o) for c, o in part], block)
+            except Exception as e:
+                out.update({pair: (None, f"multicall failed: {e}") for pair in part})
+                return
+        for pair, (ok, data) in zip(part, res):
+            balance = decode_uint(ok, data)
+            if balance is None:
+                out[pair] = (None, "balanceOf reverted")
+            else:
+                out[pair] = (balance, None)
+                balance_cache.set((chain, *pair), balance)
+
+    await asyncio.gather(*(run_chunk(pairs[i:i + MULTICALL_CHUNK]) for i in range(0, len(pairs), MULTICALL_CHUNK)))
+    return out
+
+@app.post("/nft/balances")
+async def get_nft_balances(req: NftBalancesRequest):
+    """
+    ERC-721 balances for many (collection, owner[, chain]) pairs in ONE request.
+
+    - Pairs are de-duplicated and grouped per chain; cached balances
+      (BALANCE_CACHE_TTL) are served without touching the node
+    - Misses are packed into Multicall3 chunks of MULTICALL_CHUNK calls, run
+      concurrently (at most NFT_BALANCES_CONCURRENCY per request)
+    - Results come back in request order; a bad address, unknown chain,
+      reverting balanceOf or failed chunk only sets that item's "error"
+    """
+    if len(req.items) > NFT_BALANCES_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many items: {len(req.items)} (max {NFT_BALANCES_MAX_ITEMS})")
+
+    # Normalize; invalid items are answered inline and never sent upstream
+    keys: list[tuple[str, str, str] | str] = []
+    pending: dict[str, dict[tuple[str, str], None]] = {}
+    resolved: dict[tuple[str, str, str], tuple[int | None, str | None]] = {}
+    for item in req.items:
+        if item.chain not in clients:
+            keys.append(f"unsupported chain: {item.chain}")
+            continue
+        if not (Web3.is_address(item.collection) and Web3.is_address(item.owner)):
+            keys.append("invalid address")
+            continue
+        key = (item.chain, Web3.to_checksum_address(item.collection), Web3.to_checksum_address(item.owner))
+        keys.append(key)
+        cached = balance_cache.get(key)
+        if cached is not None:
+            resolved[key] = (cached, None)
+        else:
+            pending.setdefault(item.chain, {})[key[1:]] = None
+
+    sem = asyncio.Semaphore(NFT_BALANCES_CONCURRENCY)
+    chains = list(pending)
+    per_chain = await asyncio.gather(*(_chain_balances(c, list(pending[c]), sem) for c in chains))
+    for chain, res in zip(chains, per_chain):
+        resolved.update({(chain, *pair): value for pair, value in res.items()})
+
+    results = []
+    for item, key in zip(req.items, keys):
+        if isinstance(key, str):
+            balance, error = None, key
+        else:
+            balance, error = resolved[key]
+        results.append({"chain": item.chain, "collection": item.collection, "owner": item.owner,
+                        "balance": balance, "error": error})
+    return {"results": results, "errors": sum(r["error"] is not None for r in results)}
+
+# -----------------------------
+# Metadata
+# -----------------------------
+@app.get("/nft/{contract}/metadata/{token_id}")
+async def get_token_metadata(contract: str, token_id: int = Path(..., ge=0)):
+    """tokenURI(token_id) resolved and fetched (http/ipfs/ar/data:), served from the disk cache when fresh."""
+    caddr = to_checksum(contract)
+    try:
+        (uri,) = await token_uris(w3, caddr, [token_id])
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Upstream node error: {e}")
+    if not uri:
+        raise HTTPException(status_code=404, detail="tokenURI reverted or empty")
+    try:
+        metadata = await metadata_fetcher.fetch_json(substitute_id(uri, token_id))
+    except MetadataError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return {"contract": caddr, "token_id": str(token_id), "token_uri": uri, "metadata": metadata}
+
+class MetadataRequest(BaseModel):
+    collection: str
+    chain: str = DEFAULT_CHAIN
+    token_ids: list[int] | None = Field(None, max_length=NFT_METADATA_MAX_TOKENS)  # explicit ids, or
+    start: int = Field(0, ge=0)                                                     # a range [start, start + count)
+    count: int = Field(100, ge=1, le=NFT_METADATA_MAX_TOKENS)
+
+@app.post("/nft/metadata")
+async def get_collection_metadata(req: MetadataRequest):
+    """
+    Metadata for many tokens of one collection: tokenURI calls batched through
+    Multicall3, fetches run concurrently under METADATA_CONCURRENCY with
+    duplicate URIs fetched once. Per-token failures are returned inline.
+    """
+    if req.chain not in clients:
+        raise HTTPException(status_code=400, detail=f"Unsupported chain: {req.chain}")
+    caddr = to_checksum(req.collection)
+    ids = req.token_ids if req.token_ids is not None else list(range(req.start, req.start + req.count))
+    ids = list(dict.fromkeys(ids))
+    if any(t < 0 for t in ids):
+        raise HTTPException(status_code=400, detail="token ids must be non-negative")
+    if len(ids) > NFT_METADATA_MAX_TOKENS:
+        raise HTTPException(status_code=413, detail=f"Too many tokens: {len(ids)} (max {NFT_METADATA_MAX_TOKENS})")
+    try:
+        items = await collection_metadata(clients[req.chain], metadata_fetcher, caddr, ids, MULTICALL_CHUNK)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Upstream node error: {e}")
+    return {"chain": req.chain, "collection": caddr, "items": items,
+            "errors": sum(i["error"] is not None for i in items)}
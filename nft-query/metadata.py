@@ -0,0 +1,369 @@
+"""
+NFT metadata pipeline: tokenURI -> URL -> JSON.
+
+  1) tokenURI(id) for many tokens, batched through Multicall3
+  2) URI resolution: http(s), ipfs:// and ar:// (via gateways), data: (inline),
+     ERC-1155 style {id} substitution
+  3) Bounded async fetcher (METADATA_CONCURRENCY in flight, size + time capped);
+     concurrent fetches of the same URL share one request (SingleFlight).
+     tokenURI is attacker-controlled, so only public destinations are fetched:
+     every hop (redirects included) must resolve to a global address unless
+     its host is trusted (the IPFS gateway, METADATA_ALLOWED_HOSTS)
+  4) Content-addressed disk cache:
+       <dir>/blobs/<sha256(body)>      response bodies, stored once per content
+       <dir>/index/<sha256(url)>.json  url -> blob hash, ETag, Last-Modified, fetched_at
+     Entries are fresh for `ttl` seconds (ipfs:// content never goes stale);
+     stale entries are revalidated with If-None-Match / If-Modified-Since, and
+     served stale if the origin is down.
+"""
+import asyncio
+import base64
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import socket
+import time
+import urllib.parse
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+import aiohttp
+from aiohttp.abc import AbstractResolver, ResolveResult
+from aiohttp.resolver import DefaultResolver
+
+from chain_client.multicall import aggregate3_chunked, decode_string, token_uri_call
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    In-process request coalescing: concurrent callers for the same key share
+    one running task and its result (or exception). Waiters are shielded, so a
+    cancelled caller never cancels the shared fetch for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "started": self.started, "coalesced": self.coalesced}
+
+
+class MetadataError(Exception):
+    """A token's metadata could not be resolved (bad URI, HTTP error, not JSON...)."""
+
+
+# -----------------------------
+# Disk cache
+# -----------------------------
+class ContentCache:
+    def __init__(self, path: str, ttl: float = 3600):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(os.path.join(path, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(path, "index"), exist_ok=True)
+
+    def _index_path(self, url: str) -> str:
+        return os.path.join(self.path, "index", hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.path, "blobs", digest)
+
+    def load(self, url: str) -> Optional[Dict[str, Any]]:
+        """Index entry plus "body", or None if missing / blob gone."""
+        try:
+            with open(self._index_path(url)) as f:
+                entry = json.load(f)
+            with open(self._blob_path(entry["sha256"]), "rb") as f:
+                entry["body"] = f.read()
+            return entry
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def store(self, url: str, body: bytes, headers: Dict[str, str]) -> Dict[str, Any]:
+        digest = hashlib.sha256(body).hexdigest()
+        blob = self._blob_path(digest)
+        if not os.path.exists(blob):
+            self._atomic_write(blob, body)
+        entry = {
+            "url": url, "sha256": digest, "fetched_at": time.time(),
+            "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"),
+            "content_type": headers.get("Content-Type"),
+        }
+        self._atomic_write(self._index_path(url), json.dumps(entry).encode())
+        return dict(entry, body=body)
+
+    def touch(self, url: str, entry: Dict[str, Any]) -> None:
+        """Origin said 304: keep the blob, restart the TTL."""
+        entry = {k: v for k, v in entry.items() if k != "body"}
+        entry["fetched_at"] = time.time()
+        self._atomic_write(self._index_path(url), json.dumps(entry).encode())
+
+    def fresh(self, entry: Dict[str, Any]) -> bool:
+        if entry["url"].startswith("ipfs:"):
+            return True  # content-addressed at the origin too
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes) -> None:
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+# -----------------------------
+# URI resolution
+# -----------------------------
+def substitute_id(uri: str, token_id: int) -> str:
+    """ERC-1155 metadata URIs carry a literal {id}: lowercase hex, zero-padded to 64 chars."""
+    return uri.replace("{id}", f"{token_id:064x}") if "{id}" in uri else uri
+
+
+def gateway_url(uri: str, ipfs_gateway: str, arweave_gateway: str = "https://arweave.net/") -> str:
+    """HTTP(S) URL to fetch `uri` from; ipfs:// and ar:// go through gateways."""
+    if uri.startswith("ipfs://"):
+        path = uri[len("ipfs://"):]
+        if path.startswith("ipfs/"):
+            path = path[len("ipfs/"):]
+        return ipfs_gateway.rstrip("/") + "/ipfs/" + path
+    if uri.startswith("ar://"):
+        return arweave_gateway.rstrip("/") + "/" + uri[len("ar://"):]
+    if uri.startswith(("http://", "https://")):
+        return uri
+    raise MetadataError(f"unsupported URI scheme: {uri[:40]}")
+
+
+def is_public_address(host: str) -> bool:
+    """True for globally routable IPs (not loopback, RFC1918, link-local/metadata, CGNAT, reserved)."""
+    addr = ipaddress.ip_address(host.split("%", 1)[0])
+    if isinstance(addr, ipaddress.IPv6Address) and addr.ipv4_mapped is not None:
+        addr = addr.ipv4_mapped
+    return addr.is_global and not addr.is_multicast
+
+
+class PublicResolver(AbstractResolver):
+    """DNS resolver that drops non-public answers, so a hostname cannot point the fetcher inward."""
+
+    def __init__(self, trusted_hosts: Iterable[str] = ()):
+        self._inner = DefaultResolver()
+        self.trusted_hosts = frozenset(trusted_hosts)
+
+    async def resolve(self, host: str, port: int = 0,
+                      family: socket.AddressFamily = socket.AF_INET) -> List[ResolveResult]:
+        results = await self._inner.resolve(host, port, family)
+        if host in self.trusted_hosts:
+            return results
+        public = [r for r in results if is_public_address(r["host"])]
+        if not public:
+            raise OSError(f"{host} resolves to a non-public address")
+        return public
+
+    async def close(self) -> None:
+        await self._inner.close()
+
+
+def decode_data_uri(uri: str) -> bytes:
+    """data:[<mediatype>][;base64],<data>"""
+    try:
+        header, payload = uri[len("data:"):].split(",", 1)
+    except ValueError:
+        raise MetadataError("malformed data: URI")
+    if header.endswith(";base64"):
+        try:
+            return base64.b64decode(payload, validate=False)
+        except ValueError as e:
+            raise MetadataError(f"bad base64 in data: URI: {e}")
+    return urllib.parse.unquote_to_bytes(payload)
+
+
+def parse_json(body: bytes) -> Dict[str, Any]:
+    try:
+        value = json.loads(body)
+    except ValueError:
+        raise MetadataError("metadata is not valid JSON")
+    if not isinstance(value, dict):
+        raise MetadataError("metadata is not a JSON object")
+    return value
+
+
+# -----------------------------
+# Fetcher
+# -----------------------------
+class MetadataFetcher:
+    REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+    def __init__(self, cache: ContentCache, ipfs_gateway: str = "https://ipfs.io", concurrency: int = 32,
+                 timeout: float = 10, max_bytes: int = 2 * 1024 * 1024, max_redirects: int = 5,
+                 trusted_hosts: Iterable[str] = ()):
+        self.cache = cache
+        self.ipfs_gateway = ipfs_gateway
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_bytes = max_bytes
+        self.max_redirects = max_redirects
+        # the configured gateway may well be a local IPFS node
+        self.trusted_hosts = frozenset(trusted_hosts) | {urllib.parse.urlsplit(ipfs_gateway).hostname}
+        self._concurrency = concurrency
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._sem = asyncio.Semaphore(concurrency)
+        self._flight = SingleFlight()
+        self.counts = {"fresh": 0, "revalidated": 0, "fetched": 0, "stale": 0, "inline": 0, "errors": 0}
+
+    async def start(self) -> None:
+        """Own session: its resolver enforces the public-destination rule (RPC sessions may be local)."""
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._concurrency,
+                                             resolver=PublicResolver(self.trusted_hosts))
+            self._session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            raise RuntimeError("MetadataFetcher.start() has not been awaited")
+        return self._session
+
+    def _check_destination(self, url: str) -> None:
+        """Literal-IP hosts skip the resolver, so they are checked here (hostnames: PublicResolver)."""
+        host = urllib.parse.urlsplit(url).hostname
+        if not host:
+            raise MetadataError(f"no host in {url[:80]}")
+        if host in self.trusted_hosts:
+            return
+        try:
+            public = is_public_address(host)
+        except ValueError:
+            return  # a hostname
+        if not public:
+            raise MetadataError(f"refusing to fetch non-public address {host}")
+
+    async def _open(self, url: str, headers: Dict[str, str]) -> aiohttp.ClientResponse:
+        """GET with redirects followed by hand, so every hop passes the destination check."""
+        for _ in range(self.max_redirects + 1):
+            self._check_destination(url)
+            resp = await self.session.get(url, headers=headers, timeout=self.timeout, allow_redirects=False)
+            location = resp.headers.get("Location")
+            if resp.status not in self.REDIRECT_STATUSES or not location:
+                return resp
+            resp.release()
+            url = urllib.parse.urljoin(url, location)
+            if not url.startswith(("http://", "https://")):
+                raise MetadataError(f"redirect to unsupported URL: {url[:80]}")
+        raise MetadataError(f"more than {self.max_redirects} redirects")
+
+    async def fetch_json(self, uri: str) -> Dict[str, Any]:
+        """Metadata JSON behind a (substituted) token URI."""
+        uri = uri.strip()
+        if uri.startswith("data:"):
+            self.counts["inline"] += 1
+            return parse_json(decode_data_uri(uri))
+        if uri.startswith("{"):
+            self.counts["inline"] += 1  # some contracts return the JSON itself
+            return parse_json(uri.encode())
+        # one in-flight request per URI, however many tokens point at it
+        body = await self._flight.do(uri, lambda: self._fetch(uri))
+        return parse_json(body)
+
+    async def _fetch(self, uri: str) -> bytes:
+        cached = await asyncio.to_thread(self.cache.load, uri)
+        if cached is not None and self.cache.fresh(cached):
+            self.counts["fresh"] += 1
+            return cached["body"]
+
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            url = gateway_url(uri, self.ipfs_gateway)
+            async with self._sem:
+                async with await self._open(url, headers) as resp:
+                    if resp.status == 304 and cached is not None:
+                        await asyncio.to_thread(self.cache.touch, uri, cached)
+                        self.counts["revalidated"] += 1
+                        return cached["body"]
+                    if resp.status != 200:
+                        raise MetadataError(f"HTTP {resp.status} from {url}")
+                    body = await self._read_capped(resp)
+                    resp_headers = {k: resp.headers[k] for k in ("ETag", "Last-Modified", "Content-Type")
+                                    if k in resp.headers}
+            parse_json(body)  # never cache a body that cannot be served
+        except (aiohttp.ClientError, asyncio.TimeoutError, MetadataError) as e:
+            if cached is not None:
+                logger.warning(f"metadata refresh failed for {uri}, serving stale copy: {e}")
+                self.counts["stale"] += 1
+                return cached["body"]
+            self.counts["errors"] += 1
+            if isinstance(e, MetadataError):
+                raise
+            raise MetadataError(f"fetch failed: {e or type(e).__name__}")
+        await asyncio.to_thread(self.cache.store, uri, body, resp_headers)
+        self.counts["fetched"] += 1
+        return body
+
+    async def _read_capped(self, resp: aiohttp.ClientResponse) -> bytes:
+        """Whole body up to max_bytes (content.read(n) only returns what is already buffered)."""
+        chunks, size = [], 0
+        async for chunk in resp.content.iter_chunked(64 * 1024):
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise MetadataError(f"metadata larger than {self.max_bytes} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def stats(self) -> dict:
+        return {**self.counts, "single_flight": self._flight.stats()}
+
+
+# -----------------------------
+# Collection-level pipeline
+# -----------------------------
+async def token_uris(w3, contract: str, token_ids: list[int], chunk: int = 500,
+                     block: str | int = "latest") -> list[Optional[str]]:
+    """tokenURI(id) for every id via Multicall3 (None where the call reverted)."""
+    results = await aggregate3_chunked(w3, [token_uri_call(contract, t) for t in token_ids], chunk, block)
+    return [decode_string(ok, data) for ok, data in results]
+
+
+async def collection_metadata(w3, fetcher: MetadataFetcher, contract: str, token_ids: list[int],
+                              chunk: int = 500) -> list[Dict[str, Any]]:
+    """
+    {"token_id", "token_uri", "metadata", "error"} per id, in order. URIs are
+    read in Multicall3 batches, then fetched concurrently; the fetcher's
+    semaphore bounds how many are actually in flight.
+    """
+    uris = await token_uris(w3, contract, token_ids, chunk)
+
+    async def one(token_id: int, uri: Optional[str]) -> Dict[str, Any]:
+        item: Dict[str, Any] = {"token_id": str(token_id), "token_uri": uri, "metadata": None, "error": None}
+        if not uri:
+            item["error"] = "tokenURI reverted or empty"
+            return item
+        try:
+            item["metadata"] = await fetcher.fetch_json(substitute_id(uri, token_id))
+        except MetadataError as e:
+            item["error"] = str(e)
+        return item
+
+    return list(await asyncio.gather(*(one(t, u) for t, u in zip(token_ids, uris))))
@@ -0,0 +1,24 @@
+import os
+import sys
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+
+# service modules are flat (run from nft-query/), not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@asynccontextmanager
+async def stub_server(routes: list[web.RouteDef]):
+    """Local stand-in origin on an ephemeral port; yields its base URL."""
+    app = web.Application()
+    app.add_routes(routes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        await runner.cleanup()
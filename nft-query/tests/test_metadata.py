@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from conftest import stub_server
+from metadata import ContentCache, MetadataError, MetadataFetcher
+
+DOC = b'{"name": "Token #1", "image": "ipfs://QmImage", "attributes": [{"trait_type": "bg", "value": "blue"}]}'
+
+
+def fetcher(tmp_path, ttl: float = 3600, **kwargs) -> MetadataFetcher:
+    return MetadataFetcher(ContentCache(str(tmp_path), ttl), trusted_hosts=["127.0.0.1"], **kwargs)
+
+
+async def run(f: MetadataFetcher, coro_fn):
+    await f.start()
+    try:
+        return await coro_fn()
+    finally:
+        await f.close()
+
+
+def test_body_sent_in_several_writes_is_read_to_eof(tmp_path):
+    async def chunked(request):
+        resp = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await resp.prepare(request)
+        for i in range(0, len(DOC), 16):
+            await resp.write(DOC[i:i + 16])
+            await asyncio.sleep(0.01)
+        await resp.write_eof()
+        return resp
+
+    async def main():
+        async with stub_server([web.get("/1", chunked)]) as base:
+            f = fetcher(tmp_path)
+            meta = await run(f, lambda: f.fetch_json(f"{base}/1"))
+            assert meta["attributes"][0]["value"] == "blue"
+            assert f.cache.load(f"{base}/1")["body"] == DOC
+
+    asyncio.run(main())
+
+
+def test_oversized_or_invalid_body_is_not_cached(tmp_path):
+    async def big(request):
+        return web.Response(body=b"{" + b" " * 4096 + b"}")
+
+    async def garbage(request):
+        return web.Response(body=b"<html>rate limited</html>")
+
+    async def main():
+        async with stub_server([web.get("/big", big), web.get("/bad", garbage)]) as base:
+            f = fetcher(tmp_path, max_bytes=1024)
+            await f.start()
+            try:
+                for path in ("/big", "/bad"):
+                    with pytest.raises(MetadataError):
+                        await f.fetch_json(base + path)
+                    assert f.cache.load(base + path) is None
+            finally:
+                await f.close()
+            assert f.counts["fetched"] == 0 and f.counts["errors"] == 2
+
+    asyncio.run(main())
+
+
+def test_stale_entry_is_revalidated_with_etag(tmp_path):
+    seen = []
+
+    async def handler(request):
+        seen.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(body=DOC, headers={"ETag": '"v1"'})
+
+    async def main():
+        async with stub_server([web.get("/1", handler)]) as base:
+            f = fetcher(tmp_path, ttl=0)
+
+            async def twice():
+                return await f.fetch_json(f"{base}/1"), await f.fetch_json(f"{base}/1")
+
+            first, second = await run(f, twice)
+            assert first == second
+            assert seen == [None, '"v1"']
+            assert f.counts["fetched"] == 1 and f.counts["revalidated"] == 1
+
+    asyncio.run(main())
+
+
+def test_origin_error_serves_stale_copy(tmp_path):
+    state = {"up": True}
+
+    async def handler(request):
+        if state["up"]:
+            return web.Response(body=DOC)
+        return web.Response(status=503)
+
+    async def main():
+        async with stub_server([web.get("/1", handler)]) as base:
+            f = fetcher(tmp_path, ttl=0)
+
+            async def fetch_then_fail():
+                await f.fetch_json(f"{base}/1")
+                state["up"] = False
+                return await f.fetch_json(f"{base}/1")
+
+            meta = await run(f, fetch_then_fail)
+            assert meta["name"] == "Token #1"
+            assert f.counts["stale"] == 1
+
+    asyncio.run(main())
+
+
+def test_concurrent_fetches_of_one_uri_share_a_request(tmp_path):
+    hits = []
+
+    async def handler(request):
+        hits.append(1)
+        await asyncio.sleep(0.05)
+        return web.Response(body=DOC)
+
+    async def main():
+        async with stub_server([web.get("/1", handler)]) as base:
+            f = fetcher(tmp_path)
+            results = await run(f, lambda: asyncio.gather(*(f.fetch_json(f"{base}/1") for _ in range(20))))
+            assert len(hits) == 1
+            assert all(r == results[0] for r in results)
+            assert f.stats()["single_flight"]["coalesced"] == 19
+
+    asyncio.run(main())
+
+
+def test_private_destinations_are_refused(tmp_path):
+    async def handler(request):
+        return web.Response(body=DOC)
+
+    async def redirect(request):
+        raise web.HTTPFound("http://169.254.169.254/latest/meta-data/")
+
+    async def main():
+        async with stub_server([web.get("/1", handler), web.get("/r", redirect)]) as base:
+            untrusted = MetadataFetcher(ContentCache(str(tmp_path / "a"), 3600))
+            await untrusted.start()
+            try:
+                for uri in (f"{base}/1", "http://10.0.0.7/meta.json", "http://[::ffff:192.168.1.1]/x"):
+                    with pytest.raises(MetadataError):
+                        await untrusted.fetch_json(uri)
+            finally:
+                await untrusted.close()
+
+            # a trusted host may not redirect the fetch inward either
+            f = fetcher(tmp_path / "b")
+            await f.start()
+            try:
+                with pytest.raises(MetadataError, match="non-public"):
+                    await f.fetch_json(f"{base}/r")
+            finally:
+                await f.close()
+
+    asyncio.run(main())
@@ -1,32 +1,60 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+
+import jwt
+from dotenv import load_dotenv
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import BaseModel, Field
 from web3 import Web3
-import os, jwt, time
-from dotenv import load_dotenv
+
+from chain_client import ChainClient, VerifiedTokenCache
+from chain_client.multicall import Call, aggregate3, balance_of_call, decode_symbol, decode_uint, SEL_DECIMALS, SEL_SYMBOL
+from token_meta import cache_from_env, load_token_list, resolved, warmup
 
 # --- Config ---
 load_dotenv()
-INFURA_KEY = os.getenv("INFURA_KEY")
 SECRET_KEY = os.getenv("SECRET_KEY", "change_me")
 
-if not INFURA_KEY:
-    raise RuntimeError("INFURA_KEY is required (see .env.example)")
+CHAIN = "ethereum"
+
+# Shared chain client (INFURA_KEY or RPC_URLS_ETHEREUM; RPC_TIMEOUT/RPC_RETRIES tune it).
+# w3 sends through its pooled keep-alive session, opened in lifespan
+try:
+    rpc_client = ChainClient.from_env([CHAIN], timeout=5)
+except ValueError as e:
+    raise RuntimeError(f"{e} (see .env.example)")
+w3 = rpc_client.web3(CHAIN)
 
-RPC = f"https://mainnet.infura.io/v3/{INFURA_KEY}"
-w3 = Web3(Web3.HTTPProvider(RPC))
+# decimals/symbol cache (LRU + optional SQLite/Redis tiers, see token_meta.py).
+# TOKEN_META_WARMUP_FILE: token list preloaded in the background at startup
+token_meta = cache_from_env()
+TOKEN_META_WARMUP_FILE = os.getenv("TOKEN_META_WARMUP_FILE")
 
-# Minimal ERC20 ABI
-ERC20_ABI = [
-    {"constant": True, "inputs": [{"name": "owner", "type": "address"}],
-     "name": "balanceOf", "outputs": [{"name": "", "type": "uint256"}], "type": "function"},
-    {"constant": True, "inputs": [], "name": "decimals",
-     "outputs": [{"name": "", "type": "uint8"}], "type": "function"},
-    {"constant": True, "inputs": [], "name": "symbol",
-     "outputs": [{"name": "", "type": "string"}], "type": "function"},
-]
+# POST /balances: tokens x owners matrix split into Multicall3 chunks
+BALANCES_MAX_PAIRS = int(os.getenv("BALANCES_MAX_PAIRS", "20000"))
+BALANCES_CALLS_PER_MULTICALL = int(os.getenv("BALANCES_CALLS_PER_MULTICALL", "500"))  # stays well under eth_call gas/response caps
+BALANCES_CONCURRENCY = int(os.getenv("BALANCES_CONCURRENCY", "8"))
 
-app = FastAPI(title="Token API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await rpc_client.start()
+    warmup_task = None
+    if TOKEN_META_WARMUP_FILE:
+        addrs = [Web3.to_checksum_address(a) for a in load_token_list(TOKEN_META_WARMUP_FILE)]
+        warmup_task = asyncio.create_task(warmup(token_meta, w3, CHAIN, addrs))
+    yield
+    if warmup_task:
+        warmup_task.cancel()
+    await token_meta.close()
+    await rpc_client.close()
+
+app = FastAPI(title="Token API", version="1.0.0", lifespan=lifespan)
 
 # --- CORS (allow local debugging or your frontend domains) ---
 app.add_middleware(
@@ -39,14 +67,22 @@ app.add_middleware(
 
 security = HTTPBearer()
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+# Verified JWTs (hash -> payload until exp); repeat tokens skip jwt.decode
+token_cache = VerifiedTokenCache(maxsize=int(os.getenv("JWT_CACHE_SIZE", "10000")))
+
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Verify a JWT from the Authorization header (HTTP Bearer).
     Returns the decoded payload on success, otherwise raises HTTP 403.
+    Async (no threadpool hop); tokens seen before are served from token_cache.
     """
     token = credentials.credentials
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        token_cache.put(token, payload)
         # Payload can be accessed later, e.g., payload.get("user")
         return payload
     except jwt.ExpiredSignatureError:
@@ -59,42 +95,66 @@ def to_checksum(addr: str) -> str:
     Validate an Ethereum address and return its EIP-55 checksum format.
     Raises HTTP 400 if the address is invalid.
     """
-    if not w3.is_address(addr):
+    if not Web3.is_address(addr):
         raise HTTPException(status_code=400, detail="Invalid address")
-    return w3.to_checksum_address(addr)
+    return Web3.to_checksum_address(addr)
 
 @app.get("/health")
-def health():
+async def health():
     """
     Simple health check for the RPC connection.
     Returns ok status, current chain_id (if connected), and RPC label.
     """
-    ok = w3.is_connected()
-    chain_id = w3.eth.chain_id if ok else None
-    return {"ok": ok, "chain_id": chain_id, "rpc": "infura-mainnet"}
+    ok = await w3.is_connected()
+    chain_id = await w3.eth.chain_id if ok else None
+    return {"ok": ok, "chain_id": chain_id, "rpc": rpc_client.stats()[CHAIN], "token_meta": token_meta.stats(),
+            "jwt_cache": token_cache.stats()}
+
+async def balance_and_meta(caddr: str, oaddr: str) -> tuple[int, int, str]:
+    """
+    (raw balance, decimals, symbol) in one upstream round-trip:
+      - metadata cached -> a single balanceOf eth_call
+      - otherwise       -> balanceOf + decimals + symbol in one aggregate3,
+                           and the metadata is cached (negatively if it reverts)
+    """
+    key = token_meta.key(CHAIN, caddr)
+    meta = await token_meta.get(key)
+    if meta is not None:
+        call = balance_of_call(caddr, oaddr)
+        ret = await w3.eth.call({"to": caddr, "data": call.data})
+        raw = decode_uint(True, bytes(ret))
+        if raw is None:
+            raise ValueError("balanceOf returned no data")
+        return (raw, *resolved(meta))
+
+    results = await aggregate3(w3, [
+        balance_of_call(caddr, oaddr),
+        Call(caddr, SEL_DECIMALS),
+        Call(caddr, SEL_SYMBOL),
+    ])
+    raw = decode_uint(*results[0])
+    if raw is None:
+        raise ValueError("balanceOf reverted or returned no data")
+    decimals = decode_uint(*results[1])
+    meta = token_meta.entry(decimals if decimals is not None and decimals <= 255 else None,
+                            decode_symbol(*results[2]))
+    await token_meta.put(key, meta)
+    return (raw, *resolved(meta))
 
 @app.get("/balance")
-def balance(contract: str, owner: str, user=Depends(verify_token)):
+async def balance(contract: str, owner: str, user=Depends(verify_token)):
     """
     Return the ERC-20 token balance for a given owner address.
     - Resolves contract and owner to checksum addresses
-    - Calls balanceOf(owner)
-    - Attempts to read decimals and symbol (with safe fallbacks)
+    - Only balanceOf(owner) hits the node once decimals/symbol are cached;
+      on a cache miss all three go out in ONE Multicall3 aggregate3 eth_call
+    - decimals / symbol fall back to 18 / "TOKEN" if they revert
     """
     caddr = to_checksum(contract)
     oaddr = to_checksum(owner)
-    c = w3.eth.contract(address=caddr, abi=ERC20_ABI)
 
     try:
-        raw = c.functions.balanceOf(oaddr).call()
-        try:
-            decimals = c.functions.decimals().call()
-        except Exception:
-            decimals = 18
-        try:
-            symbol = c.functions.symbol().call()
-        except Exception:
-            symbol = "TOKEN"
+        raw, decimals, symbol = await balance_and_meta(caddr, oaddr)
         human = float(raw) / (10 ** decimals)
         return {
             "contract": caddr,
@@ -107,3 +167,100 @@ def balance(contract: str, owner: str, user=Depends(verify_token)):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+class BalancesRequest(BaseModel):
+    tokens: list[str] = Field(..., min_length=1)
+    owners: list[str] = Field(..., min_length=1)
+    stream: bool = False
+
+async def tokens_meta(caddrs: list[str]) -> dict[str, tuple[int, str]]:
+    """decimals/symbol for many tokens: cache first, one aggregate3 per chunk of misses."""
+    out, missing = {}, []
+    for caddr in caddrs:
+        meta = await token_meta.get(token_meta.key(CHAIN, caddr))
+        if meta is None:
+            missing.append(caddr)
+        else:
+            out[caddr] = resolved(meta)
+    if missing:
+        await warmup(token_meta, w3, CHAIN, missing, chunk=BALANCES_CALLS_PER_MULTICALL // 2)
+        for caddr in missing:
+            meta = token_meta.get_memory(token_meta.key(CHAIN, caddr))
+            out[caddr] = resolved(meta or {})
+    return out
+
+@app.post("/balances")
+async def balances(req: BalancesRequest, user=Depends(verify_token)):
+    """
+    ERC-20 balances for every (token, owner) pair in ONE request:
+      - balanceOf calls are packed into Multicall3 aggregate3 chunks of
+        BALANCES_CALLS_PER_MULTICALL, run concurrently (BALANCES_CONCURRENCY)
+        and all pinned to the same block
+      - compact result: balances[i][j] = raw balance of tokens[i] for owners[j]
+        (decimal string, null if the call reverted or its chunk failed)
+      - stream=true returns NDJSON: a header line, then one line per token as
+        soon as all of its owners are resolved
+    """
+    tokens = list(dict.fromkeys(to_checksum(t) for t in req.tokens))
+    owners = list(dict.fromkeys(to_checksum(o) for o in req.owners))
+    n_owners = len(owners)
+    total = len(tokens) * n_owners
+    if total > BALANCES_MAX_PAIRS:
+        raise HTTPException(status_code=413, detail=f"Too many pairs: {total} (max {BALANCES_MAX_PAIRS})")
+
+    try:
+        block, meta = await asyncio.gather(w3.eth.block_number, tokens_meta(tokens))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Upstream node error: {e}")
+
+    # Pairs are flattened token-major: index k -> (tokens[k // n_owners], owners[k % n_owners])
+    results: list[str | None] = [None] * total
+    chunk = BALANCES_CALLS_PER_MULTICALL
+    sem = asyncio.Semaphore(BALANCES_CONCURRENCY)
+
+    async def run_chunk(start: int) -> tuple[int, int, bool]:
+        end = min(start + chunk, total)
+        calls = [balance_of_call(tokens[k // n_owners], owners[k % n_owners]) for k in range(start, end)]
+        async with sem:
+            try:
+                res = await aggregate3(w3, calls, block)
+            except Exception:
+                return start, end, False
+        for k, (ok, data) in zip(range(start, end), res):
+            raw = decode_uint(ok, data)
+            results[k] = str(raw) if raw is not None else None
+        return start, end, True
+
+    token_meta_out = [{"contract": t, "decimals": meta[t][0], "symbol": meta[t][1]} for t in tokens]
+
+    if not req.stream:
+        done = await asyncio.gather(*(run_chunk(start) for start in range(0, total, chunk)))
+        return {
+            "block_number": block,
+            "owners": owners,
+            "tokens": token_meta_out,
+            "balances": [results[i * n_owners:(i + 1) * n_owners] for i in range(len(tokens))],
+            "failed_chunks": sum(1 for _, _, ok in done if not ok),
+            "user": user.get("user"),
+        }
+
+    async def ndjson():
+        # chunks start with the stream, so a response that is never sent leaves nothing running
+        tasks = [asyncio.create_task(run_chunk(start)) for start in range(0, total, chunk)]
+        remaining = [n_owners] * len(tokens)
+        try:
+            yield json.dumps({"block_number": block, "owners": owners, "tokens": len(tokens)}) + "\n"
+            for fut in asyncio.as_completed(tasks):
+                start, end, ok = await fut
+                for i in range(start // n_owners, (end - 1) // n_owners + 1):
+                    remaining[i] -= min(end, (i + 1) * n_owners) - max(start, i * n_owners)
+                    if remaining[i] == 0:
+                        yield json.dumps({"token": i, **token_meta_out[i],
+                                          "balances": results[i * n_owners:(i + 1) * n_owners]}) + "\n"
+        finally:
+            # client went away: stop the remaining chunks
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
@@ -0,0 +1,277 @@
+"""
+ERC-20 metadata cache (decimals / symbol) keyed by (chain, contract).
+
+Tiers, checked in order:
+  1) in-process LRU (always on)
+  2) SQLite file (optional, survives restarts)      TOKEN_META_SQLITE
+  3) Redis (optional, shared across processes)      TOKEN_META_REDIS_URL
+A hit in a lower tier is promoted to the tiers above it.
+
+decimals/symbol never change for a normal token, so complete entries never
+expire. Contracts whose metadata calls revert are cached negatively for
+`negative_ttl` seconds so they do not hit the node on every request either.
+
+CLI (preload a token list into the persistent tiers):
+    python token_meta.py warmup tokens.json       # Uniswap-style token list or JSON array
+    python token_meta.py warmup tokens.txt        # one address per line
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:  # optional shared tier
+    from redis.asyncio import Redis
+except ImportError:  # pragma: no cover - redis is optional
+    Redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DECIMALS = 18
+DEFAULT_SYMBOL = "TOKEN"
+
+
+class TokenMetaCache:
+    """
+    Values are {"decimals": int, "symbol": str} for complete entries, or
+    {"decimals": int|None, "symbol": str|None, "negative_until": unix_ts} when
+    a metadata call reverted (fields that did resolve are kept).
+    """
+
+    def __init__(self, maxsize: int = 10000, sqlite_path: Optional[str] = None,
+                 redis_url: Optional[str] = None, negative_ttl: int = 3600):
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self._lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._redis = None
+        self.hits = {"memory": 0, "sqlite": 0, "redis": 0}
+        self.misses = 0
+        self.negative_hits = 0
+
+        if sqlite_path:
+            os.makedirs(os.path.dirname(os.path.abspath(sqlite_path)), exist_ok=True)
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS token_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        if redis_url:
+            if Redis is None:
+                logger.warning("TOKEN_META_REDIS_URL set but the redis package is not installed; tier disabled")
+            else:
+                self._redis = Redis.from_url(redis_url, decode_responses=True)
+
+    @staticmethod
+    def key(chain: str, contract: str) -> str:
+        return f"{chain}:{contract.lower()}"
+
+    @property
+    def persistent(self) -> bool:
+        return self._db is not None or self._redis is not None
+
+    def _usable(self, meta: Optional[Dict[str, Any]]) -> bool:
+        return meta is not None and meta.get("negative_until", float("inf")) > time.time()
+
+    # ---- memory tier ----
+    def _put_memory(self, key: str, meta: Dict[str, Any]) -> None:
+        self._lru[key] = meta
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    # ---- sqlite tier ----
+    def _get_sqlite(self, key: str) -> Optional[Dict[str, Any]]:
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute("SELECT value FROM token_meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put_sqlite(self, items: Dict[str, Dict[str, Any]]) -> None:
+        if self._db is None or not items:
+            return
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO token_meta (key, value) VALUES (?, ?)",
+                [(k, json.dumps(v)) for k, v in items.items()],
+            )
+
+    # ---- redis tier ----
+    def _redis_key(self, key: str) -> str:
+        return f"tokenmeta:{key}"
+
+    async def _get_redis(self, key: str) -> Optional[Dict[str, Any]]:
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(self._redis_key(key))
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"token meta redis get failed: {e}")
+            return None
+
+    async def _put_redis(self, items: Dict[str, Dict[str, Any]]) -> None:
+        if self._redis is None or not items:
+            return
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for k, v in items.items():
+                ttl = int(v["negative_until"] - time.time()) if "negative_until" in v else None
+                pipe.set(self._redis_key(k), json.dumps(v), ex=max(ttl, 1) if ttl is not None else None)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"token meta redis set failed: {e}")
+
+    # ---- public API ----
+    def get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        """Hot path: one dict lookup, no I/O."""
+        meta = self._lru.get(key)
+        if meta is None:
+            return None
+        if not self._usable(meta):
+            del self._lru[key]
+            return None
+        self._lru.move_to_end(key)
+        if "negative_until" in meta:
+            self.negative_hits += 1
+        self.hits["memory"] += 1
+        return meta
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        meta = self.get_memory(key)
+        if meta is not None:
+            return meta
+        meta = self._get_sqlite(key)
+        if self._usable(meta):
+            self.hits["sqlite"] += 1
+            self._put_memory(key, meta)
+            return meta
+        meta = await self._get_redis(key)
+        if self._usable(meta):
+            self.hits["redis"] += 1
+            self._put_memory(key, meta)
+            self._put_sqlite({key: meta})
+            return meta
+        self.misses += 1
+        return None
+
+    def entry(self, decimals: Optional[int], symbol: Optional[str]) -> Dict[str, Any]:
+        """Build a cache value; incomplete metadata becomes a negative entry."""
+        meta: Dict[str, Any] = {"decimals": decimals, "symbol": symbol}
+        if decimals is None or symbol is None:
+            meta["negative_until"] = time.time() + self.negative_ttl
+        return meta
+
+    async def put_many(self, items: Dict[str, Dict[str, Any]]) -> None:
+        for k, v in items.items():
+            self._put_memory(k, v)
+        self._put_sqlite(items)
+        await self._put_redis(items)
+
+    async def put(self, key: str, meta: Dict[str, Any]) -> None:
+        await self.put_many({key: meta})
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.close()
+        if self._db is not None:
+            self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._lru), "maxsize": self.maxsize, "hits": dict(self.hits),
+                "negative_hits": self.negative_hits, "misses": self.misses}
+
+
+def resolved(meta: Dict[str, Any]) -> tuple[int, str]:
+    """(decimals, symbol) with the API's fallbacks for fields that reverted."""
+    decimals = meta.get("decimals")
+    symbol = meta.get("symbol")
+    return (decimals if decimals is not None else DEFAULT_DECIMALS), (symbol or DEFAULT_SYMBOL)
+
+
+def cache_from_env() -> TokenMetaCache:
+    return TokenMetaCache(
+        maxsize=int(os.getenv("TOKEN_META_CACHE_SIZE", "10000")),
+        sqlite_path=os.getenv("TOKEN_META_SQLITE") or None,
+        redis_url=os.getenv("TOKEN_META_REDIS_URL") or None,
+        negative_ttl=int(os.getenv("TOKEN_META_NEGATIVE_TTL", "3600")),
+    )
+
+
+# -----------------------------
+# Warmup
+# -----------------------------
+def load_token_list(path: str) -> list[str]:
+    """Addresses from a Uniswap-style token list, a JSON array, or a text file."""
+    with open(path) as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [line.strip() for line in text.splitlines() if line.strip() and not line.startswith("#")]
+    if isinstance(data, dict):
+        data = data.get("tokens", [])
+    return [t["address"] if isinstance(t, dict) else t for t in data]
+
+
+async def warmup(cache: TokenMetaCache, w3, chain: str, addresses: list[str], chunk: int = 200) -> int:
+    """Resolve decimals/symbol for every address (Multicall3, `chunk` tokens per call) and store them."""
+    from chain_client.multicall import Call, SEL_DECIMALS, SEL_SYMBOL, aggregate3, decode_symbol, decode_uint
+
+    done = 0
+    for i in range(0, len(addresses), chunk):
+        part = addresses[i:i + chunk]
+        calls = [c for a in part for c in (Call(a, SEL_DECIMALS), Call(a, SEL_SYMBOL))]
+        results = await aggregate3(w3, calls)
+        items = {}
+        for j, addr in enumerate(part):
+            decimals = decode_uint(*results[2 * j])
+            items[cache.key(chain, addr)] = cache.entry(
+                decimals if decimals is not None and decimals <= 255 else None,
+                decode_symbol(*results[2 * j + 1]),
+            )
+        await cache.put_many(items)
+        done += len(part)
+    return done
+
+
+def main() -> None:
+    from dotenv import load_dotenv
+    from web3 import Web3
+    from chain_client import ChainClient
+
+    ap = argparse.ArgumentParser(description="Token metadata cache utilities")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_warm = sub.add_parser("warmup", help="preload decimals/symbol for a token list")
+    p_warm.add_argument("token_list")
+    p_warm.add_argument("--chain", default="ethereum")
+    p_warm.add_argument("--chunk", type=int, default=200)
+    args = ap.parse_args()
+
+    load_dotenv()
+    cache = cache_from_env()
+    if not cache.persistent:
+        raise SystemExit("Set TOKEN_META_SQLITE and/or TOKEN_META_REDIS_URL so the warmup outlives this process")
+    client = ChainClient.from_env([args.chain])
+    addresses = [Web3.to_checksum_address(a) for a in load_token_list(args.token_list)]
+
+    async def run():
+        await client.start()
+        try:
+            n = await warmup(cache, client.web3(args.chain), args.chain, addresses, args.chunk)
+            print(f"warmed {n} tokens")
+        finally:
+            await cache.close()
+            await client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()